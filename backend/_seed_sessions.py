@@ -62,6 +62,9 @@ for username, specs in plan.items():
         obj.attendees.add(user)
         created.append((obj.id, "created" if was_created else "existing", act, d.isoformat(), t.strftime("%H:%M"), username))
 
+# attendees.add() bypasses the booking paths that maintain booked_count
+Session.objects.filter(pk__in=[row[0] for row in created]).recount_bookings()
+
 
 for sid, msg, act, d, t, user in sorted(created, key=lambda x: (x[3], x[4], x[0])):
 
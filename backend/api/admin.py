@@ -1,9 +1,61 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 from django import forms
-from .models import Note, Session, SessionAttendee
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from .models import BookingEvent, Note, Notification, Session, SessionAttendee, SessionTemplate, Task, delete_members
+from . import analytics, ledger, recurrence, tasks, timetable_import
+from .scheduling import default_trainer, describe_conflict, find_conflict
 import datetime
 
+# -------------------------
+# Estimated-count pagination
+# -------------------------
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) over large unfiltered tables.
+
+    On PostgreSQL an unfiltered changelist uses the planner's row estimate
+    (pg_class.reltuples) once the table is big enough for an exact count to
+    hurt; filtered lists and other databases fall back to a normal count.
+    """
+    ESTIMATE_THRESHOLD = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.ESTIMATE_THRESHOLD:
+                return row[0]
+        return super().count
+
+# -------------------------
+# User Admin
+# -------------------------
+class MemberAdmin(UserAdmin):
+    """Django's user admin; deleting selected users recounts their booked sessions once (see delete_members)."""
+
+    def delete_queryset(self, request, queryset):
+        delete_members(queryset)
+
+
+admin.site.unregister(User)
+admin.site.register(User, MemberAdmin)
+
 # -------------------------
 # Note Admin
 # -------------------------
@@ -12,7 +64,73 @@ admin.site.register(Note)
 # -------------------------
 # SessionAttendee Admin
 # -------------------------
-admin.site.register(SessionAttendee)
+class SessionAttendeeAdmin(admin.ModelAdmin):
+    # Columns read from joined rows so the changelist never calls SessionAttendee.__str__
+    list_display = ("id", "username", "session_activity", "session_date", "session_time", "trainer", "attended")
+    list_select_related = ("user", "session", "session__trainer")
+    list_filter = ("attended", "session__activity_type")
+    search_fields = ("user__username",)
+    autocomplete_fields = ("user", "session")
+    date_hierarchy = "session__date"
+    ordering = ("-session__date", "-session__time", "-id")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description="User", ordering="user__username")
+    def username(self, obj):
+        return obj.user.username
+
+    @admin.display(description="Activity", ordering="session__activity_type")
+    def session_activity(self, obj):
+        return obj.session.activity_type
+
+    @admin.display(description="Date", ordering="session__date")
+    def session_date(self, obj):
+        return obj.session.date
+
+    @admin.display(description="Time", ordering="session__time")
+    def session_time(self, obj):
+        return obj.session.time
+
+    @admin.display(description="Trainer")
+    def trainer(self, obj):
+        return obj.session.trainer.username
+
+    # Bookings edited here count towards the utilisation summary and the ledger like API bookings
+    def save_model(self, request, obj, form, change):
+        was_attended = form.initial.get("attended") if change else None
+        super().save_model(request, obj, form, change)
+        if not change:
+            obj.session.change_booked_count(1)
+            analytics.track_booking(obj.session, 1, no_show=not obj.attended)
+            ledger.record(BookingEvent.BOOKED, obj.session_id, obj.user_id, obj.attended, actor=request.user)
+        elif "session" in form.changed_data or "user" in form.changed_data:
+            Session.objects.filter(pk__in=[form.initial["session"], obj.session_id]).recount_bookings()
+            # Moved to another session or member: rebuilt (by the worker) rather than tracked as two deltas
+            tasks.enqueue("rebuild_utilization")
+            ledger.record(BookingEvent.REMOVED, form.initial["session"], form.initial["user"], was_attended, actor=request.user)
+            ledger.record(BookingEvent.BOOKED, obj.session_id, obj.user_id, obj.attended, actor=request.user)
+        else:
+            analytics.track_attendance(obj.session, was_attended, obj.attended)
+            if bool(was_attended) != obj.attended:
+                kind = BookingEvent.ATTENDED if obj.attended else BookingEvent.NO_SHOW
+                ledger.record(kind, obj.session_id, obj.user_id, obj.attended, actor=request.user)
+
+    def delete_model(self, request, obj):
+        obj.session.change_booked_count(-1)
+        analytics.track_booking(obj.session, -1, no_show=not obj.attended)
+        ledger.record(BookingEvent.REMOVED, obj.session_id, obj.user_id, obj.attended, actor=request.user)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        attendances = list(queryset.select_related("session"))
+        for attendance in attendances:
+            analytics.track_booking(attendance.session, -1, no_show=not attendance.attended)
+            ledger.record(BookingEvent.REMOVED, attendance.session_id, attendance.user_id, attendance.attended, actor=request.user)
+        super().delete_queryset(request, queryset)
+        Session.objects.filter(pk__in={a.session_id for a in attendances}).recount_bookings()
+
+admin.site.register(SessionAttendee, SessionAttendeeAdmin)
 
 # -------------------------
 # Generate 30-minute time choices
@@ -30,21 +148,243 @@ def generate_time_choices():
 # -------------------------
 class SessionAdminForm(forms.ModelForm):
     time = forms.ChoiceField(choices=generate_time_choices(), label="Time")
+    trainer = forms.ModelChoiceField(
+        queryset=User.objects.filter(is_staff=True), required=False,
+        help_text="Leave empty to keep the current trainer, or to assign the first staff user to a new session.",
+    )
 
     class Meta:
         model = Session
         fields = "__all__"
 
+    def clean(self):
+        # Resolve the trainer SessionAdmin.save_model will use, and check it for overlaps
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+        assigned = False
+        if cleaned_data.get("trainer") is not None:
+            self.trainer_id = cleaned_data["trainer"].pk
+        elif self.instance.trainer_id is not None:
+            self.trainer_id = self.instance.trainer_id
+        else:
+            self.trainer_id, assigned = getattr(default_trainer(), "pk", None), True
+        trainer_id = self.trainer_id
+        candidate = Session(
+            pk=self.instance.pk,
+            trainer_id=trainer_id,
+            date=cleaned_data.get("date"),
+            time=cleaned_data.get("time"),
+            duration_minutes=cleaned_data.get("duration_minutes") or 60,
+        )
+        conflict = find_conflict(candidate)
+        if conflict:
+            raise forms.ValidationError(describe_conflict(conflict, default=assigned))
+        return cleaned_data
+
+# -------------------------
+# Timetable import form
+# -------------------------
+class TimetableImportForm(forms.Form):
+    file = forms.FileField(
+        label="Timetable file",
+        help_text="CSV (activity_type, date, time[, duration_minutes, capacity, trainer]) or iCalendar (.ics).",
+    )
+
 # -------------------------
 # Session Admin
 # -------------------------
 class SessionAdmin(admin.ModelAdmin):
     form = SessionAdminForm
-    exclude = ('trainer',)  # hide trainer field
+    exclude = ('template', 'occurrence_date')  # hide recurrence bookkeeping
+    list_display = ("activity_type", "date", "time", "duration_minutes", "trainer", "booked", "capacity")
+    list_select_related = ("trainer",)
+    list_filter = ("activity_type", "date")
+    search_fields = ("activity_type", "trainer__username")
+    date_hierarchy = "date"
+    ordering = ("-date", "-time")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("trainer")
+
+    @admin.display(description="Booked", ordering="booked_count")
+    def booked(self, obj):
+        return obj.booked_count
+
+    # Bulk timetable import (see api.timetable_import)
+    change_list_template = "admin/api/session/change_list.html"
+    IMPORT_SESSION_KEY = "session_timetable_import"
+    PREVIEW_LIMIT = 200
+
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_view), name="api_session_import"),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """
+        Upload -> diff preview -> confirm.
+
+        The parsed rows are kept in the session between the preview and the
+        confirmation; the plan is rebuilt on confirm so it reflects any
+        changes made in the meantime, and apply_plan() checks it once more
+        under lock.
+        """
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        form = TimetableImportForm()
+        plan = None
+        default_trainer_id = getattr(default_trainer(), "pk", None)
+
+        if request.method == "POST" and "confirm" in request.POST:
+            rows = request.session.get(self.IMPORT_SESSION_KEY)
+            if rows is None:
+                messages.error(request, "The import preview expired; upload the file again.")
+                return redirect("admin:api_session_import")
+            plan = timetable_import.build_plan(rows, default_trainer_id)
+            if not plan["errors"]:
+                try:
+                    created, updated = timetable_import.apply_plan(plan)
+                except timetable_import.PlanOutdated as exc:
+                    # Changed between building the plan and locking the rows
+                    plan["errors"] = exc.errors
+                else:
+                    del request.session[self.IMPORT_SESSION_KEY]
+                    messages.success(request, f"Imported timetable: {created} sessions created, {updated} updated.")
+                    return redirect(reverse("admin:api_session_changelist"))
+        elif request.method == "POST":
+            form = TimetableImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                rows, parse_errors = timetable_import.parse_upload(form.cleaned_data["file"])
+                plan = timetable_import.build_plan(rows, default_trainer_id)
+                plan["errors"] = sorted(parse_errors + plan["errors"])
+                request.session[self.IMPORT_SESSION_KEY] = rows
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import timetable",
+            "form": form,
+            "plan": plan,
+            "preview_limit": self.PREVIEW_LIMIT,
+        }
+        if plan is not None:
+            context.update(
+                creates=plan["create"][: self.PREVIEW_LIMIT],
+                updates=plan["update"][: self.PREVIEW_LIMIT],
+                errors=plan["errors"][: self.PREVIEW_LIMIT],
+            )
+        return TemplateResponse(request, "admin/api/session/import.html", context)
 
     def save_model(self, request, obj, form, change):
-        # Always assign the first superuser as trainer
-        obj.trainer = User.objects.filter(is_superuser=True).first()
+        # Sessions without a chosen trainer get the default one (resolved once, in the form's clean)
+        if obj.trainer_id is None:
+            obj.trainer_id = form.trainer_id
+        previous = None
+        if change:
+            old = Session.objects.get(pk=obj.pk)
+            previous = (analytics.session_key(old), old.capacity)
         super().save_model(request, obj, form, change)
+        analytics.track_session_saved(obj, previous)
+
+    # Keep the utilisation summary in step with deletions made in the admin
+    def delete_model(self, request, obj):
+        analytics.track_sessions_deleted([obj])
+        recurrence.skip_deleted([obj])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        sessions = list(queryset)
+        analytics.track_sessions_deleted(sessions)
+        recurrence.skip_deleted(sessions)
+        super().delete_queryset(request, queryset)
 
 admin.site.register(Session, SessionAdmin)
+
+# -------------------------
+# Recurring session templates (see api.recurrence)
+# -------------------------
+class SessionTemplateAdminForm(forms.ModelForm):
+    class Meta:
+        model = SessionTemplate
+        fields = "__all__"
+
+    def clean(self):
+        # Virtual occurrences are listed without validation, so the template must not overlap its trainer's classes
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+        candidate = SessionTemplate(pk=self.instance.pk, **{
+            field: cleaned_data.get(field)
+            for field in ("trainer", "activity_type", "weekday", "time", "duration_minutes", "capacity", "starts_on", "ends_on")
+        })
+        candidate.skipped_dates = cleaned_data.get("skipped_dates") or []
+        conflicts = recurrence.template_conflicts(candidate)
+        if conflicts:
+            occurrence, conflict = conflicts[0]
+            raise forms.ValidationError(f"The class on {occurrence.date}: {describe_conflict(conflict)}")
+        return cleaned_data
+
+
+class SessionTemplateAdmin(admin.ModelAdmin):
+    form = SessionTemplateAdminForm
+    list_display = ("activity_type", "weekday", "time", "duration_minutes", "trainer", "capacity", "starts_on", "ends_on")
+    list_select_related = ("trainer",)
+    list_filter = ("activity_type", "weekday")
+    search_fields = ("activity_type", "trainer__username")
+    ordering = ("weekday", "time")
+
+admin.site.register(SessionTemplate, SessionTemplateAdmin)
+
+# -------------------------
+# Background tasks (see api.tasks); read-only apart from deleting rows
+# -------------------------
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "status", "attempts", "run_after", "started_at", "duration_ms", "locked_by")
+    list_filter = ("status", "name")
+    ordering = ("-id",)
+    readonly_fields = [field.name for field in Task._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+admin.site.register(Task, TaskAdmin)
+
+# -------------------------
+# Notification outbox (see api.notifications)
+# -------------------------
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "user", "session", "status", "created_at", "sent_at")
+    list_select_related = ("user", "session", "session__trainer")
+    list_filter = ("status", "kind")
+    search_fields = ("user__username",)
+    ordering = ("-id",)
+    readonly_fields = [field.name for field in Notification._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+admin.site.register(Notification, NotificationAdmin)
+
+# -------------------------
+# Booking event ledger (see api.ledger); append-only, so read-only here
+# -------------------------
+class BookingEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "session_id", "user_id", "attended", "actor_id", "occurred_at")
+    list_filter = ("kind",)
+    search_fields = ("=session_id", "=user_id")
+    ordering = ("-id",)
+    readonly_fields = [field.name for field in BookingEvent._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+admin.site.register(BookingEvent, BookingEventAdmin)
@@ -0,0 +1,222 @@
+"""
+Utilisation analytics for GymFlex.
+
+Dashboards need fill rate, no-show rate and booking volume by activity type,
+weekday and time slot across years of history. Aggregating api_sessionattendee
+for every request does not scale, so the numbers are kept in the small
+UtilizationSummary table (at most activities x 7 weekdays x 24 hours rows),
+bucketed by (activity_type, ISO weekday, start hour).
+
+The booking and session code paths call the track_* helpers below with the
+change they just made; each helper turns it into counter deltas applied with
+atomic F() updates. Anything that bypasses those paths (bulk imports,
+generate_dataset, manual SQL) should be followed by rebuild_summary(), which
+is what `manage.py rebuild_utilization` runs.
+
+Deltas are applied in bucket-key order. Code that changes several sessions
+in one transaction (the batch booking endpoint) wraps it in
+deferred_deltas(), so the summary rows are updated once, at the end and in
+that order, rather than interleaved with the bookings: two transactions
+never lock the same buckets in opposite orders.
+"""
+
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import date, time
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils.dateparse import parse_date, parse_time
+
+from .models import ArchivedSession, ArchivedSessionAttendee, Session, SessionAttendee, UtilizationSummary
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+COUNTERS = ("sessions", "capacity", "bookings", "no_shows")
+
+_deferred = threading.local()
+
+
+def session_key(session):
+    """Return the (activity_type, weekday, hour) bucket a session belongs to."""
+    session_date = session.date if isinstance(session.date, date) else parse_date(str(session.date))
+    session_time = session.time if isinstance(session.time, time) else parse_time(str(session.time))
+    return (session.activity_type, session_date.isoweekday(), session_time.hour)
+
+
+def apply_deltas(deltas):
+    """
+    Add counter deltas to summary rows.
+
+    Args:
+        deltas: mapping of bucket key -> Counter of field name -> increment
+    """
+    collected = getattr(_deferred, "deltas", None)
+    if collected is not None:
+        for key, counter in deltas.items():
+            collected[key].update(counter)
+        return
+    with transaction.atomic():
+        for (activity_type, weekday, hour), counter in sorted(deltas.items()):
+            changes = {field: F(field) + value for field, value in counter.items() if value}
+            if not changes:
+                continue
+            row = UtilizationSummary.objects.filter(activity_type=activity_type, weekday=weekday, hour=hour)
+            if not row.update(**changes):
+                UtilizationSummary.objects.bulk_create(
+                    [UtilizationSummary(activity_type=activity_type, weekday=weekday, hour=hour)],
+                    ignore_conflicts=True,
+                )
+                row.update(**changes)
+
+
+@contextmanager
+def deferred_deltas():
+    """Collect the deltas applied inside the block and apply them together when it exits without error."""
+    if getattr(_deferred, "deltas", None) is not None:
+        yield  # Already collecting: the outermost block applies them
+        return
+    _deferred.deltas = defaultdict(Counter)
+    try:
+        yield
+        deltas = _deferred.deltas
+    finally:
+        _deferred.deltas = None
+    apply_deltas(deltas)
+
+
+# -------------------
+# Incremental tracking hooks
+# -------------------
+def track_booking(session, delta, no_show=False):
+    """A booking was added (delta=1) or removed (delta=-1)."""
+    apply_deltas({session_key(session): Counter(bookings=delta, no_shows=delta if no_show else 0)})
+
+
+def track_attendance(session, was_attended, attended):
+    """A booking's attended flag changed."""
+    if bool(was_attended) != bool(attended):
+        apply_deltas({session_key(session): Counter(no_shows=-1 if attended else 1)})
+
+
+def track_session_saved(session, previous=None):
+    """
+    A session was created (previous=None) or updated.
+
+    Args:
+        previous: (bucket key, capacity) of the session before the update
+    """
+    key = session_key(session)
+    if previous is None:
+        apply_deltas({key: Counter(sessions=1, capacity=session.capacity)})
+        return
+    old_key, old_capacity = previous
+    if old_key == key:
+        apply_deltas({key: Counter(capacity=session.capacity - old_capacity)})
+        return
+    # The session moved bucket: move its bookings along with it
+    booked = SessionAttendee.objects.filter(session=session).aggregate(
+        bookings=Count("id"), no_shows=Count("id", filter=Q(attended=False))
+    )
+    apply_deltas({
+        old_key: Counter(sessions=-1, capacity=-old_capacity, bookings=-booked["bookings"], no_shows=-booked["no_shows"]),
+        key: Counter(sessions=1, capacity=session.capacity, bookings=booked["bookings"], no_shows=booked["no_shows"]),
+    })
+
+
+def track_sessions_deleted(sessions):
+    """Sessions are about to be deleted; call before the delete so their bookings can be counted."""
+    deltas = defaultdict(Counter)
+    for session in sessions:
+        deltas[session_key(session)].update(sessions=-1, capacity=-session.capacity)
+    booked = (
+        SessionAttendee.objects.filter(session__in=[s.pk for s in sessions])
+        .values("session_id")
+        .annotate(bookings=Count("id"), no_shows=Count("id", filter=Q(attended=False)))
+    )
+    by_pk = {s.pk: s for s in sessions}
+    for row in booked:
+        deltas[session_key(by_pk[row["session_id"]])].update(bookings=-row["bookings"], no_shows=-row["no_shows"])
+    apply_deltas(deltas)
+
+
+# -------------------
+# Rebuild and reporting
+# -------------------
+def rebuild_summary():
+    """Recompute every summary row from the (hot and archived) sessions and bookings tables."""
+    buckets = defaultdict(Counter)
+    # Archived history still counts towards utilisation (see api.archive)
+    for session_model, attendee_model in ((Session, SessionAttendee), (ArchivedSession, ArchivedSessionAttendee)):
+        sessions = (
+            session_model.objects.annotate(weekday=ExtractIsoWeekDay("date"), hour=ExtractHour("time"))
+            .values("activity_type", "weekday", "hour")
+            .annotate(sessions=Count("id"), capacity=Sum("capacity"))
+            .order_by()
+        )
+        for row in sessions:
+            buckets[(row["activity_type"], row["weekday"], row["hour"])].update(
+                sessions=row["sessions"], capacity=row["capacity"]
+            )
+        bookings = (
+            attendee_model.objects.annotate(
+                activity_type=F("session__activity_type"),
+                weekday=ExtractIsoWeekDay("session__date"),
+                hour=ExtractHour("session__time"),
+            )
+            .values("activity_type", "weekday", "hour")
+            .annotate(bookings=Count("id"), no_shows=Count("id", filter=Q(attended=False)))
+            .order_by()
+        )
+        for row in bookings:
+            buckets[(row["activity_type"], row["weekday"], row["hour"])].update(
+                bookings=row["bookings"], no_shows=row["no_shows"]
+            )
+
+    with transaction.atomic():
+        UtilizationSummary.objects.all().delete()
+        UtilizationSummary.objects.bulk_create([
+            UtilizationSummary(activity_type=a, weekday=w, hour=h, **{f: counter[f] for f in COUNTERS})
+            for (a, w, h), counter in buckets.items()
+        ])
+    return len(buckets)
+
+
+def _rates(counter):
+    capacity, bookings = counter["capacity"], counter["bookings"]
+    return {
+        **{field: counter[field] for field in COUNTERS},
+        "fill_rate": round(bookings / capacity, 4) if capacity else 0.0,
+        "no_show_rate": round(counter["no_shows"] / bookings, 4) if bookings else 0.0,
+    }
+
+
+def utilization_report(activity_type=None):
+    """Build the analytics payload from the summary table (a single small query)."""
+    rows = UtilizationSummary.objects.all()
+    if activity_type:
+        rows = rows.filter(activity_type=activity_type)
+
+    totals = Counter()
+    by_activity, by_weekday, by_hour = defaultdict(Counter), defaultdict(Counter), defaultdict(Counter)
+    for row in rows.values("activity_type", "weekday", "hour", *COUNTERS):
+        counts = {field: row[field] for field in COUNTERS}
+        totals.update(counts)
+        by_activity[row["activity_type"]].update(counts)
+        by_weekday[row["weekday"]].update(counts)
+        by_hour[row["hour"]].update(counts)
+
+    return {
+        "totals": _rates(totals),
+        "by_activity": [
+            {"activity_type": activity, **_rates(by_activity[activity])} for activity in sorted(by_activity)
+        ],
+        "by_weekday": [
+            {"weekday": day, "weekday_name": WEEKDAY_NAMES[day - 1], **_rates(by_weekday[day])}
+            for day in sorted(by_weekday)
+        ],
+        "by_time_slot": [
+            {"hour": hour, "time_slot": f"{hour:02d}:00", **_rates(by_hour[hour])} for hour in sorted(by_hour)
+        ],
+    }
@@ -0,0 +1,148 @@
+"""
+Hot/cold split for sessions and attendance.
+
+Sessions older than a retention window are never booked again, but every list,
+count and index scan on api_session / api_sessionattendee still pays for them.
+archive_sessions() moves them, with their attendance rows, into
+ArchivedSession / ArchivedSessionAttendee in small batches (one transaction
+per batch, so the hot tables are never locked for long and an interrupted run
+simply resumes). Plain archive tables are used rather than PostgreSQL
+partitions so the same code path works on SQLite in development.
+
+Historical reads go through the archive-aware helpers below:
+- attendance_rows(): hot + archived attendance for exports
+- history_sessions(): archived sessions for the /api/sessions/history/ endpoint
+
+The utilisation summary (api.analytics) keeps counting archived sessions;
+rebuild_summary() reads both hot and archived tables.
+"""
+
+from datetime import date, timedelta
+from itertools import chain
+
+from django.db import transaction
+
+from .models import ArchivedSession, ArchivedSessionAttendee, Session, SessionAttendee
+
+DEFAULT_RETENTION_DAYS = 365
+
+
+def archive_cutoff(retention_days=DEFAULT_RETENTION_DAYS, today=None):
+    """Sessions dated before the returned date are eligible for archiving."""
+    return (today or date.today()) - timedelta(days=retention_days)
+
+
+def archive_batch(before, batch_size=500):
+    """
+    Move up to `batch_size` sessions dated before `before` into the archive.
+
+    Returns:
+        tuple: (sessions archived, attendance rows archived) for this batch
+    """
+    with transaction.atomic():
+        sessions = list(
+            Session.objects.filter(date__lt=before)
+            .order_by("date", "id")
+            # Only the session rows: the join for the trainer's username must not lock auth_user
+            .select_for_update(of=("self",))
+            .values(
+                "id", "activity_type", "trainer_id", "trainer__username", "date", "time",
+                "duration_minutes", "capacity", "start_at", "end_at",
+            )[:batch_size]
+        )
+        if not sessions:
+            return 0, 0
+        ids = [row["id"] for row in sessions]
+        attendance = list(SessionAttendee.objects.filter(session_id__in=ids).values("id", "session_id", "user_id", "attended"))
+
+        ArchivedSession.objects.bulk_create(
+            [
+                ArchivedSession(
+                    trainer_username=row.pop("trainer__username"),
+                    **row,
+                )
+                for row in sessions
+            ]
+        )
+        # No ignore_conflicts: an id already in the archive must fail the batch, not lose the hot rows
+        ArchivedSessionAttendee.objects.bulk_create([ArchivedSessionAttendee(**row) for row in attendance])
+        SessionAttendee.objects.filter(session_id__in=ids).delete()
+        Session.objects.filter(id__in=ids).delete()
+    return len(sessions), len(attendance)
+
+
+def archive_sessions(before, batch_size=500, max_batches=None):
+    """Archive every session dated before `before`, batch by batch."""
+    totals = [0, 0]
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        archived, rows = archive_batch(before, batch_size)
+        if not archived:
+            break
+        totals[0] += archived
+        totals[1] += rows
+        batches += 1
+    return tuple(totals)
+
+
+# -------------------
+# Archive-aware reads
+# -------------------
+# Export column -> (hot lookup on SessionAttendee, archived lookup on ArchivedSessionAttendee)
+ATTENDANCE_LOOKUPS = {
+    "attendance_id": ("id", "id"),
+    "session_id": ("session_id", "session_id"),
+    "date": ("session__date", "session__date"),
+    "time": ("session__time", "session__time"),
+    "duration_minutes": ("session__duration_minutes", "session__duration_minutes"),
+    "activity_type": ("session__activity_type", "session__activity_type"),
+    "trainer": ("session__trainer__username", "session__trainer_username"),
+    "user_id": ("user_id", "user_id"),
+    "username": ("user__username", "user__username"),
+    "attended": ("attended", "attended"),
+}
+
+
+def attendance_rows(columns, start=None, end=None, activity=None, include_archived=True, chunk_size=2000):
+    """
+    Stream attendance tuples (in `columns` order) from the archive and then the hot table.
+
+    Archived sessions are always older than hot ones, so chaining the two
+    ordered iterators keeps the whole stream in date order.
+    """
+    filters = {}
+    if start:
+        filters["session__date__gte"] = start
+    if end:
+        filters["session__date__lte"] = end
+    if activity:
+        filters["session__activity_type"] = activity
+    ordering = ("session__date", "session__time", "session_id", "id")
+
+    hot = (
+        SessionAttendee.objects.filter(**filters)
+        .order_by(*ordering)
+        .values_list(*[ATTENDANCE_LOOKUPS[c][0] for c in columns])
+        .iterator(chunk_size=chunk_size)
+    )
+    if not include_archived:
+        return hot
+    cold = (
+        ArchivedSessionAttendee.objects.filter(**filters)
+        .order_by(*ordering)
+        .values_list(*[ATTENDANCE_LOOKUPS[c][1] for c in columns])
+        .iterator(chunk_size=chunk_size)
+    )
+    return chain(cold, hot)
+
+
+def history_sessions(user, start=None, end=None):
+    """Archived sessions visible to `user`: all for staff, only their own bookings otherwise."""
+    sessions = ArchivedSession.objects.all()
+    if not user.is_staff:
+        sessions = sessions.filter(attendance__user=user)
+    if start:
+        sessions = sessions.filter(date__gte=start)
+    if end:
+        sessions = sessions.filter(date__lte=end)
+    return sessions.order_by("-date", "-time")
@@ -0,0 +1,362 @@
+"""
+Per-process, in-memory availability index.
+
+"Which classes still have space?" is the question members ask most, and the
+answer changes a spot at a time. Each worker keeps the sessions of recently
+used dates in a DayBucket: parallel arrays (ids, start minute, activity,
+trainer, capacity, booked) in start order, loaded with one query per date.
+next_available and the availability endpoint scan those arrays instead of
+querying the timetable.
+
+Keeping it consistent:
+- Any change to a session's booked_count sends api.signals.booking_changed,
+  and any session save/delete sends post_save/post_delete. The receivers
+  below drop the affected date locally straight away (so this process never
+  reads its own stale counts) and, once the transaction commits, publish a
+  new token for that date in the shared cache (settings.AVAILABILITY_CACHE).
+  Bulk changes (recount_bookings(), edits that may move a session, timetable
+  imports) publish a new epoch instead, which drops every bucket.
+- Other workers compare their buckets' tokens (and the epoch) with the shared
+  cache at most once every AVAILABILITY_CHECK_INTERVAL seconds, with a single
+  get_many, and reload dates whose token changed. Buckets older than MAX_AGE
+  are reloaded regardless, which bounds staleness if a change was missed
+  (e.g. a raw SQL update).
+
+Writers that bypass signals (bulk_create/bulk_update, QuerySet.update of
+booked_count) must call invalidate_all() or recount_bookings() themselves.
+The index only answers "is there space"; per-member state (booked) still
+comes from the database. verify() compares the index with the database.
+Buckets are always loaded from the primary, even during GET requests the
+router sends to a replica: a lagging replica's counts stored next to a
+current token would stay until MAX_AGE.
+
+Recurring templates (api.recurrence) are cached too, until the next epoch
+(any template save or delete starts one), and each bucket remembers which
+template occurrences of its date have a real session, so day_rows() lists
+virtual occurrences without querying.
+"""
+
+import threading
+import time as clock
+import uuid
+from array import array
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import Session, SessionTemplate
+from .signals import booking_changed
+
+MAX_DAYS = 120     # Date buckets kept per process (least recently used are dropped)
+MAX_AGE = 300      # Seconds before a bucket is reloaded even without a new token
+SEARCH_DAYS = 28   # Dates next_available() scans in memory before falling back to SQL
+EPOCH_KEY = "availability:epoch"
+DAY_KEY = "availability:day:{}"
+ACTIVITIES = [choice for choice, _ in Session.ACTIVITY_CHOICES]
+
+
+def _shared_cache():
+    return caches[settings.AVAILABILITY_CACHE]
+
+
+def _new_token():
+    return uuid.uuid4().hex
+
+
+class DayBucket:
+    """The sessions on one date as parallel arrays, in start order."""
+
+    __slots__ = (
+        "date", "ids", "minutes", "activities", "trainers", "capacity", "booked", "materialized", "token", "loaded_at",
+    )
+
+    def __init__(self, day, rows, token):
+        self.date = day
+        self.ids = array("q")
+        self.minutes = array("h")       # Minutes after midnight
+        self.activities = array("b")    # Index into ACTIVITIES
+        self.trainers = array("q")
+        self.capacity = array("i")
+        self.booked = array("i")
+        self.materialized = set()       # Templates whose occurrence on this date has a real session
+        for pk, session_date, at, activity, trainer_id, capacity, booked, template_id, occurrence_date in rows:
+            if template_id is not None and occurrence_date == day:
+                self.materialized.add(template_id)
+            if session_date != day:
+                continue  # Materialised elsewhere, e.g. moved to another date
+            self.ids.append(pk)
+            self.minutes.append(at.hour * 60 + at.minute)
+            self.activities.append(ACTIVITIES.index(activity))
+            self.trainers.append(trainer_id)
+            self.capacity.append(capacity)
+            self.booked.append(booked)
+        self.token = token
+        self.loaded_at = clock.monotonic()
+
+    def rows(self):
+        """Yield (id, minute, activity, trainer_id, free spots) in start order."""
+        for i, pk in enumerate(self.ids):
+            yield pk, self.minutes[i], ACTIVITIES[self.activities[i]], self.trainers[i], self.capacity[i] - self.booked[i]
+
+
+class AvailabilityIndex:
+    """Date-bucketed free-space counts for one process; see the module docstring."""
+
+    def __init__(self, max_days=MAX_DAYS):
+        self.max_days = max_days
+        self.buckets = OrderedDict()   # date -> DayBucket, least recently used first
+        self.dates = {}                # session id -> date of the bucket holding it
+        self.recurring = None          # Cached SessionTemplates (None until loaded)
+        self.epoch = None
+        self.checked_at = None
+        self.pending_days = set()
+        self.pending_all = False
+        self.lock = threading.RLock()
+
+    # -------------------
+    # Reads
+    # -------------------
+    def day(self, day):
+        """The DayBucket for `day`, loading it if needed."""
+        self.revalidate()
+        with self.lock:
+            bucket = self.buckets.get(day)
+            if bucket is not None and clock.monotonic() - bucket.loaded_at < MAX_AGE:
+                self.buckets.move_to_end(day)
+                return bucket
+            # Read the token before the rows: a change committed in between
+            # publishes a newer token, so the next check reloads this date
+            token = _shared_cache().get(DAY_KEY.format(day))
+            rows = (
+                Session.objects.using(DEFAULT_DB_ALIAS)
+                .filter(Q(date=day) | Q(occurrence_date=day))
+                .order_by("time", "pk")
+                .values_list(
+                    "pk", "date", "time", "activity_type", "trainer_id", "capacity", "booked_count",
+                    "template_id", "occurrence_date",
+                )
+            )
+            self._drop(day)
+            bucket = self.buckets[day] = DayBucket(day, rows, token)
+            for pk in bucket.ids:
+                self.dates[pk] = day
+            while len(self.buckets) > self.max_days:
+                self._drop(next(iter(self.buckets)))
+            return bucket
+
+    def templates(self):
+        """Every SessionTemplate, cached until the next epoch."""
+        self.revalidate()
+        with self.lock:
+            if self.recurring is None:
+                self.recurring = list(SessionTemplate.objects.using(DEFAULT_DB_ALIAS).all())
+            return self.recurring
+
+    def day_rows(self, day):
+        """
+        (id, minute, activity, trainer_id, free spots) for every session on
+        `day`, virtual occurrences of recurring templates included, in start order.
+        """
+        bucket = self.day(day)
+        rows = list(bucket.rows())
+        for template in self.templates():
+            if template.pk not in bucket.materialized and template.occurs_on(day):
+                rows.append((
+                    f"t{template.pk}-{day:%Y%m%d}", template.time.hour * 60 + template.time.minute,
+                    template.activity_type, template.trainer_id, template.capacity,
+                ))
+        rows.sort(key=lambda row: row[1])
+        return rows
+
+    def open_sessions(self, start, end, activity=None, after=None, before=None, trainer_ids=None, now=None, limit=None):
+        """
+        Ids of sessions with a free spot between dates `start` and `end` (inclusive), in start order.
+
+        after/before are time-of-day bounds (after inclusive, before exclusive),
+        trainer_ids a set of trainer user ids; sessions starting before `now`
+        (a naive local datetime) are skipped.
+        """
+        after = after.hour * 60 + after.minute if after else 0
+        before = before.hour * 60 + before.minute if before else 24 * 60
+        found = []
+        day = start
+        while day <= end:
+            first = 0
+            if now is not None and day == now.date():
+                # A class starting at 18:00 has started by 18:00:01
+                first = now.hour * 60 + now.minute + (now.second > 0 or now.microsecond > 0)
+            for pk, minute, kind, trainer, free in self.day(day).rows():
+                if free <= 0 or minute < max(after, first) or minute >= before:
+                    continue
+                if (activity and kind != activity) or (trainer_ids is not None and trainer not in trainer_ids):
+                    continue
+                found.append(pk)
+                if limit is not None and len(found) >= limit:
+                    return found
+            day += timedelta(days=1)
+        return found
+
+    def next_available(self, limit, **filters):
+        """
+        Ids of the next `limit` upcoming sessions with space, or None if the
+        in-memory search window (SEARCH_DAYS) did not find enough of them.
+        """
+        now = timezone.localtime().replace(tzinfo=None)
+        found = self.open_sessions(now.date(), now.date() + timedelta(days=SEARCH_DAYS - 1), now=now, limit=limit, **filters)
+        return found if len(found) >= limit else None
+
+    # -------------------
+    # Invalidation
+    # -------------------
+    def invalidate_day(self, day):
+        """Forget `day` now and tell other processes once the current transaction commits."""
+        with self.lock:
+            self._drop(day)
+            self.pending_days.add(day)
+        transaction.on_commit(self._publish)
+
+    def invalidate_session(self, session_id, day=None):
+        with self.lock:
+            known = self.dates.get(session_id)
+        for date in {known, day} - {None}:
+            self.invalidate_day(date)
+
+    def invalidate_all(self):
+        """Forget every date now and start a new epoch once the current transaction commits."""
+        with self.lock:
+            self.clear()
+            self.pending_all = True
+        transaction.on_commit(self._publish)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+            self.dates.clear()
+            self.recurring = None
+
+    def _publish(self):
+        with self.lock:
+            days, everything = self.pending_days, self.pending_all
+            self.pending_days, self.pending_all = set(), False
+            # Concurrent requests of this process may have reloaded a date before the commit
+            if everything:
+                self.clear()
+            for day in days:
+                self._drop(day)
+        if everything:
+            self.epoch = _new_token()
+            _shared_cache().set(EPOCH_KEY, self.epoch, timeout=None)
+        elif days:
+            _shared_cache().set_many({DAY_KEY.format(day): _new_token() for day in days}, timeout=None)
+
+    def revalidate(self, force=False):
+        """Drop buckets whose token (or the epoch) changed in the shared cache; throttled unless `force`."""
+        now = clock.monotonic()
+        if not force and self.checked_at is not None and now - self.checked_at < settings.AVAILABILITY_CHECK_INTERVAL:
+            return
+        with self.lock:
+            self.checked_at = now
+            days = list(self.buckets)
+            cache = _shared_cache()
+            keys = [EPOCH_KEY] + [DAY_KEY.format(day) for day in days]
+            tokens = cache.get_many(keys)
+            epoch = tokens.get(EPOCH_KEY)
+            if epoch is None:
+                # First worker up (or the cache was flushed): agree on one epoch
+                cache.add(EPOCH_KEY, _new_token(), timeout=None)
+                epoch = cache.get(EPOCH_KEY)
+            if epoch != self.epoch:
+                self.clear()
+                self.epoch = epoch
+                return
+            for day in days:
+                bucket = self.buckets[day]
+                if tokens.get(DAY_KEY.format(day)) != bucket.token or now - bucket.loaded_at >= MAX_AGE:
+                    self._drop(day)
+
+    def _drop(self, day):
+        bucket = self.buckets.pop(day, None)
+        if bucket is not None:
+            for pk in bucket.ids:
+                if self.dates.get(pk) == day:
+                    del self.dates[pk]
+
+    # -------------------
+    # Consistency check
+    # -------------------
+    def verify(self):
+        """
+        Compare every loaded bucket with the database.
+
+        Returns:
+            list: (date, description) for each difference; empty when consistent
+        """
+        problems = []
+        with self.lock:
+            buckets = list(self.buckets.values())
+        for bucket in buckets:
+            expected = list(
+                Session.objects.using(DEFAULT_DB_ALIAS)
+                .filter(date=bucket.date)
+                .order_by("time", "pk")
+                .values_list("pk", "capacity", "booked_count")
+            )
+            actual = list(zip(bucket.ids, bucket.capacity, bucket.booked))
+            if expected != actual:
+                problems.append((bucket.date, f"index has {actual}, database has {expected}"))
+        return problems
+
+
+_index = AvailabilityIndex()
+
+
+def get_index():
+    """This process's AvailabilityIndex."""
+    return _index
+
+
+def invalidate_all():
+    _index.invalidate_all()
+
+
+# ---------------------
+# Signal receivers (connected in ApiConfig.ready)
+# ---------------------
+def booking_changed_receiver(sender, session_id=None, date=None, **kwargs):
+    if session_id is None:
+        _index.invalidate_all()
+    else:
+        _index.invalidate_session(session_id, date)
+
+
+def session_saved_receiver(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _index.invalidate_day(instance.date)
+    else:
+        # The old date is unknown here, and edits are rare: start a new epoch
+        _index.invalidate_all()
+
+
+def session_deleted_receiver(sender, instance, **kwargs):
+    _index.invalidate_session(instance.pk, instance.date)
+
+
+def template_changed_receiver(sender, raw=False, **kwargs):
+    if not raw:
+        _index.invalidate_all()
+
+
+def connect_signals():
+    booking_changed.connect(booking_changed_receiver, sender=Session, dispatch_uid="availability_booking_changed")
+    post_save.connect(session_saved_receiver, sender=Session, dispatch_uid="availability_session_saved")
+    post_delete.connect(session_deleted_receiver, sender=Session, dispatch_uid="availability_session_deleted")
+    post_save.connect(template_changed_receiver, sender=SessionTemplate, dispatch_uid="availability_template_saved")
+    post_delete.connect(template_changed_receiver, sender=SessionTemplate, dispatch_uid="availability_template_deleted")
@@ -0,0 +1,101 @@
+"""
+Booking rules shared by the single-session and batch booking endpoints.
+
+book() and cancel() apply the rules for one member and one session. The
+caller must hold a row lock on the session (select_for_update inside
+transaction.atomic()), so the capacity check cannot interleave with another
+booking of the same class. The member-overlap check spans sessions, so
+book() also locks the member's user row before it: two concurrent requests
+by one member for two overlapping classes lock different sessions, but the
+second waits for the first at the user row and then sees its booking. Both return (payload, http_status) and
+are idempotent: booking a session the member already holds, or cancelling
+one they do not, changes nothing and reports the current state.
+
+lock_sessions() locks several sessions in primary-key order, so two batch
+requests touching the same classes always lock them in the same order and
+cannot deadlock.
+"""
+
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+
+from .models import BookingEvent, Session, SessionAttendee
+from . import analytics, ledger
+from .scheduling import find_member_conflict
+
+CANCEL_CUTOFF = timedelta(minutes=30)  # Members cannot cancel this close to the start
+
+
+def session_start(session):
+    return datetime.combine(session.date, session.time)
+
+
+def lock_sessions(session_ids):
+    """Lock the given sessions (call inside transaction.atomic()); returns {pk: Session}."""
+    locked = Session.objects.select_for_update().filter(pk__in=set(session_ids)).order_by("pk")
+    return {session.pk: session for session in locked}
+
+
+def lock_member(user):
+    """Lock the member's user row (call inside transaction.atomic()), serialising their bookings."""
+    list(User.objects.select_for_update().filter(pk=user.pk).values_list("pk", flat=True))
+
+
+def booking_payload(status, session, booked):
+    # Enough for the client to update the session in place without re-fetching the list
+    return {
+        "status": status,
+        "session": session.public_id,
+        "booked": booked,
+        "available_slots": session.capacity - session.booked_count,
+    }
+
+
+def book(user, session):
+    """Book `user` onto the locked `session`."""
+    # Prevent booking sessions that have already started (check date AND time)
+    if session_start(session) < datetime.now():
+        return {"status": "past", "message": "Cannot book sessions that have already started"}, 400
+
+    if SessionAttendee.objects.filter(session=session, user=user).exists():
+        return booking_payload("Booked", session, True), 200
+
+    # Check capacity before adding (booked_count is current: the row is locked)
+    if session.booked_count >= session.capacity:
+        return {"status": "Full"}, 400
+    # Members cannot be in two classes at once (one indexed interval query,
+    # under the member's lock so a concurrent booking of theirs is visible)
+    lock_member(user)
+    conflict = find_member_conflict(user, session)
+    if conflict:
+        return {
+            "status": "conflict",
+            "message": "You already have a booking that overlaps this session.",
+            "conflicting_session": conflict.pk,
+        }, 400
+    session.attendees.add(user)
+    session.change_booked_count(1)
+    analytics.track_booking(session, 1)
+    ledger.record(BookingEvent.BOOKED, session.pk, user.pk)
+    return booking_payload("Booked", session, True), 200
+
+
+def cancel(user, session):
+    """Cancel `user`'s booking of the locked `session`."""
+    attendance = SessionAttendee.objects.filter(session=session, user=user).first()
+    if attendance is None:
+        return booking_payload("Unbooked", session, False), 200
+
+    starts = session_start(session)
+    # Prevent cancelling booking after the session has started
+    if starts < datetime.now():
+        return {"status": "Past", "message": "Cannot cancel after session start"}, 400
+    # Prevent cancelling booking within 30 minutes of session start (for non-staff)
+    if not user.is_staff and starts - datetime.now() <= CANCEL_CUTOFF:
+        return {"status": "too_late", "message": "Cannot cancel booking within 30 minutes of session start."}, 400
+    attendance.delete()
+    session.change_booked_count(-1)
+    analytics.track_booking(session, -1, no_show=not attendance.attended)
+    ledger.record(BookingEvent.CANCELLED, session.pk, user.pk, attendance.attended)
+    return booking_payload("Unbooked", session, False), 200
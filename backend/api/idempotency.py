@@ -0,0 +1,156 @@
+"""
+Idempotency-Key support for booking actions.
+
+A client that times out on POST /api/sessions/{id}/book/ cannot tell whether
+the booking happened. Sending the same Idempotency-Key header on the retry
+makes it safe: the first request's response is stored in IdempotencyKey and
+every retry is answered from that row, before the view runs, so it never
+touches (or locks) the session row again.
+
+- Keys are scoped to the authenticated user; reusing a key for a different
+  request (method, path or body) is rejected with 422. The body is part of
+  the fingerprint as a SHA-256 of its canonical JSON, so a batch retried
+  with other operations is not answered with the first batch's results.
+- A retry that arrives while the first request is still running gets 409
+  ("in_progress") rather than running the action twice.
+- 5xx responses and exceptions release the key so the client can retry.
+- A claim holds the key for IDEMPOTENCY_CLAIM_LEASE_SECONDS (longer than
+  any request may run). A claim still in flight after that belongs to a
+  request whose worker died, so the next retry takes the key over
+  (compare-and-set on claimed_at) instead of getting 409 until the key
+  expires. The first request only completes or releases a key it still
+  holds.
+- Keys expire after IDEMPOTENCY_KEY_TTL_SECONDS; expired rows are pruned in
+  batches as new keys are claimed, which keeps the table bounded.
+
+Requests without the header behave exactly as before.
+"""
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+PRUNE_EVERY = 100  # Claims between prunes of expired keys
+PRUNE_BATCH = 1000
+
+
+def _cutoff():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+
+
+def prune_expired(batch=PRUNE_BATCH):
+    """Delete up to `batch` expired keys; returns the number deleted."""
+    expired = list(
+        IdempotencyKey.objects.filter(created_at__lt=_cutoff()).order_by("created_at").values_list("pk", flat=True)[:batch]
+    )
+    if not expired:
+        return 0
+    return IdempotencyKey.objects.filter(pk__in=expired).delete()[0]
+
+
+def claim(user, key, request_fingerprint):
+    """
+    Claim a key for this request.
+
+    Returns:
+        tuple: (IdempotencyKey, created) - created is False if the key was
+        already used (the existing row is returned)
+    """
+    existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if existing is not None and existing.created_at < _cutoff():
+        existing.delete()
+        existing = None
+    if existing is not None:
+        now = timezone.now()
+        lease = timedelta(seconds=settings.IDEMPOTENCY_CLAIM_LEASE_SECONDS)
+        if existing.status_code is None and existing.request_fingerprint == request_fingerprint and existing.claimed_at < now - lease:
+            # Abandoned claim: only one retry's update can still see the old claim time
+            if _held(existing).update(claimed_at=now):
+                existing.claimed_at = now
+                return existing, True
+        return existing, False
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(user=user, key=key, request_fingerprint=request_fingerprint)
+    except IntegrityError:
+        # A concurrent retry claimed it first
+        return IdempotencyKey.objects.get(user=user, key=key), False
+    if record.pk % PRUNE_EVERY == 0:
+        prune_expired()
+    return record, True
+
+
+def fingerprint(method, path, data=None):
+    """Identify a request: method, path and a hash of its body (at most 255 characters)."""
+    body = json.dumps(data if data is not None else {}, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{method} {path}"[:190] + " " + hashlib.sha256(body.encode()).hexdigest()
+
+
+def _held(record):
+    """The key, only while it is still in flight under this request's claim."""
+    return IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True, claimed_at=record.claimed_at)
+
+
+def _replay(record, request_fingerprint):
+    if record.request_fingerprint != request_fingerprint:
+        return Response(
+            {"status": "idempotency_key_reused", "message": f"This {HEADER} was already used for a different request."},
+            status=422,
+        )
+    if record.status_code is None:
+        return Response(
+            {"status": "in_progress", "message": "A request with this Idempotency-Key is still being processed."},
+            status=409,
+        )
+    response = Response(record.response_body, status=record.status_code)
+    response[REPLAY_HEADER] = "true"
+    return response
+
+
+def idempotent(view_action):
+    """
+    Decorator for ViewSet actions: honour the Idempotency-Key header.
+
+    Must wrap the action function itself (below @action) and only be used on
+    authenticated, unsafe-method actions whose responses are JSON-serialisable.
+    """
+    @functools.wraps(view_action)
+    def wrapper(viewset, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view_action(viewset, request, *args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"status": "invalid_idempotency_key", "message": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters."},
+                status=400,
+            )
+
+        request_fingerprint = fingerprint(request.method, request.path, request.data)
+        record, created = claim(request.user, key, request_fingerprint)
+        if not created:
+            return _replay(record, request_fingerprint)
+
+        try:
+            response = view_action(viewset, request, *args, **kwargs)
+        except Exception:
+            _held(record).delete()
+            raise
+        if response.status_code >= 500:
+            _held(record).delete()
+            return response
+        _held(record).update(status_code=response.status_code, response_body=response.data)
+        return response
+
+    return wrapper
@@ -0,0 +1,289 @@
+"""
+Append-only booking event ledger.
+
+SessionAttendee only holds the current bookings; BookingEvent keeps how they
+got there. book, cancel, remove_attendee, mark_attendance and the admin call
+record() with what they just changed.
+
+Writes are buffered, so a booking request does not pay for another insert:
+- record() registers the event with transaction.on_commit, so bookings that
+  roll back are never logged. The timestamp is taken when the transaction
+  commits, i.e. after the session row lock is released, so events for one
+  session are ordered the same way the bookings were.
+- Committed events wait in a per-process buffer. When a request finishes
+  (after the response has been sent), the buffer is written with one
+  bulk_create if it holds LEDGER_BATCH_SIZE events or its oldest event is
+  LEDGER_FLUSH_INTERVAL seconds old.
+- Whatever is left is written when the process exits (atexit, and the
+  gunicorn worker_exit hook). A worker that is killed outright loses at most
+  one buffer; reconcile_bookings() reports any divergence that causes.
+- If a write fails the events stay buffered for the next flush, up to
+  MAX_BUFFERED events.
+
+Replaying the ledger in (occurred_at, id) order rebuilds booking state:
+- reconcile_bookings() compares it with SessionAttendee and can restore
+  bookings missing from it. Rows the ledger does not know are only reported:
+  bulk writers (generate_dataset, the seed scripts) and a lost buffer leave
+  real bookings without events,
+- replay_summary() recomputes the bookings and no-show counters of the
+  utilisation summary from it.
+Both are what `manage.py replay_ledger` runs.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.signals import request_finished
+from django.db import transaction
+from django.utils import timezone
+
+from . import tasks
+from .models import ArchivedSession, BookingEvent, Session, SessionAttendee, UtilizationSummary
+
+logger = logging.getLogger(__name__)
+
+MAX_BUFFERED = 10000  # Events kept when the database cannot be written; older ones are dropped
+CHUNK = 500  # Ids per IN (...) query
+
+_buffer = []
+_oldest = None  # time.monotonic() of the oldest buffered event
+_lock = threading.Lock()
+
+
+# -------------------
+# Recording
+# -------------------
+def record(kind, session_id, user_id, attended=True, actor=None):
+    """
+    Log a booking change once the current transaction commits.
+
+    Args:
+        kind: One of the BookingEvent kinds
+        attended: The booking's attended flag after the change
+        actor: Staff user (or id) who made the change on the member's behalf
+    """
+    event = BookingEvent(
+        kind=kind, session_id=session_id, user_id=user_id, attended=bool(attended), actor_id=getattr(actor, "pk", actor),
+    )
+    transaction.on_commit(lambda: _append(event))
+
+
+def _append(event):
+    global _oldest
+    event.occurred_at = timezone.now()
+    with _lock:
+        if not _buffer:
+            _oldest = time.monotonic()
+        _buffer.append(event)
+
+
+def pending():
+    """Number of events waiting in this process's buffer."""
+    return len(_buffer)
+
+
+def flush_due():
+    return len(_buffer) >= settings.LEDGER_BATCH_SIZE or (
+        _buffer and time.monotonic() - _oldest >= settings.LEDGER_FLUSH_INTERVAL
+    )
+
+
+def flush():
+    """Write every buffered event; returns how many were written."""
+    global _oldest
+    with _lock:
+        events, _buffer[:] = list(_buffer), []
+        oldest, _oldest = _oldest, None
+    if not events:
+        return 0
+    try:
+        BookingEvent.objects.bulk_create(events, batch_size=settings.LEDGER_BATCH_SIZE)
+    except Exception:
+        logger.exception("Could not write %s booking event(s); keeping them for the next flush", len(events))
+        with _lock:
+            _buffer[:0] = events
+            dropped = len(_buffer) - MAX_BUFFERED
+            if dropped > 0:
+                logger.error("Booking event buffer full; dropping the %s oldest event(s)", dropped)
+                del _buffer[:dropped]
+            _oldest = oldest
+        return 0
+    return len(events)
+
+
+def flush_if_due(**kwargs):
+    """request_finished receiver: write the buffer if it is large or old enough."""
+    if flush_due():
+        flush()
+
+
+def clear():
+    """Drop buffered events without writing them (tests)."""
+    global _oldest
+    with _lock:
+        _buffer.clear()
+        _oldest = None
+
+
+def connect_signals():
+    request_finished.connect(flush_if_due, dispatch_uid="ledger_flush_if_due")
+    atexit.register(flush)
+
+
+# -------------------
+# Replay
+# -------------------
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK):
+        yield ids[start:start + CHUNK]
+
+
+def replay(until=None):
+    """
+    Booking state rebuilt from the ledger.
+
+    Args:
+        until: Only replay events that occurred up to this datetime (default: all)
+
+    Returns:
+        dict: (session id, user id) -> attended flag of every booking held at the end
+    """
+    events = BookingEvent.objects.order_by("occurred_at", "pk")
+    if until is not None:
+        events = events.filter(occurred_at__lte=until)
+    state = {}
+    for kind, session_id, user_id, attended in events.values_list("kind", "session_id", "user_id", "attended").iterator(
+        chunk_size=2000
+    ):
+        key = (session_id, user_id)
+        if kind == BookingEvent.BOOKED:
+            state[key] = attended
+        elif kind in (BookingEvent.CANCELLED, BookingEvent.REMOVED):
+            state.pop(key, None)
+        elif key in state:
+            state[key] = attended
+    return state
+
+
+def _existing_users(state):
+    users = set()
+    for chunk in _chunks({user_id for _, user_id in state}):
+        users.update(User.objects.filter(pk__in=chunk).values_list("pk", flat=True))
+    return users
+
+
+def reconcile_bookings(apply=False):
+    """
+    Compare SessionAttendee with the ledger (sessions still in api_session, users that still exist).
+
+    Args:
+        apply: Add the missing rows and correct attended flags, recount the
+            affected sessions and queue a utilisation summary rebuild. Extra
+            rows are never deleted: they may be real bookings written
+            without an event.
+
+    Returns:
+        dict: counts of bookings "missing" from SessionAttendee, "extra" rows
+        the ledger does not hold and rows whose attended flag is "changed"
+    """
+    state = replay()
+    sessions = set()
+    for chunk in _chunks({session_id for session_id, _ in state}):
+        sessions.update(Session.objects.filter(pk__in=chunk).values_list("pk", flat=True))
+    users = _existing_users(state)
+    expected = {key: attended for key, attended in state.items() if key[0] in sessions and key[1] in users}
+
+    actual = {
+        (session_id, user_id): (pk, attended)
+        for pk, session_id, user_id, attended in SessionAttendee.objects.values_list(
+            "pk", "session_id", "user_id", "attended"
+        ).iterator(chunk_size=2000)
+    }
+    missing = [key for key in expected if key not in actual]
+    extra = [key for key in actual if key not in expected]
+    changed = [key for key in expected if key in actual and actual[key][1] != expected[key]]
+
+    if apply and (missing or changed):
+        with transaction.atomic():
+            SessionAttendee.objects.bulk_create(
+                [SessionAttendee(session_id=s, user_id=u, attended=expected[(s, u)]) for s, u in missing],
+                batch_size=CHUNK,
+            )
+            for attended in (True, False):
+                for chunk in _chunks(actual[key][0] for key in changed if expected[key] == attended):
+                    SessionAttendee.objects.filter(pk__in=chunk).update(attended=attended)
+            for chunk in _chunks({session_id for session_id, _ in missing}):
+                Session.objects.filter(pk__in=chunk).recount_bookings()
+            tasks.enqueue("rebuild_utilization")
+    return {"missing": len(missing), "extra": len(extra), "changed": len(changed)}
+
+
+def booking_buckets(until=None):
+    """
+    Bookings and no-shows per utilisation bucket, from the ledger.
+
+    Bookings of sessions that are neither in api_session nor archived, or of
+    users that no longer exist, are left out, as rebuild_summary() does.
+
+    Returns:
+        dict: (activity_type, ISO weekday, hour) -> Counter(bookings, no_shows)
+    """
+    state = replay(until)
+    starts = {}
+    for chunk in _chunks({session_id for session_id, _ in state}):
+        for model in (Session, ArchivedSession):
+            starts.update(
+                (pk, (activity_type, day.isoweekday(), start.hour))
+                for pk, activity_type, day, start in model.objects.filter(pk__in=chunk).values_list(
+                    "pk", "activity_type", "date", "time"
+                )
+            )
+    users = _existing_users(state)
+    buckets = defaultdict(Counter)
+    for (session_id, user_id), attended in state.items():
+        key = starts.get(session_id)
+        if key is not None and user_id in users:
+            buckets[key].update(bookings=1, no_shows=0 if attended else 1)
+    return buckets
+
+
+def replay_summary(until=None, apply=False):
+    """
+    Recompute the summary's bookings and no_shows counters from the ledger.
+
+    Session and capacity counters are left as they are (the ledger only
+    holds bookings).
+
+    Args:
+        apply: Write the replayed counters to UtilizationSummary
+
+    Returns:
+        dict: total "bookings" and "no_shows" replayed and the number of
+        summary buckets that "differ" from them
+    """
+    buckets = booking_buckets(until)
+    replayed = {key: (counter["bookings"], counter["no_shows"]) for key, counter in buckets.items()}
+    stored = {
+        (row.activity_type, row.weekday, row.hour): (row.bookings, row.no_shows)
+        for row in UtilizationSummary.objects.all()
+    }
+    differ = sum(1 for key in replayed.keys() | stored.keys() if replayed.get(key, (0, 0)) != stored.get(key, (0, 0)))
+    if apply and differ:
+        with transaction.atomic():
+            UtilizationSummary.objects.update(bookings=0, no_shows=0)
+            for (activity_type, weekday, hour), counter in buckets.items():
+                UtilizationSummary.objects.update_or_create(
+                    activity_type=activity_type, weekday=weekday, hour=hour,
+                    defaults={"bookings": counter["bookings"], "no_shows": counter["no_shows"]},
+                )
+    return {
+        "bookings": sum(counter["bookings"] for counter in buckets.values()),
+        "no_shows": sum(counter["no_shows"] for counter in buckets.values()),
+        "differ": differ,
+    }
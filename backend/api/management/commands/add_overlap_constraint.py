@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import overlap_constraint
+
+
+class Command(BaseCommand):
+    help = "Add the session_trainer_no_overlap exclusion constraint (PostgreSQL) that migration 0004 skipped"\
+           " because some trainer's sessions overlapped. Lists the overlaps still left instead."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=50, help="How many overlapping pairs to list")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write("The exclusion constraint is PostgreSQL only; nothing to do.")
+            return
+        if overlap_constraint.constraint_exists(connection):
+            self.stdout.write(f"{overlap_constraint.CONSTRAINT_NAME} is already in place.")
+            return
+        overlaps = overlap_constraint.find_overlaps(connection, limit=options["limit"])
+        if overlaps:
+            raise CommandError(
+                f"These sessions overlap for the same trainer (first {len(overlaps)} shown); change their"
+                f" trainer or time and run the command again.\n{overlap_constraint.describe_overlaps(overlaps)}"
+            )
+        overlap_constraint.add_constraint(connection)
+        self.stdout.write(self.style.SUCCESS(f"Added {overlap_constraint.CONSTRAINT_NAME}."))
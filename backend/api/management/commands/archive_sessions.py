@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.archive import DEFAULT_RETENTION_DAYS, archive_cutoff, archive_sessions
+
+
+class Command(BaseCommand):
+    help = "Move sessions older than the retention window, with their attendance rows, into the archive tables in batches."\
+           " Use --loop to keep running on a schedule (e.g. as a worker dyno)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", type=int, default=DEFAULT_RETENTION_DAYS,
+                            help="Archive sessions dated more than this many days ago")
+        parser.add_argument("--before", default=None, help="Archive sessions dated before YYYY-MM-DD (overrides --retention-days)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Sessions moved per transaction")
+        parser.add_argument("--loop", action="store_true", help="Run forever, archiving every --interval seconds")
+        parser.add_argument("--interval", type=int, default=3600, help="Seconds between runs in --loop mode")
+
+    def handle(self, *args, **options):
+        if options["before"]:
+            try:
+                before = parse_date(options["before"])
+            except ValueError:
+                before = None
+            if before is None:
+                raise CommandError("--before must be a date, YYYY-MM-DD")
+            # Archiving today's or future sessions would pull them out of the live timetable
+            if before > archive_cutoff(0):
+                raise CommandError(f"--before must not be later than today ({archive_cutoff(0)})")
+        elif options["retention_days"] < 0:
+            raise CommandError("--retention-days must not be negative")
+        while True:
+            if not options["before"]:
+                before = archive_cutoff(options["retention_days"])
+            sessions, rows = archive_sessions(before, batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {sessions} sessions and {rows} attendance rows dated before {before}."
+            ))
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
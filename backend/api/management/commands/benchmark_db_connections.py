@@ -0,0 +1,158 @@
+"""
+Compare database connection strategies under concurrent request-shaped load.
+
+Each simulated request opens (or reuses) a connection, runs a query and then
+does what Django does at request_finished (close_if_unusable_or_obsolete).
+Modes:
+
+- persistent:  CONN_MAX_AGE=600, one long-lived connection per thread (the
+               current production setup)
+- per_request: CONN_MAX_AGE=0, a new server connection for every request
+- pooled:      Django's native connection pool (OPTIONS["pool"]), bounded
+               per process (PostgreSQL with psycopg 3 only)
+
+Usage:
+    python manage.py benchmark_db_connections --threads 32 --requests 200 --pool-size 8
+    python manage.py benchmark_db_connections --modes persistent pooled --json
+
+The report gives throughput, latency percentiles, the number of server
+connections opened and, for the pool, its saturation metrics.
+"""
+
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+
+from api.management.commands.stress_bookings import percentile
+
+MODES = ("persistent", "per_request", "pooled")
+
+
+class Command(BaseCommand):
+    help = "Benchmark persistent, per-request and pooled database connections with concurrent simulated requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent request threads")
+        parser.add_argument("--requests", type=int, default=100, help="Requests per thread")
+        parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="Strategies to compare")
+        parser.add_argument("--pool-size", type=int, default=8, help="max_size for the pooled mode")
+        parser.add_argument("--query", default="SELECT 1", help="SQL run once per simulated request")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        base = connections["default"].settings_dict
+        modes = list(options["modes"])
+        if "pooled" in modes and connections["default"].vendor != "postgresql":
+            if options["modes"] == list(MODES):
+                modes.remove("pooled")
+                self.stderr.write("Skipping pooled mode: it requires PostgreSQL (set DATABASE_URL).")
+            else:
+                raise CommandError("The pooled mode requires PostgreSQL (set DATABASE_URL).")
+
+        report = {"threads": options["threads"], "requests_per_thread": options["requests"], "modes": {}}
+        for mode in modes:
+            report["modes"][mode] = self.run_mode(mode, self.settings_for(mode, base, options), options)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    @staticmethod
+    def settings_for(mode, base, options):
+        settings_dict = {**base, "OPTIONS": dict(base["OPTIONS"])}
+        if mode == "persistent":
+            settings_dict["CONN_MAX_AGE"] = 600
+        elif mode == "per_request":
+            settings_dict["CONN_MAX_AGE"] = 0
+        else:
+            pool = base["OPTIONS"].get("pool")
+            settings_dict["CONN_MAX_AGE"] = 0
+            settings_dict["OPTIONS"]["pool"] = {**(pool if isinstance(pool, dict) else {}), "max_size": options["pool_size"]}
+        return settings_dict
+
+    def run_mode(self, mode, settings_dict, options):
+        alias = f"benchmark_{mode}_{int(time.time() * 1000)}"
+        wrapper_class = load_backend(settings_dict["ENGINE"]).DatabaseWrapper
+        latencies, errors, opened = [], [], []
+        lock = threading.Lock()
+
+        def count_connection(sender, connection, **kwargs):
+            if connection.alias == alias:
+                with lock:
+                    opened.append(1)
+
+        def worker():
+            wrapper = wrapper_class(settings_dict, alias)
+            local = []
+            try:
+                for _ in range(options["requests"]):
+                    started = time.perf_counter()
+                    try:
+                        with wrapper.cursor() as cursor:
+                            cursor.execute(options["query"])
+                            cursor.fetchall()
+                    except Exception as exc:
+                        with lock:
+                            errors.append(type(exc).__name__)
+                    finally:
+                        wrapper.close_if_unusable_or_obsolete()  # request_finished
+                    local.append(time.perf_counter() - started)
+            finally:
+                wrapper.close()
+                with lock:
+                    latencies.extend(local)
+
+        connection_created.connect(count_connection)
+        try:
+            threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connection)
+
+        result = {
+            "wall_seconds": round(wall, 3),
+            "requests_per_second": round(len(latencies) / wall, 1) if wall else 0.0,
+            "errors": len(errors),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "server_connections_opened": len(opened),
+        }
+        if mode == "pooled":
+            pool = wrapper_class._connection_pools.pop(alias)
+            stats = pool.get_stats()
+            result["server_connections_opened"] = stats.get("connections_num", 0)
+            result["pool"] = {"max_size": pool.max_size, **stats}
+            pool.close()
+        return result
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['threads']} threads x {report['requests_per_thread']} requests per mode\n"
+        )
+        header = f"{'mode':<12} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'conns':>7} {'errors':>7}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for mode, result in report["modes"].items():
+            self.stdout.write(
+                f"{mode:<12} {result['requests_per_second']:>9} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+                f"{result['p99_ms']:>8} {result['server_connections_opened']:>7} {result['errors']:>7}"
+            )
+        pool = report["modes"].get("pooled", {}).get("pool")
+        if pool:
+            self.stdout.write(
+                f"\npool: max_size={pool['max_size']} queued={pool.get('requests_queued', 0)}"
+                f" wait_ms={pool.get('requests_wait_ms', 0)} errors={pool.get('requests_errors', 0)}"
+                f" returned_bad={pool.get('returns_bad', 0)}"
+            )
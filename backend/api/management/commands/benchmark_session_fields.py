@@ -0,0 +1,102 @@
+"""
+Measure the cost of GET /api/sessions/ for different sparse fieldsets.
+
+Each variant lists every session through SessionViewSet (the real queryset
+annotations, serializer and masking, without HTTP or authentication) as the
+given user and reports queries, wall time, CPU time per row and payload
+size. The "unannotated" baseline serialises the plain queryset with every
+field, i.e. what the endpoint did before field methods used annotations (a
+few queries per row).
+
+Usage:
+    python manage.py benchmark_session_fields --username alice
+    python manage.py benchmark_session_fields --username coach --fields id,date,time,activity_type --omit attendees --json
+
+Run against realistic volumes, e.g. after `manage.py generate_dataset`.
+"""
+
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Session
+from api.serializers import SessionSerializer
+from api.views import SessionViewSet
+
+CALENDAR_FIELDS = "id,date,time,activity_type"
+
+
+class Command(BaseCommand):
+    help = "Compare queries and CPU per row of the session list for full and sparse fieldsets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", required=True, help="List sessions as this user (staff see attendee details)")
+        parser.add_argument("--fields", action="append", default=[], help="Extra ?fields= variant (repeatable)")
+        parser.add_argument("--omit", action="append", default=[], help="Extra ?omit= variant (repeatable)")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (medians are reported)")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}")
+
+        variants = [("unannotated", None), ("full", {}), ("calendar", {"fields": CALENDAR_FIELDS})]
+        variants += [(f"fields={value}", {"fields": value}) for value in options["fields"]]
+        variants += [(f"omit={value}", {"omit": value}) for value in options["omit"]]
+
+        report = {"user": user.username, "staff": user.is_staff, "rows": Session.objects.count(), "variants": {}}
+        for name, params in variants:
+            runs = [self.measure(user, params) for _ in range(options["repeat"])]
+            report["variants"][name] = {
+                "queries": runs[-1]["queries"],
+                "bytes": runs[-1]["bytes"],
+                "wall_ms": round(statistics.median(r["wall"] for r in runs) * 1000, 2),
+                "cpu_us_per_row": round(statistics.median(r["cpu"] for r in runs) * 1e6 / max(report["rows"], 1), 2),
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    @staticmethod
+    def measure(user, params):
+        factory = APIRequestFactory()
+        http_request = factory.get("/api/sessions/", params or {})
+        force_authenticate(http_request, user=user)
+        with CaptureQueriesContext(connection) as queries:
+            wall, cpu = time.perf_counter(), time.process_time()
+            if params is None:
+                request = Request(http_request)
+                request.user = user
+                sessions = Session.objects.all().order_by("date", "time")
+                data = SessionSerializer(sessions, many=True, context={"request": request}).data
+            else:
+                response = SessionViewSet.as_view({"get": "list"})(http_request)
+                if response.status_code != 200:
+                    raise CommandError(f"{params}: HTTP {response.status_code} {response.data}")
+                data = response.data
+            body = JSONRenderer().render(data)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        return {"queries": len(queries), "wall": wall, "cpu": cpu, "bytes": len(body)}
+
+    def print_report(self, report):
+        role = "staff" if report["staff"] else "member"
+        self.stdout.write(f"{report['rows']} sessions listed as {report['user']} ({role})\n")
+        header = f"{'variant':<36} {'queries':>8} {'wall ms':>9} {'cpu us/row':>11} {'bytes':>10}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, row in report["variants"].items():
+            self.stdout.write(
+                f"{name:<36} {row['queries']:>8} {row['wall_ms']:>9} {row['cpu_us_per_row']:>11} {row['bytes']:>10}"
+            )
@@ -0,0 +1,123 @@
+"""
+Measure process start-up cost: import/setup time and first-request latency.
+
+Each run starts a fresh Python interpreter (so nothing is cached) that
+imports the WSGI application, optionally runs backend.warmup, and then sends
+each path through the full middleware stack twice with Django's test client,
+timing the first and second request. Runs are repeated and the medians
+reported, once "cold" (no warmup, what a worker without preload/warmup sees)
+and once "warm" (warm_up() first, what gunicorn.conf.py does).
+
+Usage:
+    python manage.py benchmark_startup
+    python manage.py benchmark_startup --runs 5 --username alice --path /api/sessions/ --json
+
+With --username, requests carry a JWT for that user, so authenticated views
+and their serializers are exercised as well.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in the child interpreter; prints one JSON object
+PROBE = r"""
+import json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+from backend.wsgi import application  # django.setup() + middleware loading
+result = {"import_ms": (time.perf_counter() - started) * 1000}
+
+config = json.loads(sys.argv[1])
+if config["warm"]:
+    from backend.warmup import warm_up
+    t = time.perf_counter()
+    warm_up()
+    result["warmup_ms"] = (time.perf_counter() - t) * 1000
+
+from django.test import Client
+headers = {}
+if config["username"]:
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import AccessToken
+    headers["HTTP_AUTHORIZATION"] = "Bearer " + str(AccessToken.for_user(User.objects.get(username=config["username"])))
+client = Client(SERVER_NAME="localhost")
+result["requests"] = {}
+for path in config["paths"]:
+    timings = []
+    for _ in range(2):
+        t = time.perf_counter()
+        response = client.get(path, **headers)
+        timings.append((time.perf_counter() - t) * 1000)
+    result["requests"][path] = {"status": response.status_code, "first_ms": timings[0], "second_ms": timings[1]}
+print(json.dumps(result))
+"""
+
+DEFAULT_PATHS = ["/api/health/", "/api/sessions/", "/"]
+
+
+class Command(BaseCommand):
+    help = "Measure import time and first-request latency of a fresh process, with and without warmup."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3, help="Fresh processes per mode (medians are reported)")
+        parser.add_argument("--path", action="append", dest="paths", help="Path to request (repeatable)")
+        parser.add_argument("--username", default=None, help="Send requests with a JWT for this user")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or DEFAULT_PATHS
+        report = {"runs": options["runs"], "modes": {}}
+        for mode in ("cold", "warm"):
+            samples = [self.probe(paths, warm=mode == "warm", username=options["username"]) for _ in range(options["runs"])]
+            report["modes"][mode] = self.summarise(samples, paths)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report, paths)
+
+    def probe(self, paths, warm, username):
+        config = json.dumps({"paths": paths, "warm": warm, "username": username})
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "backend.settings")}
+        completed = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", PROBE, config],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"Probe process failed:\n{completed.stderr.strip()}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    @staticmethod
+    def summarise(samples, paths):
+        def median(values):
+            return round(statistics.median(values), 2)
+
+        summary = {"import_ms": median([s["import_ms"] for s in samples])}
+        if "warmup_ms" in samples[0]:
+            summary["warmup_ms"] = median([s["warmup_ms"] for s in samples])
+        summary["requests"] = {
+            path: {
+                "status": samples[-1]["requests"][path]["status"],
+                "first_ms": median([s["requests"][path]["first_ms"] for s in samples]),
+                "second_ms": median([s["requests"][path]["second_ms"] for s in samples]),
+            }
+            for path in paths
+        }
+        return summary
+
+    def print_report(self, report, paths):
+        self.stdout.write(f"Medians over {report['runs']} fresh processes per mode\n")
+        for mode, summary in report["modes"].items():
+            warmup = f", warmup {summary['warmup_ms']} ms" if "warmup_ms" in summary else ""
+            self.stdout.write(f"{mode}: import + setup {summary['import_ms']} ms{warmup}")
+            for path in paths:
+                row = summary["requests"][path]
+                self.stdout.write(
+                    f"  {path:<28} [{row['status']}] first {row['first_ms']:>8} ms   second {row['second_ms']:>8} ms"
+                )
@@ -0,0 +1,228 @@
+"""
+Deterministic large-scale synthetic data generator.
+
+Produces production-sized volumes of members, trainers, sessions and bookings
+so performance work can be done locally:
+
+    python manage.py generate_dataset --users 1000000 --days 730 --sessions-per-day 40
+
+Rows are generated lazily in batches and written with ``bulk_create`` or, on
+PostgreSQL, with ``COPY ... FROM STDIN`` (much faster for millions of rows).
+Primary keys are allocated up front so bookings can reference sessions and
+users without reading anything back, and the same --seed always produces the
+same dataset. Generated usernames share a prefix (default ``gen_``) so the data
+can be removed again with --flush.
+"""
+
+import io
+import random
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.analytics import rebuild_summary
+from api.models import ArchivedSession, Session, SessionAttendee, delete_members
+from api.scheduling import find_batch_conflicts
+
+ACTIVITIES = [choice for choice, _ in Session.ACTIVITY_CHOICES]
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic dataset of users, sessions and bookings using batched bulk inserts (COPY on PostgreSQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000, help="Number of member accounts")
+        parser.add_argument("--trainers", type=int, default=20, help="Number of staff trainer accounts")
+        parser.add_argument("--days", type=int, default=365, help="Number of days of timetable to generate")
+        parser.add_argument("--start-date", type=date.fromisoformat, default=None,
+                            help="First day of the timetable (YYYY-MM-DD, default: today minus half of --days)")
+        parser.add_argument("--sessions-per-day", type=int, default=20, help="Sessions scheduled per day")
+        parser.add_argument("--capacity", type=int, default=12, help="Capacity of each session")
+        parser.add_argument("--fill", type=float, default=0.7, help="Average fraction of capacity that is booked")
+        parser.add_argument("--no-show-rate", type=float, default=0.1, help="Fraction of past bookings marked as no-show")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per insert batch")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (same seed, same dataset)")
+        parser.add_argument("--prefix", default="gen_", help="Username prefix for generated accounts")
+        parser.add_argument("--no-copy", action="store_true", help="Use bulk_create even when PostgreSQL COPY is available")
+        parser.add_argument("--flush", action="store_true", help="Delete previously generated data with this prefix and exit")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if options["flush"]:
+            self.flush(prefix)
+            return
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Users with prefix '{prefix}' already exist; run with --flush first or pick another --prefix.")
+        if options["trainers"] < 1 or options["users"] < 1:
+            raise CommandError("--users and --trainers must both be at least 1.")
+        step = max(1, (16 * 60) // max(options["sessions_per_day"], 1))
+        if options["trainers"] * step < 60:
+            # Trainers are assigned round-robin; each must be free for the 60-minute class
+            raise CommandError(f"--sessions-per-day {options['sessions_per_day']} needs at least {-(-60 // step)} trainers.")
+
+        self.rng = random.Random(options["seed"])
+        self.per_day = max(options["sessions_per_day"], 1)
+        self.step = step
+        self.first_day = options["start_date"] or date.today() - timedelta(days=options["days"] // 2)
+        self.batch_size = options["batch_size"]
+        self.use_copy = connection.vendor == "postgresql" and not options["no_copy"]
+        self.stdout.write(f"Writing with {'COPY' if self.use_copy else 'bulk_create'} in batches of {self.batch_size}.")
+
+        started = perf_counter()
+        user_base = self.next_id(User)
+        trainer_ids = list(range(user_base, user_base + options["trainers"]))
+        member_ids = range(user_base + options["trainers"], user_base + options["trainers"] + options["users"])
+
+        self.write(User, self.generate_users(prefix, trainer_ids, member_ids))
+        # Archived sessions keep their ids, so new ones must not reuse them
+        session_base = self.next_id(Session, ArchivedSession)
+        sessions = self.write(Session, self.generate_sessions(session_base, trainer_ids, options))
+        self.write(SessionAttendee, self.generate_bookings(session_base, sessions, member_ids, options))
+
+        if connection.vendor == "postgresql":
+            # Explicit primary keys bypass the sequences; move them past the new rows
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [User, Session, SessionAttendee]):
+                    cursor.execute(sql)
+
+        # Bulk writes bypass booked_count and the incremental analytics hooks
+        Session.objects.filter(pk__gte=session_base).recount_bookings()
+        rebuild_summary()
+        self.stdout.write(self.style.SUCCESS(f"Done in {perf_counter() - started:.1f}s."))
+
+    def flush(self, prefix):
+        users = User.objects.filter(username__startswith=prefix)
+        # Cascades remove the generated trainers' sessions and every booking;
+        # other sessions the generated members booked are recounted once
+        deleted, _ = delete_members(users)
+        rebuild_summary()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} rows for prefix '{prefix}'."))
+
+    # -------------------
+    # Row generators
+    # -------------------
+    def next_id(self, *models):
+        return max(model.objects.aggregate(m=Max("pk"))["m"] or 0 for model in models) + 1
+
+    def generate_users(self, prefix, trainer_ids, member_ids):
+        # Hashing is deliberately slow, so every generated account shares one hash
+        password = make_password("gymflex-generated")
+        joined = timezone.now()
+        for n, pk in enumerate(trainer_ids):
+            yield User(pk=pk, username=f"{prefix}trainer{n:04d}", password=password, is_staff=True, date_joined=joined)
+        for n, pk in enumerate(member_ids):
+            yield User(pk=pk, username=f"{prefix}{n:07d}", password=password, date_joined=joined)
+
+    def session_start(self, offset):
+        """Start datetime of the n-th generated session (classes run 06:00-22:00)."""
+        day, slot = divmod(offset, self.per_day)
+        return datetime.combine(self.first_day + timedelta(days=day), time(6)) + timedelta(minutes=slot * self.step)
+
+    def generate_sessions(self, base_id, trainer_ids, options):
+        for offset in range(options["days"] * self.per_day):
+            start = self.session_start(offset)
+            session = Session(
+                pk=base_id + offset,
+                trainer_id=trainer_ids[offset % len(trainer_ids)],
+                activity_type=self.rng.choice(ACTIVITIES),
+                date=start.date(),
+                time=start.time(),
+                duration_minutes=60,
+                capacity=options["capacity"],
+            )
+            session.set_bounds()  # bulk writes skip Session.save()
+            yield session
+
+    def generate_bookings(self, session_base, session_count, member_ids, options):
+        now = datetime.now()
+        capacity = options["capacity"]
+        for offset in range(session_count):
+            is_past = self.session_start(offset) < now
+            booked = min(len(member_ids), capacity, max(0, round(self.rng.gauss(capacity * options["fill"], capacity * 0.2))))
+            for user_index in self.rng.sample(range(len(member_ids)), booked):
+                yield SessionAttendee(
+                    session_id=session_base + offset,
+                    user_id=member_ids[user_index],
+                    attended=not (is_past and self.rng.random() < options["no_show_rate"]),
+                )
+
+    # -------------------
+    # Writers
+    # -------------------
+    def write(self, model, rows):
+        """Write generated instances in batches; returns the number of rows written."""
+        label = model._meta.verbose_name_plural
+        total = 0
+        batch = []
+        for obj in rows:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                total += self.flush_batch(model, batch)
+                batch = []
+                self.stdout.write(f"  {label}: {total}", ending="\r")
+        if batch:
+            total += self.flush_batch(model, batch)
+        self.stdout.write(f"  {label}: {total}")
+        return total
+
+    def flush_batch(self, model, batch):
+        if model is Session:
+            conflicts = find_batch_conflicts(batch)
+            if conflicts:
+                session, other = conflicts[0]
+                raise CommandError(
+                    f"{len(conflicts)} generated sessions overlap for the same trainer "
+                    f"(first: {session.date} {session.time} vs {other.date} {other.time})."
+                )
+        with transaction.atomic():
+            if self.use_copy:
+                self.copy_batch(model, batch)
+            else:
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+        return len(batch)
+
+    def copy_batch(self, model, batch):
+        """Stream a batch into PostgreSQL with COPY (text format)."""
+        fields = [f for f in model._meta.concrete_fields if f.primary_key or not f.auto_created]
+        if model is SessionAttendee:
+            fields = [f for f in fields if not f.primary_key]
+        for obj in batch:
+            for field in fields:
+                if getattr(obj, field.attname) is None and field.has_default():
+                    setattr(obj, field.attname, field.get_default())
+
+        buffer = io.StringIO()
+        for obj in batch:
+            buffer.write("\t".join(
+                copy_value(field.get_db_prep_save(getattr(obj, field.attname), connection)) for field in fields
+            ))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+        sql = f"COPY {table} ({columns}) FROM STDIN"
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, "copy_expert"):      # psycopg2
+                raw.copy_expert(sql, buffer)
+            else:                                # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+
+def copy_value(value):
+    """Encode one value for PostgreSQL's COPY text format."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    text = value.isoformat() if hasattr(value, "isoformat") else str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api.analytics import rebuild_summary
+
+
+class Command(BaseCommand):
+    help = "Recompute the utilisation summary table used by /api/analytics/utilization/ from sessions and bookings."\
+           " Run after bulk imports or any change that bypasses the booking endpoints."
+
+    def handle(self, *args, **options):
+        buckets = rebuild_summary()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt utilisation summary ({buckets} buckets)."))
@@ -0,0 +1,58 @@
+"""
+Rebuild booking state or analytics from the booking event ledger (see api.ledger).
+
+    python manage.py replay_ledger                       # report differences only
+    python manage.py replay_ledger --bookings --apply    # restore missing bookings, fix attended flags
+    python manage.py replay_ledger --analytics --apply   # rewrite the summary's bookings/no-shows
+    python manage.py replay_ledger --analytics --until 2025-06-30T23:59:59
+
+Without --apply nothing is written. Bookings with no ledger events (bulk
+imports, generated data) are reported as extra but never deleted. --until
+replays the analytics as they stood at that moment, so it can only be
+reported, not applied.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api import ledger
+
+
+class Command(BaseCommand):
+    help = "Replay the booking event ledger and compare (or, with --apply, repair) bookings and the utilisation summary."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", action="store_true", help="Replay into SessionAttendee")
+        parser.add_argument("--analytics", action="store_true", help="Replay into the utilisation summary")
+        parser.add_argument("--apply", action="store_true", help="Write the replayed state instead of only reporting")
+        parser.add_argument("--until", help="Replay events up to this ISO datetime (analytics report only)")
+
+    def handle(self, *args, **options):
+        until = None
+        if options["until"]:
+            until = parse_datetime(options["until"])
+            if until is None:
+                raise CommandError("--until must be an ISO datetime, e.g. 2025-06-30T23:59:59")
+            if timezone.is_naive(until):
+                until = timezone.make_aware(until)
+            if options["apply"] or options["bookings"]:
+                raise CommandError("--until can only be used to report analytics")
+        both = not options["bookings"] and not options["analytics"]
+        # Events buffered by this process (none, unless called from a shell) are part of the history
+        ledger.flush()
+
+        if options["bookings"] or (both and until is None):
+            counts = ledger.reconcile_bookings(apply=options["apply"])
+            verb = "Repaired" if options["apply"] else "Found"
+            self.stdout.write(self.style.SUCCESS(
+                f"Bookings: {verb} {counts['missing']} missing and {counts['changed']} changed attendance row(s);"
+                f" {counts['extra']} row(s) not in the ledger left in place."
+            ))
+        if options["analytics"] or both:
+            counts = ledger.replay_summary(until=until, apply=options["apply"])
+            verb = "rewritten" if options["apply"] else "differ"
+            self.stdout.write(self.style.SUCCESS(
+                f"Analytics: replayed {counts['bookings']} booking(s), {counts['no_shows']} no-show(s);"
+                f" {counts['differ']} summary bucket(s) {verb}."
+            ))
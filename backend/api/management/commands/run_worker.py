@@ -0,0 +1,84 @@
+"""
+Run queued background tasks (see api.tasks).
+
+    python manage.py run_worker                 # run forever (Procfile "worker" process)
+    python manage.py run_worker --once          # drain the due tasks and exit (cron, tests)
+
+Several workers can run at once; each claims tasks without blocking the
+others. SIGTERM/SIGINT stop the worker after the task it is running.
+
+Every settings.REMINDER_INTERVAL seconds a worker also queues the
+send_reminders task (unless one is already waiting), so session reminders
+go out without a separate scheduler.
+"""
+
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import tasks
+
+MAINTENANCE_EVERY = 60  # Seconds between requeueing stale tasks and pruning finished ones
+
+
+class Command(BaseCommand):
+    help = "Claim and run queued background tasks (SKIP LOCKED on PostgreSQL, compare-and-set elsewhere)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when no task is due instead of polling")
+        parser.add_argument("--batch", type=int, default=1, help="Tasks claimed per round trip")
+        parser.add_argument("--max-tasks", type=int, default=None, help="Exit after running this many tasks")
+        parser.add_argument("--poll-interval", type=float, default=None,
+                            help="Seconds to sleep when idle (default: settings.TASK_POLL_INTERVAL)")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        poll_interval = settings.TASK_POLL_INTERVAL if options["poll_interval"] is None else options["poll_interval"]
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        ran = failed = 0
+        maintained_at = reminded_at = 0
+        while not self.stopping:
+            # Long-running process: drop connections past CONN_MAX_AGE or broken, as requests do
+            close_old_connections()
+            if settings.REMINDER_INTERVAL is not None and time.monotonic() - reminded_at >= settings.REMINDER_INTERVAL:
+                tasks.enqueue_unless_pending(tasks.send_reminders)
+                reminded_at = time.monotonic()
+            if time.monotonic() - maintained_at >= MAINTENANCE_EVERY:
+                requeued, abandoned = tasks.requeue_stale()
+                if requeued or abandoned:
+                    self.stdout.write(self.style.WARNING(
+                        f"Requeued {requeued} stale task(s), marked {abandoned} without attempts left failed."
+                    ))
+                tasks.prune_finished()
+                maintained_at = time.monotonic()
+
+            claimed = tasks.claim(worker, limit=options["batch"])
+            if not claimed:
+                if options["once"]:
+                    break
+                time.sleep(poll_interval)
+                continue
+            for index, task in enumerate(claimed):
+                if self.stopping:
+                    tasks.release(claimed[index:])
+                    break
+                task = tasks.run(task)
+                ran += 1
+                failed += task.status != task.SUCCEEDED
+                outcome = f"{task} in {task.duration_ms} ms"
+                self.stdout.write(self.style.SUCCESS(outcome) if task.status == task.SUCCEEDED else self.style.ERROR(outcome))
+            if options["max_tasks"] is not None and ran >= options["max_tasks"]:
+                break
+
+        self.stdout.write(f"Worker {worker} stopped after {ran} task(s), {failed} not successful.")
+
+    def stop(self, signum, frame):
+        self.stopping = True
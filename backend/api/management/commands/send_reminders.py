@@ -0,0 +1,42 @@
+"""
+Queue and deliver session reminders (see api.notifications).
+
+    python manage.py send_reminders                  # one pass (e.g. Heroku Scheduler every 10 minutes)
+    python manage.py send_reminders --loop --interval 300
+
+`manage.py run_worker` already queues a pass every REMINDER_INTERVAL
+seconds; use this command where no worker runs. Passes may overlap: each
+notification is claimed before it is sent.
+
+Each pass queues reminders for bookings of sessions starting within
+REMINDER_LEAD_MINUTES (a few queries per REMINDER_WINDOW_MINUTES window;
+bookings already reminded are skipped) and sends whatever is pending.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.notifications import deliver_pending, schedule_reminders
+
+
+class Command(BaseCommand):
+    help = "Queue reminders for upcoming booked sessions and deliver pending notifications."\
+           " Use --loop to keep running on a schedule (e.g. as a worker dyno)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-deliver", action="store_true", help="Only queue reminders, do not send them")
+        parser.add_argument("--loop", action="store_true", help="Run forever, every --interval seconds")
+        parser.add_argument("--interval", type=int, default=300, help="Seconds between runs in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            queued = schedule_reminders()
+            message = f"Queued {queued} reminder(s)."
+            if not options["no_deliver"]:
+                counts = deliver_pending()
+                message += f" Sent {counts['sent']}, cancelled {counts['cancelled']}, failed {counts['failed']}."
+            self.stdout.write(self.style.SUCCESS(message))
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,280 @@
+"""
+Booking-storm load harness.
+
+Starts the Django app in-process (or targets an already running server such as
+a local gunicorn) and drives many simulated members concurrently through the
+real HTTP flow a member follows:
+
+    POST /api/token/  →  GET /api/sessions/  →  POST /api/sessions/{id}/book/
+
+All bookings are aimed at a handful of "hot" sessions so capacity checks are
+exercised under contention. The report includes throughput, error rates,
+latency percentiles per operation and any capacity violations (sessions that
+ended up with more attendees than their capacity, or more "Booked" responses
+than spots).
+
+Usage:
+    python manage.py stress_bookings --members 300 --concurrency 50
+    python manage.py stress_bookings --server http://127.0.0.1:8000 --json
+
+The harness works against whatever database the settings point at (SQLite by
+default, PostgreSQL when DATABASE_URL is set). Members and sessions it creates
+are prefixed and removed afterwards unless --keep-data is given.
+"""
+
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connections
+from django.test.utils import override_settings
+
+from api.models import Session, delete_members
+
+PASSWORD = "stress-pass-123"
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every request to the console."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _HarnessServer(ThreadedWSGIServer):
+    """Threaded WSGI server with a listen backlog large enough for a storm."""
+
+    request_queue_size = 256
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Command(BaseCommand):
+    help = "Drive concurrent members through token/list/book against hot sessions and report throughput, errors, latency and capacity violations."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=200, help="Number of simulated members")
+        parser.add_argument("--sessions", type=int, default=3, help="Number of hot sessions to book")
+        parser.add_argument("--capacity", type=int, default=20, help="Capacity of each hot session")
+        parser.add_argument("--concurrency", type=int, default=50, help="Number of concurrent member threads")
+        parser.add_argument("--server", default=None, help="Base URL of a running server (default: start one in-process)")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for session choice")
+        parser.add_argument("--keep-throttles", action="store_true", help="Leave DRF throttling enabled for the in-process server")
+        parser.add_argument("--keep-data", action="store_true", help="Do not delete the generated members and sessions")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        prefix = f"stress{int(time.time() * 1000) % 10**10}_"
+        members, sessions = self.create_fixtures(prefix, options)
+
+        # Fixtures must be committed and visible before server threads connect
+        connections.close_all()
+
+        server = thread = None
+        base_url = options["server"]
+        if not base_url:
+            server, thread = self.start_server()
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        no_throttles = None
+        if server and not options["keep_throttles"]:
+            # Hundreds of logins from 127.0.0.1 would otherwise trip the login
+            # scope; api.throttling reads the rates per request, None = no limit
+            rest_framework = settings.REST_FRAMEWORK
+            no_throttles = override_settings(REST_FRAMEWORK={
+                **rest_framework,
+                "DEFAULT_THROTTLE_RATES": dict.fromkeys(rest_framework["DEFAULT_THROTTLE_RATES"]),
+            })
+            no_throttles.enable()
+
+        try:
+            report = self.run_storm(base_url.rstrip("/"), members, sessions, options)
+        finally:
+            if no_throttles:
+                no_throttles.disable()
+            if server:
+                server.shutdown()
+                server.server_close()
+                thread.join()
+            connections.close_all()
+
+        report["capacity_violations"] = self.find_capacity_violations(sessions, report.pop("booked_responses"))
+
+        if not options["keep_data"]:
+            Session.objects.filter(pk__in=[s.pk for s in sessions]).delete()
+            delete_members(User.objects.filter(username__startswith=prefix))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    # -------------------
+    # Setup
+    # -------------------
+    def create_fixtures(self, prefix, options):
+        """Bulk-create members (sharing one password hash) and hot sessions."""
+        password_hash = make_password(PASSWORD)
+        User.objects.bulk_create(
+            [User(username=f"{prefix}{i}", password=password_hash) for i in range(options["members"])],
+            batch_size=500,
+        )
+        members = [f"{prefix}{i}" for i in range(options["members"])]
+
+        trainer = User.objects.create_user(username=f"{prefix}trainer", password=PASSWORD, is_staff=True)
+        first_start = (datetime.now() + timedelta(days=1)).replace(second=0, microsecond=0)
+        starts = [first_start + timedelta(hours=i) for i in range(options["sessions"])]
+        # date and time come from the same datetime so a run past midnight lands on the next day
+        sessions = [
+            Session.objects.create(
+                trainer=trainer,
+                activity_type="hiit",
+                date=start.date(),
+                time=start.time(),
+                capacity=options["capacity"],
+                duration_minutes=60,
+            )
+            for start in starts
+        ]
+        return members, sessions
+
+    def start_server(self):
+        server = _HarnessServer(("127.0.0.1", 0), _QuietRequestHandler)
+        server.set_app(get_internal_wsgi_application())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server, thread
+
+    # -------------------
+    # Load generation
+    # -------------------
+    def run_storm(self, base_url, members, sessions, options):
+        rng = random.Random(options["seed"])
+        targets = [rng.choice(sessions).pk for _ in members]
+        samples = []            # (operation, http_status, latency_seconds, response status or None)
+        booked = defaultdict(int)
+        lock = threading.Lock()
+
+        def request(method, path, body=None, token=None):
+            data = json.dumps(body).encode() if body is not None else None
+            req = urllib.request.Request(base_url + path, data=data, method=method)
+            req.add_header("Content-Type", "application/json")
+            if token:
+                req.add_header("Authorization", f"Bearer {token}")
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=60) as res:
+                    status, payload = res.status, res.read()
+            except urllib.error.HTTPError as exc:
+                status, payload = exc.code, exc.read()
+            except (urllib.error.URLError, OSError):
+                status, payload = 0, b""
+            return status, payload, time.perf_counter() - started
+
+        def member_flow(username, session_id):
+            results = []
+            status, payload, elapsed = request("POST", "/api/token/", {"username": username, "password": PASSWORD})
+            results.append(("token", status, elapsed, None))
+            if status == 200:
+                token = json.loads(payload)["access"]
+                status, _, elapsed = request("GET", "/api/sessions/", token=token)
+                results.append(("list", status, elapsed, None))
+                status, payload, elapsed = request("POST", f"/api/sessions/{session_id}/book/", token=token)
+                try:
+                    outcome = json.loads(payload).get("status")
+                except (ValueError, AttributeError):
+                    outcome = None
+                results.append(("book", status, elapsed, outcome))
+                if status == 200 and outcome == "Booked":
+                    with lock:
+                        booked[session_id] += 1
+            with lock:
+                samples.extend(results)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(member_flow, members, targets))
+        wall = time.perf_counter() - started
+
+        operations = {}
+        for op in ("token", "list", "book"):
+            latencies = [s[2] for s in samples if s[0] == op]
+            # A "Full" booking is a correct 400 answer under contention, not an error
+            errors = [s[1] for s in samples if s[0] == op and s[1] != 200 and s[3] != "Full"]
+            operations[op] = {
+                "requests": len(latencies),
+                "errors": len(errors),
+                "error_rate": round(len(errors) / len(latencies), 4) if latencies else 0.0,
+                "status_codes": {str(code): errors.count(code) for code in sorted(set(errors))},
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                "max_ms": round(max(latencies, default=0) * 1000, 1),
+            }
+        operations["book"]["rejected_full"] = sum(1 for s in samples if s[0] == "book" and s[3] == "Full")
+
+        return {
+            "members": len(members),
+            "sessions": len(sessions),
+            "concurrency": options["concurrency"],
+            "wall_seconds": round(wall, 3),
+            "requests_per_second": round(len(samples) / wall, 1) if wall else 0.0,
+            "bookings_per_second": round(sum(booked.values()) / wall, 1) if wall else 0.0,
+            "operations": operations,
+            "booked_responses": dict(booked),
+        }
+
+    # -------------------
+    # Reporting
+    # -------------------
+    def find_capacity_violations(self, sessions, booked_responses):
+        """Compare stored attendees and "Booked" responses against capacity."""
+        violations = []
+        for session in sessions:
+            stored = session.attendees.count()
+            confirmed = booked_responses.get(session.pk, 0)
+            if stored > session.capacity or confirmed > session.capacity:
+                violations.append({
+                    "session_id": session.pk,
+                    "capacity": session.capacity,
+                    "attendees": stored,
+                    "booked_responses": confirmed,
+                })
+        return violations
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['members']} members, {report['sessions']} hot sessions, "
+            f"concurrency {report['concurrency']}, {report['wall_seconds']}s wall"
+        )
+        self.stdout.write(
+            f"Throughput: {report['requests_per_second']} req/s, {report['bookings_per_second']} bookings/s"
+        )
+        for op, stats in report["operations"].items():
+            self.stdout.write(
+                f"  {op:<6} n={stats['requests']:<5} errors={stats['errors']} ({stats['error_rate']:.2%}) "
+                f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms max={stats['max_ms']}ms"
+                + (f" codes={stats['status_codes']}" if stats["status_codes"] else "")
+            )
+        if report["capacity_violations"]:
+            self.stdout.write(self.style.ERROR(f"Capacity violations: {report['capacity_violations']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No capacity violations."))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_session_duration_minutes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UtilizationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(choices=[('cardio', 'Cardio'), ('weights', 'Weightlifting'), ('yoga', 'Yoga'), ('hiit', 'HIIT'), ('pilates', 'Pilates')], max_length=20)),
+                ('weekday', models.PositiveSmallIntegerField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('sessions', models.IntegerField(default=0)),
+                ('capacity', models.IntegerField(default=0)),
+                ('bookings', models.IntegerField(default=0)),
+                ('no_shows', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('activity_type', 'weekday', 'hour')},
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:53
+
+import sys
+from datetime import datetime, timedelta
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+from api import overlap_constraint
+
+
+def backfill_intervals(apps, schema_editor):
+    Session = apps.get_model('api', 'Session')
+    batch = []
+    for session in Session.objects.only('id', 'date', 'time', 'duration_minutes').iterator(chunk_size=2000):
+        session.start_at = timezone.make_aware(datetime.combine(session.date, session.time))
+        session.end_at = session.start_at + timedelta(minutes=session.duration_minutes)
+        batch.append(session)
+        if len(batch) >= 2000:
+            Session.objects.bulk_update(batch, ['start_at', 'end_at'])
+            batch = []
+    if batch:
+        Session.objects.bulk_update(batch, ['start_at', 'end_at'])
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    """
+    On PostgreSQL, let the database itself reject overlapping sessions per trainer.
+
+    Existing overlaps are listed and the constraint skipped rather than failing
+    the migration; fix them, then run `manage.py add_overlap_constraint`.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    overlaps = overlap_constraint.find_overlaps(connection)
+    if overlaps:
+        sys.stderr.write(
+            f"\n  Skipped {overlap_constraint.CONSTRAINT_NAME}: these sessions overlap for the same trainer"
+            f" (first {len(overlaps)} shown). Change their trainer or time, then run"
+            f" `manage.py add_overlap_constraint`.\n{overlap_constraint.describe_overlaps(overlaps)}\n"
+        )
+        return
+    overlap_constraint.add_constraint(connection)
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        overlap_constraint.drop_constraint(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_utilizationsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='end_at',
+            field=models.DateTimeField(editable=False, help_text='Session end (start plus duration)', null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='start_at',
+            field=models.DateTimeField(editable=False, help_text='Session start (derived from date and time)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='duration_minutes',
+            field=models.IntegerField(default=60, help_text='Duration of the session in minutes', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)]),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['trainer', 'start_at', 'end_at'], name='session_trainer_interval_idx'),
+        ),
+        migrations.RunPython(backfill_intervals, migrations.RunPython.noop),
+        migrations.RunPython(add_exclusion_constraint, drop_exclusion_constraint),
+    ]
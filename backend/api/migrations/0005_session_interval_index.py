@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_session_interval'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['start_at', 'end_at'], name='session_interval_idx'),
+        ),
+    ]
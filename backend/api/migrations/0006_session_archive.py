@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_session_interval_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSession',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('activity_type', models.CharField(choices=[('cardio', 'Cardio'), ('weights', 'Weightlifting'), ('yoga', 'Yoga'), ('hiit', 'HIIT'), ('pilates', 'Pilates')], max_length=20)),
+                ('trainer_username', models.CharField(max_length=150)),
+                ('date', models.DateField(db_index=True)),
+                ('time', models.TimeField()),
+                ('duration_minutes', models.IntegerField(default=60)),
+                ('capacity', models.IntegerField(default=10)),
+                ('start_at', models.DateTimeField(null=True)),
+                ('end_at', models.DateTimeField(null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('trainer', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_trainer_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedSessionAttendee',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('attended', models.BooleanField(default=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance', to='api.archivedsession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('session', 'user')},
+            },
+        ),
+    ]
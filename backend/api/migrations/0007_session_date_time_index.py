@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_session_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['date', 'time'], name='session_date_time_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_booked_count(apps, schema_editor):
+    Session = apps.get_model('api', 'Session')
+    SessionAttendee = apps.get_model('api', 'SessionAttendee')
+    booked = (
+        SessionAttendee.objects.filter(session=models.OuterRef('pk'))
+        .order_by()
+        .values('session')
+        .annotate(count=models.Count('id'))
+        .values('count')
+    )
+    Session.objects.update(booked_count=Coalesce(models.Subquery(booked, output_field=models.IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='booked_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of attendees booked (maintained alongside SessionAttendee)'),
+        ),
+        migrations.RunPython(backfill_booked_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('booked_count__lt', models.F('capacity'))), fields=['start_at'], name='session_open_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('booked_count__lt', models.F('capacity'))), fields=['activity_type', 'start_at'], name='session_open_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:03
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_session_booked_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='occurrence_date',
+            field=models.DateField(blank=True, help_text='Template occurrence this session stands for (its original date)', null=True),
+        ),
+        migrations.CreateModel(
+            name='SessionTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(choices=[('cardio', 'Cardio'), ('weights', 'Weightlifting'), ('yoga', 'Yoga'), ('hiit', 'HIIT'), ('pilates', 'Pilates')], default='cardio', max_length=20)),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('time', models.TimeField()),
+                ('duration_minutes', models.IntegerField(default=60, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)])),
+                ('capacity', models.IntegerField(default=10)),
+                ('starts_on', models.DateField()),
+                ('ends_on', models.DateField(blank=True, null=True)),
+                ('skipped_dates', models.JSONField(blank=True, default=list)),
+                ('trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_templates', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='template',
+            field=models.ForeignKey(blank=True, help_text='Recurring template this session was created from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='api.sessiontemplate'),
+        ),
+        migrations.AddConstraint(
+            model_name='session',
+            constraint=models.UniqueConstraint(fields=('occurrence_date', 'template'), name='session_template_occurrence_unique'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:19
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_current_bookings(apps, schema_editor):
+    # Open the ledger with the bookings that already exist, so replaying it reproduces them
+    BookingEvent = apps.get_model('api', 'BookingEvent')
+    now = timezone.now()
+    for model_name in ('ArchivedSessionAttendee', 'SessionAttendee'):
+        rows = apps.get_model('api', model_name).objects.order_by('pk').values_list('session_id', 'user_id', 'attended')
+        batch = []
+        for session_id, user_id, attended in rows.iterator(chunk_size=2000):
+            batch.append(BookingEvent(
+                kind='booked', session_id=session_id, user_id=user_id, attended=attended, occurred_at=now,
+            ))
+            if len(batch) == 2000:
+                BookingEvent.objects.bulk_create(batch)
+                batch = []
+        BookingEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('booked', 'Booked'), ('cancelled', 'Cancelled by the member'), ('removed', 'Removed by staff'), ('attended', 'Marked attended'), ('no_show', 'Marked no-show')], max_length=10)),
+                ('session_id', models.BigIntegerField(db_index=True)),
+                ('user_id', models.BigIntegerField()),
+                ('actor_id', models.BigIntegerField(blank=True, null=True)),
+                ('attended', models.BooleanField(default=True)),
+                ('occurred_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['occurred_at', 'id'], name='bookingevent_replay_idx')],
+            },
+        ),
+        migrations.RunPython(seed_current_bookings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_notification_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='claimed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the request now holding the key claimed it'),
+        ),
+    ]
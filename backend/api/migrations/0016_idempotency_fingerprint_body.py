@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_idempotency_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='request_fingerprint',
+            field=models.CharField(help_text='Method, path and body hash of the request the key was first used for', max_length=255),
+        ),
+    ]
@@ -4,13 +4,24 @@ Database models for the GymFlex API application.
 This module defines the data structures (database tables) for the application:
 - Note: Simple note-taking model (may be legacy/unused)
 - Session: Fitness class sessions with trainers, schedules, and attendee bookings
+- UtilizationSummary: Pre-aggregated booking counters for the analytics endpoint
+- ArchivedSession / ArchivedSessionAttendee: Cold storage for sessions past the retention window
+- IdempotencyKey: Stored outcomes of book/cancel requests sent with an Idempotency-Key header
 
 Django ORM (Object-Relational Mapping) converts these Python classes into database tables
 and provides a high-level API for querying and manipulating data without writing SQL.
 """
 
-from django.db import models
+from datetime import date, datetime, time, timedelta
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+
+from .signals import booking_changed
 
 # ---------------------
 # SessionAttendee Through Model
@@ -61,6 +72,41 @@ class Note(models.Model):
 # ---------------------
 # Session Model
 # ---------------------
+class SessionQuerySet(models.QuerySet):
+    """Booking-related filters and annotations for sessions."""
+
+    def with_space(self):
+        """Sessions with at least one free spot (served by the partial *_open_* indexes)."""
+        return self.filter(booked_count__lt=models.F("capacity"))
+
+    def with_booked_by(self, user):
+        """Annotate is_booked: whether `user` holds a booking for the session."""
+        return self.annotate(
+            is_booked=models.Exists(SessionAttendee.objects.filter(session=models.OuterRef("pk"), user=user))
+        )
+
+    def recount_bookings(self):
+        """
+        Recompute booked_count from api_sessionattendee for these sessions.
+
+        For code that writes bookings in bulk (generate_dataset, seed scripts);
+        everything else adjusts the count as it books (Session.change_booked_count).
+        Deleting one user recounts their booked sessions automatically, and
+        delete_members() does so for a queryset of users; any other
+        SessionAttendee delete outside api.booking and the admin must call this.
+        """
+        booked = (
+            SessionAttendee.objects.filter(session=models.OuterRef("pk"))
+            .order_by()
+            .values("session")
+            .annotate(count=models.Count("id"))
+            .values("count")
+        )
+        updated = self.update(booked_count=Coalesce(models.Subquery(booked, output_field=models.IntegerField()), 0))
+        booking_changed.send(sender=Session, session_id=None, date=None, delta=None)
+        return updated
+
+
 class Session(models.Model):
     """
     Represents a fitness class session at the gym.
@@ -71,12 +117,26 @@ class Session(models.Model):
     
     Business rules:
     - Each session has one trainer (staff user)
+    - A trainer cannot run two sessions that overlap in time (see api.scheduling)
     - Multiple users can book a session (up to capacity limit)
     - Attendees are tracked via a many-to-many relationship
     - Activity types are restricted to predefined choices
     
+    start_at/end_at store the session interval (date + time + duration) so
+    overlap checks are a single indexed range query instead of a scan of the
+    trainer's whole schedule. They are filled in by save(); code that uses
+    bulk_create must call set_bounds() itself.
+    
+    Sessions created from a SessionTemplate (when the first member books a
+    virtual occurrence, or staff edit it) keep the template and the
+    occurrence_date they stand for, so that occurrence is never listed as
+    virtual again even if the session is moved (see api.recurrence).
+    
     Database table name: api_session
     """
+
+    # Upper bound on duration_minutes; also bounds overlap range scans
+    MAX_DURATION_MINUTES = 24 * 60
     
     # Activity type choices for fitness class categorisation
     ACTIVITY_CHOICES = [
@@ -108,8 +168,13 @@ class Session(models.Model):
     time = models.TimeField(help_text="Start time for this session")
     duration_minutes = models.IntegerField(
         default=60,
+        validators=[MinValueValidator(1), MaxValueValidator(MAX_DURATION_MINUTES)],
         help_text="Duration of the session in minutes"
     )
+
+    # Stored interval derived from date, time and duration_minutes
+    start_at = models.DateTimeField(null=True, editable=False, help_text="Session start (derived from date and time)")
+    end_at = models.DateTimeField(null=True, editable=False, help_text="Session end (start plus duration)")
     
     # Capacity management
     capacity = models.IntegerField(
@@ -117,6 +182,14 @@ class Session(models.Model):
         help_text="Maximum number of attendees allowed to book this session"
     )
     
+    # Number of SessionAttendee rows, kept in step by every booking path so
+    # "has space" is a column comparison the partial indexes below can serve
+    booked_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of attendees booked (maintained alongside SessionAttendee)"
+    )
+    
     # Attendee bookings - many-to-many relationship via SessionAttendee
     attendees = models.ManyToManyField(
         User,
@@ -126,6 +199,84 @@ class Session(models.Model):
         help_text="Users who have booked a spot in this session"
     )
 
+    # Recurring sessions: the template and date this session materialises, if any
+    template = models.ForeignKey(
+        'SessionTemplate',
+        on_delete=models.SET_NULL,  # Keep materialised sessions (and their bookings) as one-offs
+        null=True,
+        blank=True,
+        related_name="sessions",
+        help_text="Recurring template this session was created from"
+    )
+    occurrence_date = models.DateField(
+        null=True,
+        blank=True,
+        help_text="Template occurrence this session stands for (its original date)"
+    )
+
+    objects = SessionQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One real session per template occurrence (concurrent first bookings race on this);
+            # led by occurrence_date so date-range lookups of materialised occurrences use it too
+            models.UniqueConstraint(fields=["occurrence_date", "template"], name="session_template_occurrence_unique"),
+        ]
+        indexes = [
+            # Serves trainer overlap checks: trainer = ? AND start_at < ? AND end_at > ?
+            models.Index(fields=["trainer", "start_at", "end_at"], name="session_trainer_interval_idx"),
+            # Serves member double-booking checks and other time-window scans
+            models.Index(fields=["start_at", "end_at"], name="session_interval_idx"),
+            # Serves the admin changelist ordering and date hierarchy
+            models.Index(fields=["date", "time"], name="session_date_time_idx"),
+            # Serve "next available" searches: only sessions with a free spot are indexed,
+            # so the index stays small and scans skip full classes
+            models.Index(
+                fields=["start_at"],
+                condition=models.Q(booked_count__lt=models.F("capacity")),
+                name="session_open_start_idx",
+            ),
+            models.Index(
+                fields=["activity_type", "start_at"],
+                condition=models.Q(booked_count__lt=models.F("capacity")),
+                name="session_open_activity_idx",
+            ),
+        ]
+
+    def set_bounds(self):
+        """
+        Normalise date/time (forms and scripts may pass strings) and compute start_at/end_at.
+        """
+        if isinstance(self.date, str):
+            self.date = parse_date(self.date)
+        if isinstance(self.time, str):
+            self.time = parse_time(self.time)
+        if isinstance(self.date, date) and isinstance(self.time, time):
+            self.start_at = timezone.make_aware(datetime.combine(self.date, self.time))
+            self.end_at = self.start_at + timedelta(minutes=self.duration_minutes or 0)
+
+    @property
+    def public_id(self):
+        """The id clients use: the primary key, or t{template}-{YYYYMMDD} for a virtual occurrence."""
+        return self.pk if self.pk is not None else getattr(self, "virtual_id", None)
+
+    def change_booked_count(self, delta):
+        """Apply a booking (+1) or cancellation (-1) to booked_count, in the database and on this instance."""
+        Session.objects.filter(pk=self.pk).update(booked_count=models.F("booked_count") + delta)
+        self.booked_count += delta
+        booking_changed.send(sender=Session, session_id=self.pk, date=self.date, delta=delta)
+
+    def save(self, *args, **kwargs):
+        self.set_bounds()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None and not self._state.adding and not kwargs.get("force_insert"):
+            # Never write back a booked_count read before a concurrent booking changed it
+            update_fields = [f.attname for f in self._meta.concrete_fields if not f.primary_key and f.name != "booked_count"]
+            kwargs["update_fields"] = update_fields
+        if update_fields is not None and {"date", "time", "duration_minutes"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"start_at", "end_at"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         """
         Human-readable string representation for admin panel and debugging.
@@ -133,3 +284,423 @@ class Session(models.Model):
         Format: "Yoga with john_trainer on 2025-01-15 at 10:00:00"
         """
         return f"{self.activity_type} with {self.trainer.username} on {self.date} at {self.time}"
+
+
+# Deleting a member cascades to their SessionAttendee rows without going through
+# the booking code, so the sessions they had booked are recounted afterwards.
+# The receivers only act on a single user.delete(); deleting a queryset of
+# users goes through delete_members(), which does the same once for all of them
+# instead of a query pair per user.
+def remember_booked_sessions(sender, instance, origin=None, **kwargs):
+    if origin is not instance:
+        return
+    instance._booked_session_ids = list(SessionAttendee.objects.filter(user=instance).values_list("session_id", flat=True))
+
+
+def recount_booked_sessions(sender, instance, **kwargs):
+    session_ids = getattr(instance, "_booked_session_ids", None)
+    if session_ids:
+        Session.objects.filter(pk__in=session_ids).recount_bookings()
+
+
+models.signals.pre_delete.connect(remember_booked_sessions, sender=User, dispatch_uid="booked_count_user_pre_delete")
+models.signals.post_delete.connect(recount_booked_sessions, sender=User, dispatch_uid="booked_count_user_post_delete")
+
+
+def delete_members(users, chunk_size=500):
+    """
+    Delete a queryset of users and recount the sessions they had booked.
+
+    The booked sessions are collected with one query before the delete and
+    recounted in chunks of `chunk_size` after it.
+
+    Returns:
+        tuple: what QuerySet.delete() returns
+    """
+    with transaction.atomic():
+        session_ids = list(
+            SessionAttendee.objects.filter(user__in=users).order_by().values_list("session_id", flat=True).distinct()
+        )
+        deleted = users.delete()
+        for start in range(0, len(session_ids), chunk_size):
+            Session.objects.filter(pk__in=session_ids[start:start + chunk_size]).recount_bookings()
+    return deleted
+
+
+# ---------------------
+# SessionTemplate Model
+# ---------------------
+class SessionTemplate(models.Model):
+    """
+    A weekly recurring class, e.g. "yoga with sam every Monday at 18:00".
+
+    Templates are not expanded into Session rows ahead of time: the session
+    list, calendar and searches show their occurrences as virtual sessions
+    (id "t{template id}-{YYYYMMDD}", no row), and a real Session is created
+    only when the first member books an occurrence or staff edit it (see
+    api.recurrence). The timetable then costs one row per template plus one
+    per class anybody booked, however far ahead it runs.
+
+    Fields:
+        trainer: Staff member leading the class
+        activity_type, time, duration_minutes, capacity: As on Session
+        weekday: Day of the week (0 = Monday ... 6 = Sunday, as date.weekday())
+        starts_on / ends_on: First and last date with an occurrence (ends_on empty = open-ended)
+        skipped_dates: ISO dates with no occurrence (cancelled or deleted classes)
+
+    Database table name: api_sessiontemplate
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    trainer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="session_templates")
+    activity_type = models.CharField(max_length=20, choices=Session.ACTIVITY_CHOICES, default='cardio')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    time = models.TimeField()
+    duration_minutes = models.IntegerField(
+        default=60,
+        validators=[MinValueValidator(1), MaxValueValidator(Session.MAX_DURATION_MINUTES)],
+    )
+    capacity = models.IntegerField(default=10)
+    starts_on = models.DateField()
+    ends_on = models.DateField(null=True, blank=True)
+    skipped_dates = models.JSONField(default=list, blank=True)
+
+    def occurs_on(self, day):
+        """Whether the template has an occurrence on `day`."""
+        return (
+            day.weekday() == self.weekday
+            and self.starts_on <= day
+            and (self.ends_on is None or day <= self.ends_on)
+            and day.isoformat() not in self.skipped_dates
+        )
+
+    def dates(self, start, end):
+        """Occurrence dates between `start` and `end` (inclusive)."""
+        day = max(start, self.starts_on)
+        day += timedelta(days=(self.weekday - day.weekday()) % 7)
+        last = end if self.ends_on is None else min(end, self.ends_on)
+        while day <= last:
+            if day.isoformat() not in self.skipped_dates:
+                yield day
+            day += timedelta(days=7)
+
+    def occurrence(self, day):
+        """The unsaved Session for the occurrence on `day`."""
+        session = Session(
+            trainer=self.trainer,
+            activity_type=self.activity_type,
+            date=day,
+            time=self.time,
+            duration_minutes=self.duration_minutes,
+            capacity=self.capacity,
+            template=self,
+            occurrence_date=day,
+        )
+        session.set_bounds()
+        session.virtual_id = f"t{self.pk}-{day:%Y%m%d}"
+        session.is_booked = False  # Nobody has booked an occurrence without a row
+        return session
+
+    def skip(self, day):
+        """Remove the occurrence on `day` from the timetable."""
+        if day.isoformat() not in self.skipped_dates:
+            self.skipped_dates = sorted(self.skipped_dates + [day.isoformat()])
+            self.save(update_fields=["skipped_dates"])
+
+    def __str__(self):
+        return f"{self.activity_type} with {self.trainer.username} every {self.get_weekday_display()} at {self.time}"
+
+
+# ---------------------
+# UtilizationSummary Model
+# ---------------------
+class UtilizationSummary(models.Model):
+    """
+    Pre-aggregated utilisation counters for one (activity, weekday, hour) bucket.
+
+    Maintained incrementally by api.analytics whenever sessions are created,
+    edited or deleted and whenever bookings or attendance change, so the
+    analytics endpoint reads a few hundred rows instead of aggregating the
+    whole api_sessionattendee table. `manage.py rebuild_utilization`
+    recomputes every row from scratch (e.g. after bulk imports).
+
+    Fields:
+        activity_type: Activity of the sessions in this bucket
+        weekday: ISO weekday of the session date (1 = Monday ... 7 = Sunday)
+        hour: Hour of the session start time (0-23)
+        sessions: Number of sessions in the bucket
+        capacity: Sum of the sessions' capacities
+        bookings: Number of SessionAttendee rows for those sessions
+        no_shows: Bookings marked as not attended
+
+    Database table name: api_utilizationsummary
+    """
+    activity_type = models.CharField(max_length=20, choices=Session.ACTIVITY_CHOICES)
+    weekday = models.PositiveSmallIntegerField()
+    hour = models.PositiveSmallIntegerField()
+    sessions = models.IntegerField(default=0)
+    capacity = models.IntegerField(default=0)
+    bookings = models.IntegerField(default=0)
+    no_shows = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('activity_type', 'weekday', 'hour')
+
+    def __str__(self):
+        return f"{self.activity_type} weekday {self.weekday} {self.hour:02d}:00"
+
+
+# ---------------------
+# Archive (cold) Models
+# ---------------------
+class ArchivedSession(models.Model):
+    """
+    A session moved out of api_session by `manage.py archive_sessions`.
+
+    Keeps the original Session primary key so references in exports and
+    analytics stay stable. The trainer's username is copied so history still
+    reads correctly if the trainer account is later removed.
+
+    Database table name: api_archivedsession
+    """
+    id = models.BigIntegerField(primary_key=True)  # Original Session.id
+    activity_type = models.CharField(max_length=20, choices=Session.ACTIVITY_CHOICES)
+    trainer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="archived_trainer_sessions")
+    trainer_username = models.CharField(max_length=150)
+    date = models.DateField(db_index=True)
+    time = models.TimeField()
+    duration_minutes = models.IntegerField(default=60)
+    capacity = models.IntegerField(default=10)
+    start_at = models.DateTimeField(null=True)
+    end_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.activity_type} with {self.trainer_username} on {self.date} at {self.time} (archived)"
+
+
+class ArchivedSessionAttendee(models.Model):
+    """
+    An attendance row that belonged to an ArchivedSession.
+
+    Database table name: api_archivedsessionattendee
+    """
+    id = models.BigIntegerField(primary_key=True)  # Original SessionAttendee.id
+    session = models.ForeignKey(ArchivedSession, on_delete=models.CASCADE, related_name="attendance")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_attendance")
+    attended = models.BooleanField(default=True)
+
+    class Meta:
+        unique_together = ('session', 'user')
+
+    def __str__(self):
+        return f"user {self.user_id} in archived session {self.session_id} (attended: {self.attended})"
+
+
+# ---------------------
+# Idempotency Keys
+# ---------------------
+class IdempotencyKey(models.Model):
+    """
+    The stored outcome of a request sent with an Idempotency-Key header (see api.idempotency).
+
+    A row is claimed (status_code null) before the request runs and completed
+    with its response afterwards; retries with the same key are answered from
+    it. A claim older than IDEMPOTENCY_CLAIM_LEASE_SECONDS can be taken over by
+    a retry (its request died). Rows expire after IDEMPOTENCY_KEY_TTL_SECONDS and are pruned as new
+    keys arrive, so the table stays bounded.
+
+    Database table name: api_idempotencykey
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    request_fingerprint = models.CharField(max_length=255, help_text="Method, path and body hash of the request the key was first used for")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Null while the request is in flight")
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    claimed_at = models.DateTimeField(default=timezone.now, help_text="When the request now holding the key claimed it")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} for user {self.user_id} ({self.status_code or 'in flight'})"
+
+
+# ---------------------
+# Background Tasks
+# ---------------------
+class Task(models.Model):
+    """
+    A unit of background work, queued in the database and run by `manage.py run_worker` (see api.tasks).
+
+    Rows move queued -> running -> succeeded, or back to queued (with a later
+    run_after) when an attempt fails and attempts remain, or to failed. The
+    timing fields record when each state was reached and how long the last
+    attempt took.
+
+    Database table name: api_task
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=100, help_text="Registered task name (see api.tasks)")
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    locked_by = models.CharField(max_length=100, blank=True, help_text="Worker running the task")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True, help_text="Start of the last attempt")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(null=True, blank=True, help_text="Run time of the last attempt")
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Serves the worker's claim query; only queued tasks are indexed
+            models.Index(fields=["run_after", "id"], condition=models.Q(status="queued"), name="task_queued_idx"),
+            # Serves requeueing of tasks whose worker died
+            models.Index(fields=["locked_at"], condition=models.Q(status="running"), name="task_running_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+# ---------------------
+# Notifications
+# ---------------------
+class Notification(models.Model):
+    """
+    Outbox of member notifications (session reminders), see api.notifications.
+
+    The scheduler writes rows here and a delivery pass hands pending ones to
+    the configured backend. The unique (user, session, kind) constraint makes
+    scheduling idempotent: re-scanning a window never queues a second
+    reminder for the same booking.
+
+    Database table name: api_notification
+    """
+    REMINDER = "reminder"
+    KIND_CHOICES = [(REMINDER, "Session reminder")]
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),  # Claimed by a delivery pass
+        (SENT, "Sent"),
+        (CANCELLED, "Cancelled"),  # The booking was cancelled before delivery
+        (FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="notifications")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=REMINDER)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True, help_text="When a delivery pass claimed it")
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["session", "user", "kind"], name="notification_once_per_booking"),
+        ]
+        indexes = [
+            # Serves the delivery pass; only pending rows are indexed
+            models.Index(fields=["id"], condition=models.Q(status="pending"), name="notification_pending_idx"),
+            # Serves failing claims of a delivery pass that died
+            models.Index(fields=["claimed_at"], condition=models.Q(status="sending"), name="notification_sending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.user_id} about session {self.session_id} ({self.status})"
+
+
+# ---------------------
+# Booking Event Ledger
+# ---------------------
+class BookingEventQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise TypeError("BookingEvent rows are append-only")
+
+    def delete(self):
+        raise TypeError("BookingEvent rows are append-only")
+
+
+class BookingEvent(models.Model):
+    """
+    Append-only history of bookings, cancellations and attendance marks, see api.ledger.
+
+    Written in batches from a per-process buffer, never updated or deleted.
+    Session and user are plain ids rather than foreign keys, so the history
+    outlives archived or deleted sessions and removed accounts. `attended` is
+    the booking's attended flag after the event.
+
+    Database table name: api_bookingevent
+    """
+    BOOKED = "booked"
+    CANCELLED = "cancelled"
+    REMOVED = "removed"
+    ATTENDED = "attended"
+    NO_SHOW = "no_show"
+    KIND_CHOICES = [
+        (BOOKED, "Booked"),
+        (CANCELLED, "Cancelled by the member"),
+        (REMOVED, "Removed by staff"),
+        (ATTENDED, "Marked attended"),
+        (NO_SHOW, "Marked no-show"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    session_id = models.BigIntegerField(db_index=True)
+    user_id = models.BigIntegerField()
+    actor_id = models.BigIntegerField(null=True, blank=True)  # Staff member who made the change, if not the member
+    attended = models.BooleanField(default=True)
+    occurred_at = models.DateTimeField()
+
+    objects = BookingEventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Replay order
+            models.Index(fields=["occurred_at", "id"], name="bookingevent_replay_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: user {self.user_id} in session {self.session_id} at {self.occurred_at}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError("BookingEvent rows are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("BookingEvent rows are append-only")
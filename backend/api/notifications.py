@@ -0,0 +1,219 @@
+"""
+Session reminders: a scheduler that fills the Notification outbox and a
+delivery pass that sends it.
+
+schedule_reminders() finds bookings for sessions starting within the next
+REMINDER_LEAD_MINUTES. It walks that period in REMINDER_WINDOW_MINUTES
+windows, and each window costs three queries however many bookings it
+holds:
+1. the sessions starting in the window that have bookings (served by the
+   start_at index),
+2. their attendance rows, minus those already reminded (a NOT EXISTS on
+   the notification_once_per_booking index), batch-loaded with usernames,
+3. one bulk insert of the new reminders. ignore_conflicts lets the unique
+   constraint drop any duplicate a concurrent run already queued.
+
+Running it again is cheap and queues nothing twice, so it runs every
+few minutes: `manage.py run_worker` queues the "send_reminders" task (see
+api.tasks) every REMINDER_INTERVAL seconds; without a worker, run
+`manage.py send_reminders --loop`.
+
+deliver_pending() hands pending notifications to the backend named by
+settings.NOTIFICATION_BACKEND in batches. Reminders whose booking was
+cancelled in the meantime are marked cancelled instead. Each batch is
+claimed (pending -> sending) before it is sent, the way api.tasks claims
+tasks: SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL, a compare-and-set
+UPDATE elsewhere. Passes that overlap (a slow pass and the next scheduled
+one) therefore never send the same reminder twice. Claims older than
+NOTIFICATION_CLAIM_TIMEOUT belong to a pass that died mid-send; they are
+marked failed rather than risking a second delivery.
+
+Backends are classes with a send(notifications) method that returns the
+ids delivered:
+- ConsoleBackend: logs each message (development default)
+- LocmemBackend: appends to LocmemBackend.outbox (tests)
+- EmailBackend: sends through Django's email settings (to the user's email)
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification, Session, SessionAttendee
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_BATCH = 200
+
+
+# -------------------
+# Scheduling
+# -------------------
+def reminder_text(session, username):
+    start = timezone.localtime(session.start_at)
+    subject = f"Reminder: {session.get_activity_type_display()} at {start:%H:%M}"
+    body = (
+        f"Hi {username}, your {session.get_activity_type_display()} class with "
+        f"{session.trainer.username} starts at {start:%H:%M} on {start:%A %d %B}."
+    )
+    return subject, body
+
+
+def schedule_window(start, end):
+    """Queue reminders for bookings of sessions starting in [start, end); returns how many were new."""
+    sessions = {
+        session.pk: session
+        for session in Session.objects.filter(start_at__gte=start, start_at__lt=end, booked_count__gt=0)
+        .select_related("trainer")
+        .only("pk", "activity_type", "start_at", "trainer__username")
+    }
+    if not sessions:
+        return 0
+    already_reminded = Notification.objects.filter(
+        session=OuterRef("session"), user=OuterRef("user"), kind=Notification.REMINDER
+    )
+    bookings = (
+        SessionAttendee.objects.filter(session_id__in=sessions)
+        .exclude(Exists(already_reminded))
+        .values_list("session_id", "user_id", "user__username")
+    )
+    reminders = []
+    for session_id, user_id, username in bookings:
+        subject, body = reminder_text(sessions[session_id], username)
+        reminders.append(Notification(
+            session_id=session_id, user_id=user_id, kind=Notification.REMINDER, subject=subject, body=body,
+        ))
+    Notification.objects.bulk_create(reminders, ignore_conflicts=True)
+    return len(reminders)
+
+
+def schedule_reminders(now=None):
+    """Queue reminders for every booking of a session starting within the lead time; returns how many."""
+    now = now or timezone.now()
+    end = now + timedelta(minutes=settings.REMINDER_LEAD_MINUTES)
+    step = timedelta(minutes=settings.REMINDER_WINDOW_MINUTES)
+    queued = 0
+    window = now
+    while window < end:
+        queued += schedule_window(window, min(window + step, end))
+        window += step
+    return queued
+
+
+# -------------------
+# Delivery
+# -------------------
+class ConsoleBackend:
+    """Log notifications instead of sending them."""
+
+    def send(self, notifications):
+        for notification in notifications:
+            logger.info("Notification to %s: %s - %s", notification.user.username, notification.subject, notification.body)
+        return [notification.pk for notification in notifications]
+
+
+class LocmemBackend:
+    """Keep sent notifications in memory (for tests)."""
+
+    outbox = []
+
+    def send(self, notifications):
+        LocmemBackend.outbox.extend(notifications)
+        return [notification.pk for notification in notifications]
+
+
+class EmailBackend:
+    """
+    Email each notification to its user through Django's email settings.
+
+    Users without an address are skipped. A message the mail server refuses
+    is logged and left out of the result, so one bad address fails only its
+    own notification and the rest of the batch is still sent.
+    """
+
+    def send(self, notifications):
+        sent = []
+        for notification in notifications:
+            if not notification.user.email:
+                continue
+            try:
+                send_mail(notification.subject, notification.body, None, [notification.user.email])
+            except Exception:
+                logger.exception("Could not email notification %s", notification.pk)
+                continue
+            sent.append(notification.pk)
+        return sent
+
+
+def get_backend():
+    return import_string(settings.NOTIFICATION_BACKEND)()
+
+
+def claim(limit):
+    """Mark up to `limit` pending notifications as sending; returns them (with their users)."""
+    pending = Notification.objects.filter(status=Notification.PENDING).order_by("pk")
+    sending = {"status": Notification.SENDING, "claimed_at": timezone.now()}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(pending.select_for_update(skip_locked=True).values_list("pk", flat=True)[:limit])
+            Notification.objects.filter(pk__in=ids).update(**sending)
+    else:
+        ids = []
+        for pk in pending.values_list("pk", flat=True)[:limit]:
+            # Compare-and-set: only one pass's update can still see the notification pending
+            if Notification.objects.filter(pk=pk, status=Notification.PENDING).update(**sending):
+                ids.append(pk)
+    return list(Notification.objects.filter(pk__in=ids).select_related("user").order_by("pk"))
+
+
+def fail_abandoned(timeout=None):
+    """Mark notifications claimed more than `timeout` seconds ago and never sent as failed; returns how many."""
+    timeout = settings.NOTIFICATION_CLAIM_TIMEOUT if timeout is None else timeout
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Notification.objects.filter(status=Notification.SENDING, claimed_at__lt=cutoff).update(
+        status=Notification.FAILED, error="Delivery was interrupted"
+    )
+
+
+def deliver_pending(backend=None, batch_size=DELIVERY_BATCH):
+    """
+    Send pending notifications in batches.
+
+    Returns:
+        dict: counts of notifications sent, cancelled and failed
+    """
+    backend = backend or get_backend()
+    pending = Notification.objects.filter(status=Notification.PENDING)
+    # Reminders for bookings cancelled since they were queued are never sent
+    booked = SessionAttendee.objects.filter(session=OuterRef("session"), user=OuterRef("user"))
+    counts = {
+        "sent": 0,
+        "cancelled": pending.exclude(Exists(booked)).update(status=Notification.CANCELLED),
+        "failed": fail_abandoned(),
+    }
+
+    while True:
+        notifications = claim(batch_size)
+        if not notifications:
+            return counts
+        try:
+            sent = backend.send(notifications)
+        except Exception as exc:
+            logger.exception("Notification backend failed")
+            counts["failed"] += Notification.objects.filter(pk__in=[n.pk for n in notifications]).update(
+                status=Notification.FAILED, error=str(exc)
+            )
+            continue
+        sent = set(sent)
+        counts["sent"] += Notification.objects.filter(pk__in=sent).update(status=Notification.SENT, sent_at=timezone.now())
+        unsent = [n.pk for n in notifications if n.pk not in sent]
+        counts["failed"] += Notification.objects.filter(pk__in=unsent).update(
+            status=Notification.FAILED, error="Not delivered by the backend"
+        )
@@ -0,0 +1,59 @@
+"""
+The session_trainer_no_overlap exclusion constraint (PostgreSQL only).
+
+The constraint makes the database reject two sessions of one trainer whose
+[start_at, end_at) intervals overlap, as a backstop for api.scheduling. It can
+only be added once no such sessions exist, and timetables created before the
+overlap checks often have some (e.g. every class given the same placeholder
+trainer). So migration 0004 adds it when the data allows and otherwise lists
+the overlaps and carries on; once they are fixed (their real trainer or time
+set in the admin), `python manage.py add_overlap_constraint` adds it.
+
+Only raw SQL lives here so the migration can use it too.
+"""
+
+CONSTRAINT_NAME = "session_trainer_no_overlap"
+
+
+def find_overlaps(connection, limit=20):
+    """Up to `limit` (session id, session id, trainer id, start) pairs of one trainer's overlapping sessions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT a.id, b.id, a.trainer_id, a.start_at FROM api_session a JOIN api_session b"
+            " ON a.trainer_id = b.trainer_id AND a.id < b.id AND a.start_at < b.end_at AND a.end_at > b.start_at"
+            " ORDER BY a.start_at, a.id, b.id LIMIT %s",
+            [limit],
+        )
+        return cursor.fetchall()
+
+
+def describe_overlaps(overlaps):
+    """One line per overlapping pair, for command and migration output."""
+    return "\n".join(
+        f"  sessions {first} and {second} (trainer {trainer}, {str(start)[:16]})"
+        for first, second, trainer, start in overlaps
+    )
+
+
+def constraint_exists(connection):
+    """Whether the exclusion constraint is in place (always False off PostgreSQL)."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [CONSTRAINT_NAME])
+        return cursor.fetchone() is not None
+
+
+def add_constraint(connection):
+    """Add the exclusion constraint; the caller checks find_overlaps() first."""
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        cursor.execute(
+            f"ALTER TABLE api_session ADD CONSTRAINT {CONSTRAINT_NAME}"
+            " EXCLUDE USING gist (trainer_id WITH =, tstzrange(start_at, end_at, '[)') WITH &&)"
+        )
+
+
+def drop_constraint(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE api_session DROP CONSTRAINT IF EXISTS {CONSTRAINT_NAME}")
@@ -0,0 +1,173 @@
+"""
+Recurring sessions: SessionTemplates expanded into virtual occurrences.
+
+A weekly class that runs for months used to mean months of identical, mostly
+empty Session rows created ahead of time. A SessionTemplate stores the class
+once; its occurrences exist only at query time:
+
+- occurrences() builds unsaved Session instances for the template dates in a
+  window that have no real session yet. They serialise like any other session
+  (booked_count 0, booked false) with the id "t{template id}-{YYYYMMDD}".
+- materialize() turns an occurrence into a real Session the first time a
+  member books it or staff edit it, as long as it is listed: not started yet
+  and within the window. The unique (occurrence_date, template)
+  constraint makes concurrent first bookings agree on one row. An occurrence
+  that overlaps another class of its trainer raises OccurrenceConflict
+  instead (template_conflicts() keeps the admin from publishing those).
+- Deleting an occurrence, virtual or real, adds its date to the template's
+  skipped_dates so it does not come back.
+
+Virtual occurrences are listed from today up to HORIZON_DAYS ahead; earlier
+dates only show sessions somebody actually booked.
+"""
+
+import re
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import analytics
+from .models import Session, SessionTemplate
+from .scheduling import describe_conflict, find_batch_conflicts, find_conflict
+
+HORIZON_DAYS = 8 * 7  # How far ahead virtual occurrences are listed
+VIRTUAL_ID = re.compile(r"^t(?P<template>\d+)-(?P<date>\d{8})$")
+
+
+class OccurrenceConflict(Exception):
+    """An occurrence cannot become a real session: its trainer already leads an overlapping one."""
+
+    def __init__(self, conflict):
+        super().__init__(describe_conflict(conflict))
+        self.conflict = conflict
+
+
+def window():
+    """(first, last) dates for which virtual occurrences are listed."""
+    today = timezone.localdate()
+    return today, today + timedelta(days=HORIZON_DAYS - 1)
+
+
+def parse_virtual_id(value):
+    """(template id, date) for a "t{id}-{YYYYMMDD}" id, or None."""
+    match = VIRTUAL_ID.match(str(value))
+    if match is None:
+        return None
+    raw = match["date"]
+    try:
+        day = date(int(raw[:4]), int(raw[4:6]), int(raw[6:]))
+    except ValueError:
+        return None
+    return int(match["template"]), day
+
+
+def active_templates(start, end):
+    """Templates that may have occurrences between `start` and `end`, with trainers joined."""
+    return list(
+        SessionTemplate.objects.filter(starts_on__lte=end)
+        .exclude(ends_on__lt=start)
+        .select_related("trainer")
+    )
+
+
+def materialized(start, end):
+    """{(template id, occurrence date)} of occurrences between `start` and `end` that have a real session."""
+    return set(
+        Session.objects.filter(occurrence_date__range=(start, end), template__isnull=False)
+        .values_list("template_id", "occurrence_date")
+    )
+
+
+def occurrences(start, end, templates=None, exclude=None):
+    """
+    Virtual occurrences between `start` and `end` (inclusive), in start order.
+
+    Args:
+        templates: SessionTemplates to expand (default: every active template)
+        exclude: {(template id, date)} already materialised (default: read from the database)
+    """
+    if start > end:
+        return []
+    if templates is None:
+        templates = active_templates(start, end)
+    if not templates:
+        return []
+    if exclude is None:
+        exclude = materialized(start, end)
+    sessions = [
+        template.occurrence(day)
+        for template in templates
+        for day in template.dates(start, end)
+        if (template.pk, day) not in exclude
+    ]
+    sessions.sort(key=lambda session: (session.date, session.time, session.virtual_id))
+    return sessions
+
+
+def get_occurrence(template_id, day):
+    """The session for an occurrence: the real one if it was materialised, else a virtual one, or None."""
+    session = Session.objects.filter(template_id=template_id, occurrence_date=day).first()
+    if session is not None:
+        return session
+    template = SessionTemplate.objects.select_related("trainer").filter(pk=template_id).first()
+    if template is None or not template.occurs_on(day):
+        return None
+    return template.occurrence(day)
+
+
+def materialize(template_id, day):
+    """
+    The real Session for an occurrence, creating it if needed; None if there is
+    no such occurrence.
+
+    Only listed occurrences get a row: one that has already started or lies
+    beyond the listing window returns None, so a crafted id cannot create
+    sessions in the past or months ahead.
+    """
+    session = get_occurrence(template_id, day)
+    if session is None or session.pk is not None:
+        return session
+    first, last = window()
+    if not first <= day <= last or session.start_at <= timezone.now():
+        return None
+    # Checked up front: on PostgreSQL the exclusion constraint would raise the
+    # same IntegrityError as a concurrent materialisation
+    conflict = find_conflict(session)
+    if conflict is not None:
+        raise OccurrenceConflict(conflict)
+    try:
+        with transaction.atomic():
+            session.save()
+    except IntegrityError:
+        # A concurrent request materialised it first; anything else is a real error
+        existing = Session.objects.filter(template_id=template_id, occurrence_date=day).first()
+        if existing is None:
+            raise
+        return existing
+    analytics.track_session_saved(session)
+    return session
+
+
+def skip_deleted(sessions):
+    """Keep deleted sessions' template occurrences from reappearing as virtual ones."""
+    for session in sessions:
+        if session.template_id is not None and session.occurrence_date is not None:
+            template = SessionTemplate.objects.filter(pk=session.template_id).first()
+            if template is not None:
+                template.skip(session.occurrence_date)
+
+
+def template_conflicts(template):
+    """
+    Occurrences of `template` (saved or not) within the listing window that
+    overlap another class of the same trainer: a real session or another
+    template's occurrence.
+
+    Returns:
+        list of (occurrence, conflicting session) pairs
+    """
+    start, end = window()
+    own = occurrences(start, end, templates=[template], exclude=materialized(start, end) if template.pk else set())
+    # find_batch_conflicts() checks the other templates' occurrences too
+    return find_batch_conflicts(own)
@@ -0,0 +1,44 @@
+"""
+Custom Django REST Framework renderers for the GymFlex API.
+
+These renderers exist mainly for content negotiation: they let export endpoints
+be requested with ``?format=csv`` / ``?format=ndjson`` (or an Accept header).
+Successful exports are streamed straight from the view with a
+StreamingHttpResponse, so ``render`` here only handles small payloads such as
+error messages.
+"""
+
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class CSVRenderer(BaseRenderer):
+    """Render a dict (e.g. an error body) or list of dicts as CSV."""
+    media_type = "text/csv"
+    format = "csv"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        buffer = io.StringIO()
+        if rows:
+            writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        return buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render data as newline-delimited JSON (one object per line)."""
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        return "".join(json.dumps(row, default=str) + "\n" for row in rows).encode(self.charset)
@@ -0,0 +1,199 @@
+"""
+Trainer and member schedule conflict detection.
+
+A trainer cannot lead two sessions whose [start_at, end_at) intervals overlap,
+and a member cannot book two overlapping sessions (find_member_conflict).
+The trainer checks here use the stored interval columns and the
+(trainer, start_at, end_at) index on api_session:
+
+- find_conflict(): one session (API create/update, admin form). A single
+  bounded range query; the lower bound on start_at comes from
+  Session.MAX_DURATION_MINUTES so the index scan never walks the trainer's
+  whole history.
+- find_batch_conflicts(): many sessions at once (recurring imports,
+  generate_dataset). One query fetches every existing session in the batch's
+  time window for the batch's trainers, then a per-trainer sort-and-sweep
+  finds overlaps both within the batch and against the database, so thousands
+  of sessions validate in O(n log n) with a fixed number of queries.
+
+Both also check the virtual occurrences of the trainers' recurring templates
+(template_occurrences()), from today on: an occurrence has no row yet, but a
+session that overlaps it would keep it from ever being booked. That costs one
+query for the templates (plus one for their materialised dates when the
+trainers have any). A session's own template is left out, since a weekly class
+cannot overlap itself.
+
+On PostgreSQL the session_trainer_no_overlap exclusion constraint (migration
+0004, or add_overlap_constraint once old overlaps are fixed; see
+api.overlap_constraint) enforces the same rule in the database as a backstop.
+
+Sessions created without choosing a trainer are given default_trainer(), so
+classes that run at the same time need their trainer chosen (the API's
+"trainer" field, the admin form, the import's trainer column); the conflict
+message says so.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .models import Session, SessionTemplate
+
+
+def default_trainer():
+    """The placeholder trainer of sessions created without one: the first staff user, else the first user."""
+    return User.objects.filter(is_staff=True).order_by("pk").first() or User.objects.order_by("pk").first()
+
+
+def template_occurrences(trainer_ids, start_at, end_at, exclude_templates=()):
+    """
+    Virtual occurrences of the trainers' templates starting in (start_at, end_at).
+
+    Only dates from today on are expanded: earlier occurrences are never listed
+    or booked. Templates in `exclude_templates` (ids) are skipped.
+    """
+    from . import recurrence  # recurrence builds on this module
+
+    first = max(timezone.localtime(start_at).date(), timezone.localdate())
+    last = timezone.localtime(end_at).date()
+    if first > last or not trainer_ids:
+        return []
+    templates = list(
+        SessionTemplate.objects.filter(trainer_id__in=trainer_ids, starts_on__lte=last)
+        .exclude(ends_on__lt=first)
+        .exclude(pk__in=[pk for pk in exclude_templates if pk is not None])
+        .select_related("trainer")
+    )
+    return [
+        occurrence for occurrence in recurrence.occurrences(first, last, templates=templates)
+        if start_at < occurrence.start_at < end_at
+    ]
+
+
+def find_conflict(session):
+    """
+    Return an existing session or template occurrence of the same trainer that
+    overlaps `session`, or None.
+
+    `session` may be unsaved; its start_at/end_at are (re)computed here.
+    """
+    session.set_bounds()
+    if session.trainer_id is None or session.start_at is None:
+        return None
+    earliest_start = session.start_at - timedelta(minutes=Session.MAX_DURATION_MINUTES)
+    conflict = (
+        Session.objects.filter(
+            trainer_id=session.trainer_id,
+            start_at__gt=earliest_start,
+            start_at__lt=session.end_at,
+            end_at__gt=session.start_at,
+        )
+        .exclude(pk=session.pk)
+        .order_by("start_at")
+        .first()
+    )
+    virtual = [
+        occurrence
+        for occurrence in template_occurrences(
+            {session.trainer_id}, earliest_start, session.end_at, exclude_templates={session.template_id}
+        )
+        if occurrence.end_at > session.start_at
+    ]
+    candidates = [conflict] + virtual if conflict is not None else virtual
+    return min(candidates, key=lambda candidate: candidate.start_at, default=None)
+
+
+def find_batch_conflicts(sessions):
+    """
+    Validate a batch of (usually unsaved) sessions against each other, the
+    database and the trainers' template occurrences.
+
+    Args:
+        sessions: iterable of Session instances with trainer_id, date, time and duration set
+
+    Returns:
+        list of (session, conflicting_session) pairs, one per session in the
+        batch that overlaps an earlier-starting session of the same trainer.
+    """
+    batch = list(sessions)
+    for session in batch:
+        session.set_bounds()
+    batch = [s for s in batch if s.trainer_id is not None and s.start_at is not None]
+    if not batch:
+        return []
+
+    window_start = min(s.start_at for s in batch) - timedelta(minutes=Session.MAX_DURATION_MINUTES)
+    window_end = max(s.end_at for s in batch)
+    batch_pks = {s.pk for s in batch if s.pk is not None}
+    existing = (
+        Session.objects.filter(
+            trainer_id__in={s.trainer_id for s in batch},
+            start_at__gt=window_start,
+            start_at__lt=window_end,
+        )
+        .exclude(pk__in=batch_pks)
+        .only("id", "trainer_id", "activity_type", "date", "time", "start_at", "end_at")
+    )
+    virtual = template_occurrences(
+        {s.trainer_id for s in batch}, window_start, window_end,
+        exclude_templates={s.template_id for s in batch},
+    )
+
+    by_trainer = defaultdict(list)
+    for session in batch:
+        by_trainer[session.trainer_id].append((session, True))
+    for session in existing:
+        by_trainer[session.trainer_id].append((session, False))
+    for session in virtual:
+        by_trainer[session.trainer_id].append((session, False))
+
+    conflicts = []
+    for timeline in by_trainer.values():
+        timeline.sort(key=lambda item: (item[0].start_at, item[0].end_at))
+        latest = None  # session with the latest end seen so far
+        for session, is_new in timeline:
+            if latest is not None and session.start_at < latest[0].end_at and (is_new or latest[1]):
+                conflicts.append((session, latest[0]) if is_new else (latest[0], session))
+            if latest is None or session.end_at > latest[0].end_at:
+                latest = (session, is_new)
+    return conflicts
+
+
+def find_member_conflict(user, session):
+    """
+    Return a session `user` has booked that overlaps `session`, or None.
+
+    Called inside the booking transaction. Starts from the (start_at, end_at)
+    index on api_session, bounded to a MAX_DURATION_MINUTES window, and probes
+    the unique (session, user) index on api_sessionattendee, so the cost does
+    not grow with the member's booking history.
+    """
+    if session.start_at is None:
+        session.set_bounds()
+    earliest_start = session.start_at - timedelta(minutes=Session.MAX_DURATION_MINUTES)
+    return (
+        Session.objects.filter(
+            start_at__gt=earliest_start,
+            start_at__lt=session.end_at,
+            end_at__gt=session.start_at,
+            sessionattendee__user=user,
+        )
+        .exclude(pk=session.pk)
+        .only("id")
+        .order_by("start_at")
+        .first()
+    )
+
+
+def describe_conflict(conflict, default=False):
+    """Human-readable message for a conflicting session (default: the trainer was assigned, not chosen)."""
+    message = (
+        f"Trainer already has {conflict.activity_type} on {conflict.date} at "
+        f"{conflict.time.strftime('%H:%M') if hasattr(conflict.time, 'strftime') else conflict.time} "
+        f"that overlaps this time."
+    )
+    if default:
+        message += " Choose a trainer for this session."
+    return message
@@ -9,6 +9,7 @@ This module includes:
 - UserSerializer: User registration and authentication data
 - NoteSerializer: Legacy note model serialization
 - SessionSerializer: Complex session serialization with role-based data masking
+- ArchivedSessionSerializer: Read-only view of archived (cold) sessions
 
 Role-Based Data Masking:
 SessionSerializer implements intelligent privacy controls:
@@ -19,7 +20,8 @@ SessionSerializer implements intelligent privacy controls:
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Note, Session, SessionAttendee
+from .models import Note, Session, SessionAttendee, ArchivedSession
+from .scheduling import default_trainer, describe_conflict, find_conflict
 
 # -------------------
 # SessionAttendee Serializer
@@ -106,10 +108,12 @@ class SessionSerializer(serializers.ModelSerializer):
     Complex serializer for Session model with computed fields and role-based data masking.
     
     Computed Fields (calculated on-the-fly, not stored in database):
+    - id: Primary key, or "t{template}-{YYYYMMDD}" for a virtual occurrence of a recurring template
     - trainer_username: Readable trainer name instead of just ID
     - attendees_count: How many people have booked this session
     - available_slots: Remaining spots (capacity - booked)
     - booked: Boolean indicating if current user has booked this session
+    - attendees: Attendee list masked by role (see get_attendees)
     
     Data Masking Logic:
     The to_representation method customises output based on who's requesting:
@@ -118,14 +122,26 @@ class SessionSerializer(serializers.ModelSerializer):
     - Unbooked users: See limited info (activity type, slots, but trainer shows as "TBA")
     
     This approach protects user privacy whilst allowing necessary functionality.
+    
+    Sparse fieldsets:
+    On GET requests, ?fields=id,date,time limits the output to the listed fields
+    and ?omit=attendees drops fields; unknown names are a 400 error. Fields that
+    are not returned are never computed. SessionViewSet.get_queryset uses
+    output_fields() to add only the is_booked annotation and the joins the
+    returned fields need; get_booked uses the annotation when present instead
+    of querying per row, and the counts come from Session.booked_count.
     """
     
     # Computed fields using SerializerMethodField (calls get_<field_name> methods)
+    id = serializers.SerializerMethodField()  # See Session.public_id
     trainer_username = serializers.ReadOnlyField(source="trainer.username")
     attendees_count = serializers.SerializerMethodField()
     available_slots = serializers.SerializerMethodField()
     booked = serializers.SerializerMethodField()
     has_started = serializers.SerializerMethodField()
+    attendees = serializers.SerializerMethodField()  # Masked by role, see get_attendees
+    # Optional on create/update: staff user leading the class (default: the placeholder, see api.scheduling)
+    trainer = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(is_staff=True), required=False, write_only=True)
 
     class Meta:
         model = Session
@@ -133,6 +149,7 @@ class SessionSerializer(serializers.ModelSerializer):
             "id",
             "activity_type",
             "trainer_username",
+            "trainer",
             "date",
             "time",
             "duration_minutes",
@@ -143,14 +160,50 @@ class SessionSerializer(serializers.ModelSerializer):
             "has_started",
             "attendees",
         ]
-        extra_kwargs = {
-            "attendees": {"read_only": True},  # Modified via book action, not direct POST
-            "trainer": {"read_only": True},     # Assigned automatically on creation
-        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None:
+            selected = self.output_fields(request)
+            for name in set(self.fields) - selected:
+                self.fields.pop(name)
+
+    # -------------------
+    # Sparse Fieldsets
+    # -------------------
+    @classmethod
+    def output_fields(cls, request):
+        """
+        Names of the fields to return for this request (?fields= / ?omit=, GET only).
+        
+        Raises:
+            ValidationError: If either parameter names an unknown field
+        """
+        available = set(cls.Meta.fields)
+        if request.method not in ("GET", "HEAD"):
+            return available
+        available -= {name for name, field in cls._declared_fields.items() if field.write_only}
+        params = getattr(request, "query_params", request.GET)
+        selected = set(available)
+        for param in ("fields", "omit"):
+            raw = params.get(param)
+            if raw is None:
+                continue
+            names = {name.strip() for name in raw.split(",") if name.strip()}
+            unknown = names - available
+            if unknown:
+                raise serializers.ValidationError({param: [f"Unknown field(s): {', '.join(sorted(unknown))}"]})
+            selected = selected & names if param == "fields" else selected - names
+        return selected
 
     # -------------------
     # Computed Field Methods
     # -------------------
+    def get_id(self, obj):
+        """Primary key, or the virtual occurrence id (see Session.public_id)."""
+        return obj.public_id
+
     def get_attendees_count(self, obj):
         """
         Calculate how many users have booked this session.
@@ -161,7 +214,7 @@ class SessionSerializer(serializers.ModelSerializer):
         Returns:
             int: Number of attendees currently booked
         """
-        return obj.attendees.count()
+        return obj.booked_count
 
     def get_available_slots(self, obj):
         """
@@ -173,7 +226,7 @@ class SessionSerializer(serializers.ModelSerializer):
         Returns:
             int: Number of spots still available (can be 0 if full)
         """
-        return obj.capacity - obj.attendees.count()
+        return obj.capacity - obj.booked_count
 
     def get_booked(self, obj):
         """
@@ -190,6 +243,10 @@ class SessionSerializer(serializers.ModelSerializer):
         """
         request = self.context.get("request")
         if request and request.user.is_authenticated:
+            # Annotated by SessionQuerySet.with_booked_by() on list/retrieve
+            is_booked = getattr(obj, "is_booked", None)
+            if is_booked is not None:
+                return is_booked
             return obj.attendees.filter(pk=request.user.pk).exists()
         return False
 
@@ -212,6 +269,36 @@ class SessionSerializer(serializers.ModelSerializer):
         session_datetime = datetime.combine(obj.date, obj.time)
         return session_datetime < now
 
+    # -------------------
+    # Validation
+    # -------------------
+    def validate(self, attrs):
+        """
+        Reject sessions that overlap another session led by the same trainer.
+        
+        Staff may choose the trainer ("trainer"); new sessions without one get
+        the default trainer here (see create), so the overlap check runs
+        against the trainer the session will belong to.
+        Uses one indexed interval query (see api.scheduling.find_conflict).
+        """
+        instance = self.instance
+        assigned = instance is None and 'trainer' not in attrs
+        if assigned:
+            attrs['trainer'] = default_trainer()
+        trainer = attrs['trainer'] if 'trainer' in attrs else instance.trainer
+        trainer_id = trainer.pk if trainer else None
+        candidate = Session(
+            pk=instance.pk if instance else None,
+            trainer_id=trainer_id,
+            date=attrs.get('date', getattr(instance, 'date', None)),
+            time=attrs.get('time', getattr(instance, 'time', None)),
+            duration_minutes=attrs.get('duration_minutes', getattr(instance, 'duration_minutes', 60)),
+        )
+        conflict = find_conflict(candidate)
+        if conflict:
+            raise serializers.ValidationError({"time": [describe_conflict(conflict, default=assigned)]})
+        return attrs
+
     # -------------------
     # Custom Creation Logic
     # -------------------
@@ -220,8 +307,8 @@ class SessionSerializer(serializers.ModelSerializer):
         Automatically assign a trainer when creating new sessions.
         
         Business logic:
-        - Trainer field is read-only in the API (users don't select trainers directly)
-        - System assigns the first staff user as trainer
+        - Staff may pick the trainer (a staff user id in "trainer")
+        - Otherwise the first staff user is assigned (resolved in validate)
         - If no staff users exist, falls back to any user (edge case handling)
         
         Args:
@@ -230,8 +317,8 @@ class SessionSerializer(serializers.ModelSerializer):
         Returns:
             Session: Newly created Session instance with trainer assigned
         """
-        admin_user = User.objects.filter(is_staff=True).first()
-        validated_data['trainer'] = admin_user if admin_user else User.objects.first()
+        if 'trainer' not in validated_data:
+            validated_data['trainer'] = default_trainer()
         return super().create(validated_data)
 
     # -------------------
@@ -269,49 +356,101 @@ class SessionSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         request = self.context.get('request')
         user = request.user if request and request.user.is_authenticated else None
+        # Attendee masking happens in get_attendees; only the trainer name is left to mask here
+        if 'trainer_username' not in self.fields:
+            return representation
 
         # Staff/trainers see everything - needed for admin booking management
         if user and user.is_staff:
-            # For past sessions, include full attendance details
-            from datetime import datetime
-            now = datetime.now()
-            session_datetime = datetime.combine(instance.date, instance.time)
-            is_past = session_datetime < now
-            
-            if is_past:
-                # Show detailed attendance for past sessions
-                attendee_data = SessionAttendee.objects.filter(session=instance).select_related('user')
-                representation['attendees'] = [
-                    {
-                        "id": sa.user.id,
-                        "username": sa.user.username,
-                        "attended": sa.attended,
-                        "attendance_id": sa.id
-                    }
-                    for sa in attendee_data
-                ]
-            else:
-                # For future sessions, just show basic attendee info
-                attendees_qs = instance.attendees.all()
-                representation['attendees'] = [
-                    {"id": a.id, "username": a.username} for a in attendees_qs
-                ]
             # Ensure trainer username is accurate for staff views
             representation['trainer_username'] = instance.trainer.username
             return representation
 
         # Check if current user has booked this session
-        is_booked = representation.get('booked', False)
-
-        if is_booked:
-            # Booked clients see full details but only their own ID in attendees
-            # Protects other attendees' privacy whilst confirming their own booking
-            representation['attendees'] = [user.id] if user else []
-            return representation
-        else:
+        is_booked = representation['booked'] if 'booked' in representation else self.get_booked(instance)
+        if not is_booked:
             # Unbooked clients see minimal info - encourages booking to see details
             representation['trainer_username'] = "TBA"  # Hide trainer until booked
-            representation['attendees'] = []            # Hide who's attending
-            # Keep activity type visible so calendar can show class types
-            representation['activity_type'] = instance.activity_type
-            return representation
+        return representation
+
+    def get_attendees(self, obj):
+        """
+        Attendee list, masked by role (see to_representation).
+        
+        - Staff: id and username of every attendee (plus attendance flags for past sessions)
+        - Booked clients: only their own ID (protects other attendees' privacy)
+        - Unbooked clients: empty (who's attending is private until you book)
+        """
+        if obj.pk is None:
+            return []  # A virtual occurrence has no bookings
+        request = self.context.get('request')
+        user = request.user if request and request.user.is_authenticated else None
+        if user and user.is_staff:
+            return self._staff_attendees(obj)
+        if user and self.get_booked(obj):
+            return [user.id]
+        return []
+
+    @staticmethod
+    def _staff_attendees(instance):
+        """
+        Attendee details for staff: attendance flags for past sessions, id/username otherwise.
+        
+        Uses the prefetched sessionattendee_set (with users) when the view provided it.
+        """
+        from datetime import datetime
+        rows = instance.sessionattendee_set.all()
+        if 'sessionattendee_set' not in getattr(instance, '_prefetched_objects_cache', {}):
+            rows = rows.select_related('user')
+        if datetime.combine(instance.date, instance.time) < datetime.now():
+            # Show detailed attendance for past sessions
+            return [
+                {
+                    "id": sa.user.id,
+                    "username": sa.user.username,
+                    "attended": sa.attended,
+                    "attendance_id": sa.id
+                }
+                for sa in rows
+            ]
+        # For future sessions, just show basic attendee info
+        return [{"id": sa.user.id, "username": sa.user.username} for sa in rows]
+
+
+# -------------------
+# Archived Session Serializer
+# -------------------
+class ArchivedSessionSerializer(serializers.ModelSerializer):
+    """
+    Read-only representation of a session moved to the archive.
+    
+    Expects `attendance` to be prefetched (all rows for staff, only the
+    requesting member's row otherwise), mirroring SessionSerializer's masking:
+    staff get the full attendance list, members get their own attended flag.
+    """
+    trainer_username = serializers.ReadOnlyField()
+
+    class Meta:
+        model = ArchivedSession
+        fields = [
+            "id",
+            "activity_type",
+            "trainer_username",
+            "date",
+            "time",
+            "duration_minutes",
+            "capacity",
+        ]
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        request = self.context.get("request")
+        rows = instance.attendance.all()
+        if request and request.user.is_staff:
+            representation["attendees"] = [
+                {"id": row.user_id, "username": row.user.username, "attended": row.attended}
+                for row in rows
+            ]
+        else:
+            representation["attended"] = rows[0].attended if rows else None
+        return representation
@@ -0,0 +1,16 @@
+"""
+Custom signals for the GymFlex API.
+
+booking_changed
+    Sent (sender=Session) whenever a session's booked_count changes.
+    Arguments: session_id, date (the session's date) and delta (+1 booked,
+    -1 cancelled). Bulk recounts send None for all three, meaning "any
+    session may have changed". Receivers run immediately, inside the booking transaction;
+    use transaction.on_commit for anything that must only see committed data.
+    See api.availability for the receiver that keeps the in-memory
+    availability index current.
+"""
+
+from django.dispatch import Signal
+
+booking_changed = Signal()
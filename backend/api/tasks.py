@@ -0,0 +1,259 @@
+"""
+Database-backed background tasks.
+
+Slow work (rebuilding the utilisation summary, reconciling booked counts,
+archiving) should not run inside a request. Code enqueues it instead:
+
+    tasks.enqueue("rebuild_utilization")
+    tasks.enqueue("archive_sessions", before="2025-01-01", run_after=later)
+
+and `manage.py run_worker` runs it. Tasks are rows in api_task, written in
+the caller's transaction, so work enqueued by a request that rolls back is
+never run; no broker (Redis, Celery) is needed.
+
+Claiming:
+- On PostgreSQL a worker locks the next due tasks with
+  SELECT ... FOR UPDATE SKIP LOCKED and marks them running, so concurrent
+  workers never wait for, or run, each other's tasks.
+- Databases without SKIP LOCKED (SQLite) use a compare-and-set instead:
+  UPDATE ... SET status = 'running' WHERE id = ? AND status = 'queued'; a
+  worker only runs the tasks whose update matched a row.
+
+A failing task is retried up to max_attempts times with exponential backoff
+(TASK_RETRY_DELAY * 2 ** (attempt - 1) seconds) and then marked failed with
+the traceback. Every attempt records its start, finish and duration.
+
+Workers that die:
+- While a task runs, a heartbeat thread refreshes its locked_at every
+  TASK_HEARTBEAT_INTERVAL seconds, so a long task of a live worker is never
+  taken for abandoned.
+- A task whose lock is older than TASK_LOCK_TIMEOUT is requeued, or marked
+  failed once it has used its max_attempts (a task that kills its worker is
+  not retried forever).
+- A worker only records the outcome while it still holds the lock
+  (UPDATE ... WHERE locked_by = worker), so a worker that was given up on
+  cannot overwrite what the task's new owner records.
+
+Task functions take JSON-serialisable keyword arguments and are registered
+with the @task decorator below.
+"""
+
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import analytics, archive, notifications
+from .models import Session, Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+RETENTION = timedelta(days=7)  # Succeeded tasks older than this are pruned by the worker
+
+
+def task(name=None, max_attempts=3):
+    """Register a function as a background task (under `name`, default its function name)."""
+    def register(func):
+        func.task_name = name or func.__name__
+        func.max_attempts = max_attempts
+        REGISTRY[func.task_name] = func
+        return func
+    return register
+
+
+def enqueue(name, run_after=None, **kwargs):
+    """
+    Queue a registered task; returns the Task row.
+
+    Args:
+        name: Task name, or the registered function itself
+        run_after: Earliest datetime to run it (default: now)
+        kwargs: JSON-serialisable keyword arguments for the task
+    """
+    name = getattr(name, "task_name", name)
+    if name not in REGISTRY:
+        raise KeyError(f"Unknown task {name!r}")
+    return Task.objects.create(
+        name=name,
+        kwargs=kwargs,
+        run_after=run_after or timezone.now(),
+        max_attempts=REGISTRY[name].max_attempts,
+    )
+
+
+def enqueue_unless_pending(name, **kwargs):
+    """Queue a task unless one of that name is already queued or running; returns the new Task or None."""
+    name = getattr(name, "task_name", name)
+    if Task.objects.filter(name=name, status__in=[Task.QUEUED, Task.RUNNING]).exists():
+        return None
+    return enqueue(name, **kwargs)
+
+
+# -------------------
+# Claiming
+# -------------------
+def claim(worker, limit=1):
+    """Mark up to `limit` due tasks as running for `worker`; returns them."""
+    now = timezone.now()
+    due = Task.objects.filter(status=Task.QUEUED, run_after__lte=now).order_by("run_after", "pk")
+    running = {"status": Task.RUNNING, "locked_by": worker, "locked_at": now, "started_at": now, "attempts": F("attempts") + 1}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list("pk", flat=True)[:limit])
+            Task.objects.filter(pk__in=ids).update(**running)
+    else:
+        ids = []
+        for pk in due.values_list("pk", flat=True)[:limit]:
+            # Compare-and-set: only one worker's update can still see the task queued
+            if Task.objects.filter(pk=pk, status=Task.QUEUED).update(**running):
+                ids.append(pk)
+    return list(Task.objects.filter(pk__in=ids).order_by("run_after", "pk"))
+
+
+def release(task_rows):
+    """Put claimed tasks that were not started back in the queue (e.g. when a worker stops mid-batch)."""
+    Task.objects.filter(pk__in=[t.pk for t in task_rows], status=Task.RUNNING).update(
+        status=Task.QUEUED, locked_by="", locked_at=None, attempts=F("attempts") - 1,
+    )
+
+
+def requeue_stale(timeout=None):
+    """
+    Recover running tasks whose lock has not been refreshed for `timeout` seconds.
+
+    Tasks with attempts left are requeued, the others are marked failed.
+
+    Returns:
+        tuple: (requeued, failed) counts
+    """
+    timeout = settings.TASK_LOCK_TIMEOUT if timeout is None else timeout
+    now = timezone.now()
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=now - timedelta(seconds=timeout))
+    error = "Worker did not finish the task in time"
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Task.FAILED, locked_by="", locked_at=None, finished_at=now, last_error=error,
+    )
+    requeued = stale.update(status=Task.QUEUED, locked_by="", locked_at=None, last_error=error)
+    return requeued, failed
+
+
+def prune_finished(older_than=RETENTION):
+    """Delete succeeded tasks that finished before `older_than` ago; returns how many."""
+    cutoff = timezone.now() - older_than
+    return Task.objects.filter(status=Task.SUCCEEDED, finished_at__lt=cutoff).delete()[0]
+
+
+# -------------------
+# Running
+# -------------------
+def _held(task_row):
+    """The task, only while it is still running under this worker's lock."""
+    return Task.objects.filter(pk=task_row.pk, status=Task.RUNNING, locked_by=task_row.locked_by)
+
+
+def heartbeat(task_row):
+    """Refresh the lock of a running task; False if the worker no longer holds it."""
+    return bool(_held(task_row).update(locked_at=timezone.now()))
+
+
+@contextmanager
+def _heartbeating(task_row):
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.TASK_HEARTBEAT_INTERVAL):
+                if not heartbeat(task_row):
+                    logger.warning("Task %s was taken over by another worker while it ran", task_row)
+                    break
+        finally:
+            connection.close()  # This thread's own connection
+
+    thread = threading.Thread(target=beat, name=f"task-{task_row.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run(task_row):
+    """
+    Run one claimed task and record the outcome.
+
+    Returns:
+        Task: the row as recorded; if the worker lost its lock meanwhile the
+        outcome is discarded and the row is returned as the database has it
+    """
+    func = REGISTRY.get(task_row.name)
+    started = perf_counter()
+    error = None
+    if func is None:
+        error = f"Unknown task {task_row.name!r}"
+        task_row.attempts = task_row.max_attempts  # Retrying cannot help
+    else:
+        try:
+            with _heartbeating(task_row):
+                func(**task_row.kwargs)
+        except Exception:
+            logger.exception("Task %s failed (attempt %s)", task_row, task_row.attempts)
+            error = traceback.format_exc()
+
+    task_row.finished_at = timezone.now()
+    task_row.duration_ms = round((perf_counter() - started) * 1000, 2)
+    if error is None:
+        task_row.status, task_row.last_error = Task.SUCCEEDED, ""
+    elif task_row.attempts < task_row.max_attempts:
+        task_row.status, task_row.last_error = Task.QUEUED, error
+        task_row.run_after = task_row.finished_at + timedelta(
+            seconds=settings.TASK_RETRY_DELAY * 2 ** (task_row.attempts - 1)
+        )
+    else:
+        task_row.status, task_row.last_error = Task.FAILED, error
+    fields = ["status", "last_error", "run_after", "attempts", "finished_at", "duration_ms"]
+    if not _held(task_row).update(locked_by="", locked_at=None, **{name: getattr(task_row, name) for name in fields}):
+        logger.warning("Task %s was requeued while it ran; discarding this worker's outcome", task_row)
+        task_row.refresh_from_db()
+        return task_row
+    task_row.locked_by, task_row.locked_at = "", None
+    return task_row
+
+
+# -------------------
+# Tasks
+# -------------------
+@task()
+def rebuild_utilization():
+    """Recompute the utilisation summary (see api.analytics)."""
+    analytics.rebuild_summary()
+
+
+@task()
+def recount_bookings(session_ids=None):
+    """Reconcile Session.booked_count with the attendance rows (all sessions, or the given ids)."""
+    sessions = Session.objects.all() if session_ids is None else Session.objects.filter(pk__in=session_ids)
+    sessions.recount_bookings()
+
+
+@task()
+def archive_sessions(before=None, batch_size=500):
+    """Move old sessions into the archive tables (before: YYYY-MM-DD, default the retention cutoff)."""
+    archive.archive_sessions(parse_date(before) if before else archive.archive_cutoff(), batch_size=batch_size)
+
+
+@task(max_attempts=1)
+def send_reminders():
+    """Queue and deliver session reminders (see api.notifications); the next run picks up anything left."""
+    notifications.schedule_reminders()
+    notifications.deliver_pending()
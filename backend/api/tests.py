@@ -1,9 +1,51 @@
-from datetime import datetime, timedelta
+import gzip
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
+import brotli
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework.test import APITestCase
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Session
+from backend.db_pool import close_cursors, pool_stats
+from backend.db_router import PIN_CACHE_KEY, PIN_COOKIE, PrimaryReplicaRouter
+from backend.middleware import FrontendAssetsMiddleware
+from backend.warmup import STEPS as WARMUP_STEPS, warm_up
+
+from .archive import archive_cutoff
+from .availability import AvailabilityIndex, get_index
+from .idempotency import fingerprint, prune_expired
+from . import ledger, notifications, overlap_constraint, tasks, timetable_import
+from .models import (
+	ArchivedSession, BookingEvent, IdempotencyKey, Notification, Session, SessionAttendee, SessionTemplate, Task,
+	UtilizationSummary, delete_members,
+)
+from .recurrence import HORIZON_DAYS, occurrences, window
+from .scheduling import find_batch_conflicts, find_conflict, find_member_conflict
+
+
+def tearDownModule():
+	# Bookings committed by tests buffer ledger events; do not let atexit write them to the development database
+	ledger.clear()
 
 
 class AuthAndSessionsApiTests(APITestCase):
@@ -58,7 +100,7 @@ class AuthAndSessionsApiTests(APITestCase):
 		self.assertEqual(res.status_code, 200)
 		self.assertIsInstance(res.data, list)
 
-	def test_book_endpoint_toggles_booking(self):
+	def test_book_and_cancel_are_explicit(self):
 		self.authenticate_as_user()
 
 		self.assertEqual(self.session.attendees.count(), 0)
@@ -66,11 +108,1909 @@ class AuthAndSessionsApiTests(APITestCase):
 		res1 = self.client.post(f"/api/sessions/{self.session.id}/book/")
 		self.assertEqual(res1.status_code, 200)
 		self.assertEqual(res1.data.get("status"), "Booked")
+		self.assertEqual(res1.data.get("available_slots"), 9)
 		self.session.refresh_from_db()
 		self.assertEqual(self.session.attendees.count(), 1)
 
+		# Booking again (e.g. a retry) keeps the booking
 		res2 = self.client.post(f"/api/sessions/{self.session.id}/book/")
 		self.assertEqual(res2.status_code, 200)
-		self.assertEqual(res2.data.get("status"), "Unbooked")
-		self.session.refresh_from_db()
+		self.assertEqual(res2.data.get("status"), "Booked")
+		self.assertEqual(self.session.attendees.count(), 1)
+
+		res3 = self.client.post(f"/api/sessions/{self.session.id}/cancel/")
+		self.assertEqual(res3.status_code, 200)
+		self.assertEqual(res3.data.get("status"), "Unbooked")
+		self.assertFalse(res3.data.get("booked"))
+		self.assertEqual(self.session.attendees.count(), 0)
+
+		res4 = self.client.post(f"/api/sessions/{self.session.id}/cancel/")
+		self.assertEqual(res4.status_code, 200)
+		self.assertEqual(res4.data.get("status"), "Unbooked")
+
+
+class IdempotencyKeyTests(APITestCase):
+	def setUp(self):
+		self.trainer = User.objects.create_user(username="trainer", password="pw", is_staff=True)
+		self.member = User.objects.create_user(username="member", password="pw")
+		start = datetime.now() + timedelta(days=1)
+		self.session = Session.objects.create(
+			trainer=self.trainer, activity_type="yoga", date=start.date(), time=start.time().replace(second=0, microsecond=0), capacity=1,
+		)
+		self.client.force_authenticate(self.member)
+
+	def post(self, action, key, session=None):
+		return self.client.post(f"/api/sessions/{(session or self.session).id}/{action}/", HTTP_IDEMPOTENCY_KEY=key)
+
+	def test_retry_replays_stored_response_without_touching_session(self):
+		first = self.post("book", "attempt-1")
+		self.assertEqual(first.status_code, 200)
+		self.assertEqual(first.data["status"], "Booked")
+
+		with CaptureQueriesContext(connection) as queries:
+			retry = self.post("book", "attempt-1")
+		self.assertEqual(retry.status_code, 200)
+		self.assertEqual(retry.data, first.data)
+		self.assertEqual(retry["Idempotent-Replayed"], "true")
+		self.assertFalse([q for q in queries.captured_queries if "api_session" in q["sql"]])
+		self.assertEqual(self.session.attendees.count(), 1)
+
+	def test_error_responses_are_replayed(self):
+		other = User.objects.create_user(username="other", password="pw")
+		self.session.attendees.add(other)
+		Session.objects.recount_bookings()
+		self.assertEqual(self.post("book", "full-1").data["status"], "Full")
+		self.session.attendees.remove(other)
+		Session.objects.recount_bookings()
+		# Same key: same answer; a new attempt needs a new key
+		self.assertEqual(self.post("book", "full-1").data["status"], "Full")
+		self.assertEqual(self.post("book", "full-2").data["status"], "Booked")
+
+	def test_key_reused_for_another_request_is_rejected(self):
+		self.post("book", "k")
+		res = self.post("cancel", "k")
+		self.assertEqual(res.status_code, 422)
+		self.assertEqual(self.session.attendees.count(), 1)
+
+	def test_keys_are_scoped_per_user(self):
+		self.post("book", "shared")
+		other = User.objects.create_user(username="other", password="pw")
+		self.client.force_authenticate(other)
+		res = self.post("book", "shared")
+		self.assertEqual(res.data["status"], "Full")
+		self.assertNotIn("Idempotent-Replayed", res)
+
+	def test_in_flight_key_returns_conflict(self):
+		IdempotencyKey.objects.create(user=self.member, key="busy", request_fingerprint=fingerprint("POST", f"/api/sessions/{self.session.id}/book/"))
+		res = self.post("book", "busy")
+		self.assertEqual(res.status_code, 409)
 		self.assertEqual(self.session.attendees.count(), 0)
+
+	def test_abandoned_claim_is_taken_over_by_a_retry(self):
+		abandoned = IdempotencyKey.objects.create(
+			user=self.member, key="dead", request_fingerprint=fingerprint("POST", f"/api/sessions/{self.session.id}/book/"),
+			claimed_at=timezone.now() - timedelta(minutes=5),
+		)
+		res = self.post("book", "dead")
+		self.assertEqual((res.status_code, res.data["status"]), (200, "Booked"))
+		self.assertEqual(self.post("book", "dead")["Idempotent-Replayed"], "true")
+		# The first request, had it survived, can no longer complete or release the key
+		self.assertFalse(IdempotencyKey.objects.filter(pk=abandoned.pk, claimed_at=abandoned.claimed_at).exists())
+		self.assertEqual(self.session.attendees.count(), 1)
+
+	def test_missing_session_releases_key(self):
+		res = self.client.post("/api/sessions/999999/book/", HTTP_IDEMPOTENCY_KEY="gone")
+		self.assertEqual(res.status_code, 404)
+		self.assertFalse(IdempotencyKey.objects.filter(key="gone").exists())
+
+	def test_expired_keys_are_reused_and_pruned(self):
+		self.post("book", "old")
+		IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+		self.assertEqual(self.post("cancel", "old").data["status"], "Unbooked")
+		self.assertEqual(IdempotencyKey.objects.get(key="old").request_fingerprint, fingerprint("POST", f"/api/sessions/{self.session.id}/cancel/"))
+
+		IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+		self.assertEqual(prune_expired(), 1)
+		self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class BatchBookingTests(APITestCase):
+	def setUp(self):
+		self.trainer = User.objects.create_user(username="trainer", password="pw", is_staff=True)
+		self.member = User.objects.create_user(username="member", password="pw")
+		day = (datetime.now() + timedelta(days=3)).date()
+		self.sessions = [
+			Session.objects.create(trainer=self.trainer, activity_type="yoga", date=day + timedelta(days=i), time="09:00", capacity=2)
+			for i in range(4)
+		]
+		self.client.force_authenticate(self.member)
+
+	def batch(self, operations, **extra):
+		return self.client.post("/api/sessions/batch/", {"operations": operations}, format="json", **extra)
+
+	def test_per_operation_results_in_one_request(self):
+		full = self.sessions[1]
+		full.attendees.add(*[User.objects.create_user(username=f"u{i}", password="pw") for i in range(2)])
+		Session.objects.recount_bookings()
+		res = self.batch([
+			{"session": self.sessions[0].id, "action": "book"},
+			{"session": full.id, "action": "book"},
+			{"session": self.sessions[2].id, "action": "book"},
+			{"session": 999999, "action": "book"},
+			{"session": self.sessions[3].id, "action": "cancel"},
+		])
+		self.assertEqual(res.status_code, 200)
+		self.assertEqual(
+			[(r["session"], r["http_status"], r["status"]) for r in res.data["results"]],
+			[
+				(self.sessions[0].id, 200, "Booked"),
+				(full.id, 400, "Full"),
+				(self.sessions[2].id, 200, "Booked"),
+				(999999, 404, "not_found"),
+				(self.sessions[3].id, 200, "Unbooked"),
+			],
+		)
+		self.assertEqual(res.data["results"][0]["available_slots"], 1)
+		self.assertEqual(
+			sorted(SessionAttendee.objects.filter(user=self.member).values_list("session_id", flat=True)),
+			[self.sessions[0].id, self.sessions[2].id],
+		)
+		# Only the two API bookings are tracked (the full session was filled directly)
+		self.assertEqual(sum(UtilizationSummary.objects.values_list("bookings", flat=True)), 2)
+
+	def test_operations_apply_in_order(self):
+		session = self.sessions[0]
+		res = self.batch([{"session": session.id, "action": "book"}, {"session": session.id, "action": "cancel"}])
+		self.assertEqual([r["status"] for r in res.data["results"]], ["Booked", "Unbooked"])
+		self.assertFalse(session.attendees.exists())
+
+	def test_sessions_are_locked_once_in_primary_key_order(self):
+		ids = [s.id for s in reversed(self.sessions)]
+		with mock.patch("api.booking.Session.objects.select_for_update", wraps=Session.objects.select_for_update) as lock:
+			with CaptureQueriesContext(connection) as queries:
+				self.batch([{"session": pk, "action": "book"} for pk in ids])
+		lock.assert_called_once()
+		locking = [q["sql"] for q in queries.captured_queries if 'FROM "api_session" WHERE "api_session"."id" IN' in q["sql"]]
+		self.assertEqual(len(locking), 1)
+		self.assertIn('ORDER BY "api_session"."id" ASC', locking[0])
+
+	def test_summary_is_updated_once_at_the_end_in_bucket_order(self):
+		hiit = Session.objects.create(
+			trainer=self.trainer, activity_type="hiit", date=self.sessions[0].date, time="18:00", capacity=2,
+		)
+		operations = [{"session": s.id, "action": "book"} for s in (self.sessions[0], hiit, self.sessions[1])]
+		with CaptureQueriesContext(connection) as queries:
+			self.batch(operations)
+		sql = [q["sql"] for q in queries.captured_queries]
+		summary = [i for i, q in enumerate(sql) if q.startswith('UPDATE "api_utilizationsummary"')]
+		bookings = [i for i, q in enumerate(sql) if q.startswith('INSERT INTO "api_sessionattendee"')]
+		self.assertGreater(min(summary), max(bookings))
+		touched = ["hiit" if "'hiit'" in sql[i] else "yoga" for i in summary]
+		self.assertEqual(touched, sorted(touched))  # Bucket-key order, whatever the operation order
+		self.assertEqual(
+			sorted(UtilizationSummary.objects.values_list("activity_type", "bookings")), [("hiit", 1), ("yoga", 1), ("yoga", 1)],
+		)
+
+	def test_invalid_bodies_are_rejected(self):
+		for operations in ([], [{"session": self.sessions[0].id, "action": "toggle"}], [{"session": "x", "action": "book"}]):
+			self.assertEqual(self.batch(operations).status_code, 400)
+		too_many = [{"session": self.sessions[0].id, "action": "book"}] * 51
+		self.assertEqual(self.batch(too_many).status_code, 400)
+		self.assertFalse(SessionAttendee.objects.exists())
+
+	def test_idempotency_key_replays_batch(self):
+		operations = [{"session": s.id, "action": "book"} for s in self.sessions]
+		first = self.batch(operations, HTTP_IDEMPOTENCY_KEY="week-1")
+		SessionAttendee.objects.filter(user=self.member).delete()
+		retry = self.batch(operations, HTTP_IDEMPOTENCY_KEY="week-1")
+		self.assertEqual(retry.data, first.data)
+		self.assertFalse(SessionAttendee.objects.exists())
+		# Same key, other operations: a different request, not a replay
+		res = self.batch(operations[:1], HTTP_IDEMPOTENCY_KEY="week-1")
+		self.assertEqual((res.status_code, res.data["status"]), (422, "idempotency_key_reused"))
+
+
+class SparseFieldsetTests(APITestCase):
+	def setUp(self):
+		self.trainer = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		self.member = User.objects.create_user(username="member", password="pw")
+		self.others = [User.objects.create_user(username=f"m{i}", password="pw") for i in range(3)]
+		day = (datetime.now() + timedelta(days=2)).date()
+		for i in range(6):
+			session = Session.objects.create(trainer=self.trainer, activity_type="yoga", date=day + timedelta(days=i), time="09:00", capacity=5)
+			session.attendees.add(*self.others[: i % 4])
+		self.booked = Session.objects.order_by("date").last()
+		self.booked.attendees.add(self.member)
+		Session.objects.recount_bookings()
+
+	def list_sessions(self, user, query=""):
+		self.client.force_authenticate(user)
+		res = self.client.get(f"/api/sessions/{query}")
+		self.assertEqual(res.status_code, 200)
+		return res.data
+
+	def test_fields_and_omit_limit_the_output(self):
+		rows = self.list_sessions(self.member, "?fields=id,date,time,activity_type")
+		self.assertEqual(set(rows[0]), {"id", "date", "time", "activity_type"})
+		rows = self.list_sessions(self.member, "?omit=attendees,has_started")
+		self.assertNotIn("attendees", rows[0])
+		self.assertIn("available_slots", rows[0])
+
+	def test_unknown_field_is_rejected(self):
+		self.client.force_authenticate(self.member)
+		res = self.client.get("/api/sessions/?fields=id,bogus")
+		self.assertEqual(res.status_code, 400)
+		self.assertIn("bogus", str(res.data["fields"]))
+
+	def test_full_response_is_unchanged_and_masked(self):
+		rows = {row["id"]: row for row in self.list_sessions(self.member)}
+		booked = rows[self.booked.id]
+		self.assertTrue(booked["booked"])
+		self.assertEqual(booked["trainer_username"], "coach")
+		self.assertEqual(booked["attendees"], [self.member.id])
+		self.assertEqual(booked["attendees_count"], 2)
+		self.assertEqual(booked["available_slots"], 3)
+		other = next(row for pk, row in rows.items() if pk != self.booked.id and row["attendees_count"])
+		self.assertEqual((other["trainer_username"], other["attendees"], other["booked"]), ("TBA", [], False))
+
+		staff_rows = {row["id"]: row for row in self.list_sessions(self.trainer)}
+		self.assertEqual(
+			sorted(a["username"] for a in staff_rows[self.booked.id]["attendees"]), ["m0", "member"]
+		)
+		self.assertEqual(staff_rows[self.booked.id]["trainer_username"], "coach")
+
+	def test_masking_applies_without_booked_field(self):
+		rows = {row["id"]: row for row in self.list_sessions(self.member, "?fields=id,trainer_username")}
+		self.assertEqual(rows[self.booked.id], {"id": self.booked.id, "trainer_username": "coach"})
+		self.assertEqual({row["trainer_username"] for pk, row in rows.items() if pk != self.booked.id}, {"TBA"})
+
+	def test_query_count_is_constant_and_lower_for_slim_requests(self):
+		for user in (self.member, self.trainer):
+			self.client.force_authenticate(user)
+			with CaptureQueriesContext(connection) as full:
+				self.client.get("/api/sessions/")
+			with CaptureQueriesContext(connection) as slim:
+				self.client.get("/api/sessions/?fields=id,date,time,activity_type")
+			# Plus one query for recurring session templates
+			self.assertLessEqual(len(full), 3, [q["sql"] for q in full])
+			self.assertEqual(len(slim), 2)
+			sql = next(q["sql"] for q in slim if "api_sessiontemplate" not in q["sql"])
+			self.assertNotIn("api_sessionattendee", sql)
+			self.assertNotIn("auth_user", sql)
+
+	def test_benchmark_command_reports_variants(self):
+		out = StringIO()
+		call_command("benchmark_session_fields", username="member", repeat=1, json=True, stdout=out)
+		report = json.loads(out.getvalue())
+		variants = report["variants"]
+		self.assertEqual(report["rows"], 6)
+		self.assertGreater(variants["unannotated"]["queries"], variants["full"]["queries"])
+		self.assertEqual(variants["calendar"]["queries"], 2)  # Sessions and recurring templates
+		self.assertLess(variants["calendar"]["bytes"], variants["full"]["bytes"])
+
+
+class MonthCalendarTests(APITestCase):
+	def setUp(self):
+		self.trainer = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		self.member = User.objects.create_user(username="member", password="pw")
+		self.other = User.objects.create_user(username="other", password="pw")
+		self.month = (date.today().replace(day=1) + timedelta(days=32)).replace(day=1)
+		day1, day2 = self.month + timedelta(days=2), self.month + timedelta(days=9)
+		self.full = Session.objects.create(trainer=self.trainer, activity_type="yoga", date=day1, time="09:00", capacity=1)
+		self.full.attendees.add(self.other)
+		self.mine = Session.objects.create(trainer=self.trainer, activity_type="hiit", date=day1, time="11:00", capacity=5)
+		self.mine.attendees.add(self.member)
+		Session.objects.create(trainer=self.trainer, activity_type="yoga", date=day1, time="13:00", capacity=5)
+		Session.objects.create(trainer=self.trainer, activity_type="cardio", date=day2, time="09:00", capacity=5)
+		# Next month: not included
+		Session.objects.create(trainer=self.trainer, activity_type="yoga", date=self.month + timedelta(days=40), time="09:00")
+		Session.objects.recount_bookings()
+
+	def calendar(self, user, **params):
+		self.client.force_authenticate(user)
+		return self.client.get("/api/sessions/calendar/", {"month": self.month.strftime("%Y-%m"), **params})
+
+	def test_per_day_aggregates_in_one_query(self):
+		with CaptureQueriesContext(connection) as queries:
+			res = self.calendar(self.member)
+		self.assertEqual(res.status_code, 200)
+		self.assertEqual(len(queries), 2)  # The aggregates and the recurring templates
+		self.assertIn("GROUP BY", queries[0]["sql"])
+		self.assertEqual(res.data["month"], self.month.strftime("%Y-%m"))
+		self.assertEqual(res.data["days"], [
+			{
+				"date": (self.month + timedelta(days=2)).isoformat(),
+				"classes": 3, "with_space": 2, "booked": 1,
+				"activities": {"hiit": 1, "yoga": 2},
+			},
+			{
+				"date": (self.month + timedelta(days=9)).isoformat(),
+				"classes": 1, "with_space": 1, "booked": 0,
+				"activities": {"cardio": 1},
+			},
+		])
+		self.assertLess(len(res.content), 400)
+
+	def test_activity_filter_and_staff_booking_markers(self):
+		res = self.calendar(self.trainer, activity="yoga")
+		self.assertEqual(
+			[(d["classes"], d["with_space"], d["with_bookings"], d["activities"]) for d in res.data["days"]],
+			[(2, 1, 1, {"yoga": 2})],
+		)
+
+	def test_invalid_parameters_are_rejected(self):
+		self.client.force_authenticate(self.member)
+		for params in ({"month": "2025-13"}, {"month": "2025-1-01"}, {"month": "soon"}, {"activity": "rowing"}):
+			self.assertEqual(self.client.get("/api/sessions/calendar/", params).status_code, 400)
+
+
+class BookedCountTests(APITestCase):
+	def setUp(self):
+		self.trainer = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		self.members = [User.objects.create_user(username=f"m{i}", password="pw") for i in range(3)]
+		start = datetime.now() + timedelta(days=2)
+		self.session = Session.objects.create(
+			trainer=self.trainer, activity_type="yoga", date=start.date(), time="09:00", capacity=2,
+		)
+
+	def count(self):
+		return Session.objects.values_list("booked_count", flat=True).get(pk=self.session.pk)
+
+	def test_booking_paths_keep_count_in_step(self):
+		for member in self.members[:2]:
+			self.client.force_authenticate(member)
+			self.client.post(f"/api/sessions/{self.session.id}/book/")
+		self.assertEqual(self.count(), 2)
+		self.client.force_authenticate(self.members[2])
+		self.assertEqual(self.client.post(f"/api/sessions/{self.session.id}/book/").data["status"], "Full")
+
+		self.client.force_authenticate(self.members[0])
+		self.assertEqual(self.client.post(f"/api/sessions/{self.session.id}/cancel/").data["available_slots"], 1)
+		self.client.force_authenticate(self.trainer)
+		self.client.post(f"/api/sessions/{self.session.id}/remove_attendee/", {"user_id": self.members[1].id}, format="json")
+		self.assertEqual(self.count(), 0)
+
+	def test_saving_a_stale_instance_keeps_the_count(self):
+		stale = Session.objects.get(pk=self.session.pk)
+		self.client.force_authenticate(self.members[0])
+		self.client.post(f"/api/sessions/{self.session.id}/book/")
+		stale.capacity = 5
+		stale.save()
+		self.assertEqual(self.count(), 1)
+
+	def test_recount_bookings(self):
+		self.session.attendees.add(*self.members)
+		self.assertEqual(self.count(), 0)
+		self.assertEqual(Session.objects.recount_bookings(), 1)
+		self.assertEqual(self.count(), 3)
+
+	def test_deleting_a_booked_member_frees_their_spot(self):
+		for member in self.members[:2]:
+			self.client.force_authenticate(member)
+			self.client.post(f"/api/sessions/{self.session.id}/book/")
+		self.assertEqual(self.count(), 2)
+		self.members[0].delete()
+		self.assertEqual(self.count(), 1)
+		self.assertEqual(delete_members(User.objects.filter(pk=self.members[1].pk))[0], 2)  # User and booking
+		self.assertEqual(self.count(), 0)
+		self.client.force_authenticate(self.members[2])
+		self.assertEqual(self.client.post(f"/api/sessions/{self.session.id}/book/").data["status"], "Booked")
+
+	def test_bulk_member_delete_costs_the_same_for_any_number_of_users(self):
+		big = Session.objects.create(trainer=self.trainer, activity_type="hiit", date=self.session.date, time="18:00", capacity=20)
+		extra = User.objects.bulk_create([User(username=f"bulk{i}") for i in range(8)])
+		SessionAttendee.objects.bulk_create([SessionAttendee(session=big, user=user) for user in extra])
+		Session.objects.recount_bookings()
+		with CaptureQueriesContext(connection) as one:
+			delete_members(User.objects.filter(pk=extra[0].pk))
+		with CaptureQueriesContext(connection) as many:
+			delete_members(User.objects.filter(pk__in=[user.pk for user in extra[1:]]))
+		self.assertEqual(len(many), len(one))
+		self.assertEqual(Session.objects.get(pk=big.pk).booked_count, 0)
+
+
+class NextAvailableTests(APITestCase):
+	def setUp(self):
+		self.coach = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		self.other_coach = User.objects.create_user(username="sam", password="pw", is_staff=True)
+		self.member = User.objects.create_user(username="member", password="pw")
+		day = (datetime.now() + timedelta(days=1)).date()
+
+		def make(days, at, activity="yoga", trainer=None, capacity=5, booked=0):
+			session = Session.objects.create(
+				trainer=trainer or self.coach, activity_type=activity, date=day + timedelta(days=days), time=at, capacity=capacity,
+			)
+			Session.objects.filter(pk=session.pk).update(booked_count=booked)
+			return session
+
+		# Buckets loaded by earlier tests describe rolled-back rows; the rollback also removed the epoch
+		get_index().revalidate(force=True)
+
+		self.full_evening = make(0, "18:30", capacity=2, booked=2)
+		self.morning = make(0, "07:00")
+		self.evening = make(1, "19:00")
+		self.hiit_evening = make(1, "18:00", activity="hiit", trainer=self.other_coach)
+		self.late = make(2, "18:15", trainer=self.other_coach)
+		self.past = Session.objects.create(
+			trainer=self.coach, activity_type="yoga", date=day - timedelta(days=3), time="19:00",
+		)
+		self.client.force_authenticate(self.member)
+
+	def search(self, **params):
+		res = self.client.get("/api/sessions/next_available/", params)
+		self.assertEqual(res.status_code, 200, res.data)
+		return [row["id"] for row in res.data]
+
+	def test_filters_and_order(self):
+		self.assertEqual(self.search(activity="yoga", after="18:00"), [self.evening.id, self.late.id])
+		self.assertEqual(self.search(after="18:00", limit=2), [self.hiit_evening.id, self.evening.id])
+		self.assertEqual(self.search(trainer="SAM"), [self.hiit_evening.id, self.late.id])
+		self.assertEqual(self.search(activity="yoga", before="12:00"), [self.morning.id])
+
+	def test_stale_index_answer_is_topped_up_from_sql(self):
+		self.assertEqual(self.search(limit=2), [self.morning.id, self.hiit_evening.id])
+		# Filled behind this worker's index: the recheck drops it and SQL finds the next one
+		Session.objects.filter(pk=self.morning.pk).update(booked_count=5)
+		self.assertEqual(self.search(limit=2), [self.hiit_evening.id, self.evening.id])
+
+	def test_response_supports_sparse_fieldsets(self):
+		res = self.client.get("/api/sessions/next_available/", {"limit": 1, "fields": "id,available_slots"})
+		self.assertEqual(res.data, [{"id": self.morning.id, "available_slots": 5}])
+
+	def test_invalid_parameters_are_rejected(self):
+		for params in ({"activity": "rowing"}, {"after": "6pm"}, {"before": "25:00"}, {"limit": "many"}):
+			self.assertEqual(self.client.get("/api/sessions/next_available/", params).status_code, 400, params)
+
+	@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite-specific")
+	def test_search_uses_partial_index(self):
+		upcoming = Session.objects.with_space().filter(start_at__gte=timezone.now()).order_by("start_at")
+		self.assertIn("session_open_start_idx", upcoming[:5].explain())
+		self.assertIn("session_open_activity_idx", upcoming.filter(activity_type="yoga")[:5].explain())
+
+
+class AvailabilityIndexTests(APITestCase):
+	def setUp(self):
+		self.coach = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		self.member = User.objects.create_user(username="member", password="pw")
+		self.day = (datetime.now() + timedelta(days=2)).date()
+		self.yoga = Session.objects.create(trainer=self.coach, activity_type="yoga", date=self.day, time="09:00", capacity=2)
+		self.hiit = Session.objects.create(trainer=self.coach, activity_type="hiit", date=self.day, time="18:00", capacity=3)
+		self.next_day = Session.objects.create(
+			trainer=self.coach, activity_type="yoga", date=self.day + timedelta(days=1), time="07:00", capacity=1,
+		)
+		get_index().revalidate(force=True)
+		self.client.force_authenticate(self.member)
+
+	def availability(self, **params):
+		res = self.client.get("/api/sessions/availability/", {"start": self.day.isoformat(), **params})
+		self.assertEqual(res.status_code, 200, res.data)
+		return res.data
+
+	def test_index_stays_consistent_with_database(self):
+		self.assertEqual(
+			self.availability(end=(self.day + timedelta(days=1)).isoformat())["days"],
+			{
+				self.day.isoformat(): [
+					{"id": self.yoga.id, "time": "09:00", "activity_type": "yoga", "available_slots": 2},
+					{"id": self.hiit.id, "time": "18:00", "activity_type": "hiit", "available_slots": 3},
+				],
+				(self.day + timedelta(days=1)).isoformat(): [
+					{"id": self.next_day.id, "time": "07:00", "activity_type": "yoga", "available_slots": 1},
+				],
+			},
+		)
+		other = User.objects.create_user(username="other", password="pw")
+		for user, session, verb in ((self.member, self.yoga, "book"), (other, self.yoga, "book"),
+				(self.member, self.next_day, "book"), (other, self.yoga, "cancel")):
+			self.client.force_authenticate(user)
+			self.assertEqual(self.client.post(f"/api/sessions/{session.id}/{verb}/").status_code, 200)
+			self.availability(end=(self.day + timedelta(days=1)).isoformat())
+			self.assertEqual(get_index().verify(), [])
+		days = self.availability(end=(self.day + timedelta(days=1)).isoformat())["days"]
+		self.assertEqual([row["available_slots"] for row in days[self.day.isoformat()]], [1, 3])
+
+		# Writes that bypass booked_count are picked up by a recount
+		SessionAttendee.objects.create(session=self.hiit, user=other)
+		Session.objects.recount_bookings()
+		self.assertEqual(self.availability()["days"][self.day.isoformat()][1]["available_slots"], 2)
+		self.assertEqual(get_index().verify(), [])
+
+	def test_warm_dates_are_answered_without_queries(self):
+		self.availability()
+		with self.assertNumQueries(0):
+			self.availability(activity="hiit")
+
+	def test_other_workers_reload_after_the_token_check(self):
+		worker = AvailabilityIndex()
+		self.assertEqual(worker.open_sessions(self.day, self.day), [self.yoga.id, self.hiit.id])
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(f"/api/sessions/{self.yoga.id}/book/")
+			self.client.force_authenticate(User.objects.create_user(username="other", password="pw"))
+			self.client.post(f"/api/sessions/{self.yoga.id}/book/")
+		# Until its next check (AVAILABILITY_CHECK_INTERVAL) the other worker trails the database
+		self.assertEqual(worker.open_sessions(self.day, self.day), [self.yoga.id, self.hiit.id])
+		self.assertEqual(len(worker.verify()), 1)
+		worker.revalidate(force=True)
+		self.assertEqual(worker.open_sessions(self.day, self.day), [self.hiit.id])
+		self.assertEqual(worker.verify(), [])
+
+	def test_session_changes_invalidate_the_date(self):
+		self.assertEqual(get_index().open_sessions(self.day, self.day, activity="yoga"), [self.yoga.id])
+		self.yoga.time = "19:00"
+		self.yoga.save()
+		extra = Session.objects.create(trainer=self.coach, activity_type="yoga", date=self.day, time="12:00")
+		self.assertEqual(get_index().open_sessions(self.day, self.day, activity="yoga"), [extra.id, self.yoga.id])
+		self.yoga.delete()
+		self.assertEqual(get_index().open_sessions(self.day, self.day, activity="yoga"), [extra.id])
+
+	def test_next_available_matches_sql_search(self):
+		Session.objects.filter(pk=self.yoga.pk).update(booked_count=2)
+		get_index().invalidate_all()
+		res = self.client.get("/api/sessions/next_available/", {"activity": "yoga", "limit": 1, "fields": "id"})
+		self.assertEqual(res.data, [{"id": self.next_day.id}])
+		# Too few matches in the in-memory window: the SQL search answers
+		res = self.client.get("/api/sessions/next_available/", {"activity": "yoga", "fields": "id"})
+		self.assertEqual(res.data, [{"id": self.next_day.id}])
+
+	def test_invalid_parameters_are_rejected(self):
+		for params in ({"start": "2025-13-01"}, {"end": (self.day - timedelta(days=1)).isoformat()},
+				{"end": (self.day + timedelta(days=40)).isoformat()}, {"activity": "rowing"}):
+			res = self.client.get("/api/sessions/availability/", {"start": self.day.isoformat(), **params})
+			self.assertEqual(res.status_code, 400, params)
+
+
+class RecurringSessionTests(APITestCase):
+	def setUp(self):
+		self.coach = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		self.member = User.objects.create_user(username="member", password="pw")
+		self.day = timezone.localdate() + timedelta(days=2)
+		self.template = SessionTemplate.objects.create(
+			trainer=self.coach, activity_type="yoga", weekday=self.day.weekday(), time="18:00",
+			capacity=2, starts_on=self.day,
+		)
+		self.virtual_id = f"t{self.template.pk}-{self.day:%Y%m%d}"
+		get_index().revalidate(force=True)
+		self.client.force_authenticate(self.member)
+
+	def list_ids(self):
+		return [row["id"] for row in self.client.get("/api/sessions/").data]
+
+	def test_occurrences_are_listed_without_rows(self):
+		expected = [f"t{self.template.pk}-{self.day + timedelta(weeks=n):%Y%m%d}" for n in range((HORIZON_DAYS - 3) // 7 + 1)]
+		self.assertEqual(self.list_ids(), expected)
+		self.assertEqual(Session.objects.count(), 0)
+		res = self.client.get(f"/api/sessions/{self.virtual_id}/")
+		self.assertEqual(res.status_code, 200)
+		self.assertEqual(res.data["id"], self.virtual_id)
+		self.assertEqual((res.data["available_slots"], res.data["booked"], res.data["attendees"]), (2, False, []))
+
+	def test_first_booking_materializes_the_occurrence(self):
+		res = self.client.post(f"/api/sessions/{self.virtual_id}/book/")
+		self.assertEqual(res.status_code, 200, res.data)
+		session = Session.objects.get()
+		self.assertEqual((res.data["session"], session.template, session.occurrence_date), (session.id, self.template, self.day))
+		other = User.objects.create_user(username="other", password="pw")
+		self.client.force_authenticate(other)
+		self.assertEqual(self.client.post(f"/api/sessions/{self.virtual_id}/book/").data["available_slots"], 0)
+		self.assertEqual(Session.objects.get().booked_count, 2)
+		self.assertEqual(self.client.get(f"/api/sessions/{self.virtual_id}/").data["id"], session.id)
+		self.assertEqual(self.list_ids()[0], session.id)
+		self.assertNotIn(self.virtual_id, self.list_ids())
+
+	def test_overlapping_occurrence_is_rejected_not_materialized(self):
+		clash = Session.objects.create(trainer=self.coach, activity_type="hiit", date=self.day, time="18:30")
+		res = self.client.post(f"/api/sessions/{self.virtual_id}/book/")
+		self.assertEqual(res.status_code, 400)
+		self.assertEqual(res.data["status"], "conflict")
+		self.assertIn("Trainer already has hiit", res.data["message"])
+		res = self.client.post("/api/sessions/batch/", {"operations": [{"action": "book", "session": self.virtual_id}]}, format="json")
+		self.assertEqual(res.status_code, 200)
+		result = res.data["results"][0]
+		self.assertEqual((result["http_status"], result["status"], result["conflicting_session"]), (400, "conflict", clash.id))
+		self.assertEqual(list(Session.objects.all()), [clash])
+
+	def test_admin_rejects_templates_that_overlap_the_trainers_classes(self):
+		from .admin import SessionTemplateAdminForm
+
+		def form(**changes):
+			data = {
+				"trainer": self.coach.pk, "activity_type": "hiit", "weekday": self.day.weekday(), "time": "18:30",
+				"duration_minutes": 60, "capacity": 5, "starts_on": self.day, "skipped_dates": "[]", **changes,
+			}
+			return SessionTemplateAdminForm(data=data)
+
+		overlapping = form()
+		self.assertFalse(overlapping.is_valid())
+		self.assertIn(f"The class on {self.day}: Trainer already has yoga", overlapping.non_field_errors()[0])
+		self.assertTrue(form(time="19:00").is_valid())
+		# Editing a template is checked against the others, not itself
+		edit = SessionTemplateAdminForm(instance=self.template, data={**form().data, "activity_type": "yoga", "time": "18:00"})
+		self.assertTrue(edit.is_valid(), edit.errors)
+
+	def test_cancelling_an_occurrence_creates_nothing(self):
+		res = self.client.post(f"/api/sessions/{self.virtual_id}/cancel/")
+		self.assertEqual(res.data, {"status": "Unbooked", "session": self.virtual_id, "booked": False, "available_slots": 2})
+		self.assertEqual(Session.objects.count(), 0)
+
+	def test_staff_edit_and_delete_occurrences(self):
+		self.client.force_authenticate(self.coach)
+		res = self.client.patch(f"/api/sessions/{self.virtual_id}/", {"capacity": 8, "time": "19:00"}, format="json")
+		self.assertEqual(res.status_code, 200, res.data)
+		self.assertEqual((res.data["id"], res.data["capacity"]), (Session.objects.get().id, 8))
+
+		next_week = f"t{self.template.pk}-{self.day + timedelta(weeks=1):%Y%m%d}"
+		self.assertEqual(self.client.delete(f"/api/sessions/{next_week}/").status_code, 204)
+		self.assertEqual(self.client.delete(f"/api/sessions/{res.data['id']}/").status_code, 204)
+		self.template.refresh_from_db()
+		self.assertEqual(self.template.skipped_dates, [self.day.isoformat(), (self.day + timedelta(weeks=1)).isoformat()])
+		ids = self.list_ids()
+		self.assertNotIn(self.virtual_id, ids)
+		self.assertNotIn(next_week, ids)
+		self.assertEqual(self.client.get(f"/api/sessions/{next_week}/").status_code, 404)
+
+	def test_sessions_overlapping_an_occurrence_are_rejected(self):
+		self.client.force_authenticate(self.coach)
+		res = self.client.post("/api/sessions/", {
+			"activity_type": "hiit", "date": self.day.isoformat(), "time": "18:30", "duration_minutes": 60,
+		}, format="json")
+		self.assertEqual(res.status_code, 400)
+		self.assertIn("Trainer already has yoga", str(res.data["time"][0]))
+		clash = Session(trainer=self.coach, activity_type="hiit", date=self.day + timedelta(weeks=1), time="17:30")
+		conflicts = find_batch_conflicts([clash])
+		self.assertEqual([(session, conflict.virtual_id) for session, conflict in conflicts], [
+			(clash, f"t{self.template.pk}-{self.day + timedelta(weeks=1):%Y%m%d}"),
+		])
+		# An occurrence is not in conflict with itself or the rest of its template
+		self.assertIsNone(find_conflict(self.template.occurrence(self.day)))
+		self.assertEqual(find_batch_conflicts(occurrences(*window(), templates=[self.template])), [])
+
+	def test_past_and_unlisted_occurrences_are_not_materialized(self):
+		self.template.starts_on = self.day - timedelta(weeks=2)
+		self.template.save()
+		past = f"t{self.template.pk}-{self.day - timedelta(weeks=1):%Y%m%d}"
+		far = f"t{self.template.pk}-{self.day + timedelta(weeks=HORIZON_DAYS // 7 + 1):%Y%m%d}"
+		for virtual_id in (past, far):
+			self.assertEqual(self.client.post(f"/api/sessions/{virtual_id}/book/").status_code, 404, virtual_id)
+		self.client.force_authenticate(self.coach)
+		self.assertEqual(self.client.patch(f"/api/sessions/{past}/", {"capacity": 8}, format="json").status_code, 404)
+		self.assertEqual(Session.objects.count(), 0)
+
+	def test_unknown_occurrences_are_not_found(self):
+		wrong_day = f"t{self.template.pk}-{self.day + timedelta(days=1):%Y%m%d}"
+		for path in (f"/api/sessions/{wrong_day}/", f"/api/sessions/t999-{self.day:%Y%m%d}/", f"/api/sessions/t{self.template.pk}-20251399/"):
+			self.assertEqual(self.client.get(path).status_code, 404, path)
+		self.client.force_authenticate(self.coach)
+		res = self.client.post(f"/api/sessions/{self.virtual_id}/remove_attendee/", {"user_id": self.member.id}, format="json")
+		self.assertEqual(res.status_code, 404)
+
+	def test_searches_include_occurrences(self):
+		day = self.client.get("/api/sessions/calendar/", {"month": self.day.strftime("%Y-%m")}).data["days"][0]
+		self.assertEqual(day, {"classes": 1, "with_space": 1, "booked": 0, "date": self.day.isoformat(), "activities": {"yoga": 1}})
+		res = self.client.get("/api/sessions/next_available/", {"activity": "yoga", "limit": 1, "fields": "id"})
+		self.assertEqual(res.data, [{"id": self.virtual_id}])
+		res = self.client.get("/api/sessions/availability/", {"start": self.day.isoformat()})
+		self.assertEqual(res.data["days"][self.day.isoformat()], [
+			{"id": self.virtual_id, "time": "18:00", "activity_type": "yoga", "available_slots": 2},
+		])
+
+	def test_batch_accepts_occurrence_ids(self):
+		later = f"t{self.template.pk}-{self.day + timedelta(weeks=1):%Y%m%d}"
+		res = self.client.post("/api/sessions/batch/", {"operations": [
+			{"session": self.virtual_id, "action": "book"},
+			{"session": later, "action": "cancel"},
+		]}, format="json")
+		self.assertEqual([(r["http_status"], r["status"]) for r in res.data["results"]], [(200, "Booked"), (200, "Unbooked")])
+		self.assertEqual(list(Session.objects.values_list("occurrence_date", "booked_count")), [(self.day, 1)])
+
+
+@override_settings(REMINDER_INTERVAL=None)
+class TaskQueueTests(TestCase):
+	def setUp(self):
+		self.calls = []
+
+		@tasks.task(name="test_record")
+		def record(value=None):
+			self.calls.append(value)
+
+		@tasks.task(name="test_explode", max_attempts=2)
+		def explode():
+			raise RuntimeError("boom")
+
+		self.addCleanup(tasks.REGISTRY.pop, "test_record")
+		self.addCleanup(tasks.REGISTRY.pop, "test_explode")
+
+	def work(self, **options):
+		out = StringIO()
+		call_command("run_worker", once=True, stdout=out, **options)
+		return out.getvalue()
+
+	def test_worker_runs_due_tasks_in_order_and_records_timing(self):
+		first = tasks.enqueue("test_record", value=1)
+		tasks.enqueue("test_record", value=2)
+		later = tasks.enqueue("test_record", run_after=timezone.now() + timedelta(hours=1), value=3)
+		self.assertIn("stopped after 2 task(s), 0 not successful", self.work(batch=5))
+		self.assertEqual(self.calls, [1, 2])
+		first.refresh_from_db()
+		self.assertEqual((first.status, first.attempts, first.locked_by), (Task.SUCCEEDED, 1, ""))
+		self.assertIsNotNone(first.duration_ms)
+		self.assertLessEqual(first.started_at, first.finished_at)
+		self.assertEqual(Task.objects.get(pk=later.pk).status, Task.QUEUED)
+
+	def test_failures_are_retried_with_backoff_then_marked_failed(self):
+		task = tasks.enqueue("test_explode")
+		with self.assertLogs("api.tasks", "ERROR"):
+			self.work()
+		task.refresh_from_db()
+		self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+		self.assertIn("RuntimeError: boom", task.last_error)
+		self.assertGreater(task.run_after, task.finished_at)
+		Task.objects.filter(pk=task.pk).update(run_after=timezone.now())
+		with self.assertLogs("api.tasks", "ERROR"):
+			self.work()
+		task.refresh_from_db()
+		self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+
+	def test_a_claimed_task_cannot_be_claimed_again(self):
+		task = tasks.enqueue("test_record")
+		self.assertEqual(tasks.claim("worker-a"), [task])
+		self.assertEqual(tasks.claim("worker-b"), [])
+		self.assertEqual(Task.objects.get().locked_by, "worker-a")
+
+		# The worker died: the task goes back to the queue after the lock timeout
+		Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+		self.assertEqual(tasks.requeue_stale(timeout=60), (1, 0))
+		self.assertEqual([t.locked_by for t in tasks.claim("worker-b")], ["worker-b"])
+
+	def test_a_worker_that_lost_its_lock_does_not_record_the_outcome(self):
+		tasks.enqueue("test_record", value=1)
+		[stale] = tasks.claim("worker-a")
+		self.assertTrue(tasks.heartbeat(stale))
+		Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+		tasks.requeue_stale(timeout=60)
+		[current] = tasks.claim("worker-b")
+		self.assertFalse(tasks.heartbeat(stale))
+
+		with self.assertLogs("api.tasks", "WARNING"):
+			stale = tasks.run(stale)
+		self.assertEqual((stale.status, stale.locked_by, stale.attempts), (Task.RUNNING, "worker-b", 2))
+		self.assertEqual(tasks.run(current).status, Task.SUCCEEDED)
+		self.assertEqual(self.calls, [1, 1])
+
+	def test_stale_tasks_without_attempts_left_are_failed(self):
+		task = tasks.enqueue("test_explode")
+		for attempt in range(2):
+			tasks.claim("worker-a")
+			Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+			self.assertEqual(tasks.requeue_stale(timeout=60), (1, 0) if attempt == 0 else (0, 1))
+		task.refresh_from_db()
+		self.assertEqual((task.status, task.attempts, task.locked_by), (Task.FAILED, 2, ""))
+		self.assertEqual(task.last_error, "Worker did not finish the task in time")
+		self.assertEqual(tasks.claim("worker-b"), [])
+
+	def test_unknown_tasks(self):
+		with self.assertRaises(KeyError):
+			tasks.enqueue("no_such_task")
+		task = Task.objects.create(name="no_such_task")
+		self.work()
+		task.refresh_from_db()
+		self.assertEqual((task.status, task.last_error), (Task.FAILED, "Unknown task 'no_such_task'"))
+
+	def test_builtin_tasks_reconcile_counters(self):
+		coach = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		session = Session.objects.create(trainer=coach, activity_type="yoga", date=date(2030, 1, 7), time="09:00")
+		session.attendees.add(User.objects.create_user(username="member", password="pw"))
+		tasks.enqueue(tasks.recount_bookings, session_ids=[session.pk])
+		tasks.enqueue("rebuild_utilization")
+		self.assertIn("stopped after 2 task(s), 0 not successful", self.work())
+		session.refresh_from_db()
+		self.assertEqual(session.booked_count, 1)
+		self.assertEqual(UtilizationSummary.objects.get().bookings, 1)
+
+
+@override_settings(
+	REMINDER_LEAD_MINUTES=120, REMINDER_WINDOW_MINUTES=60, NOTIFICATION_BACKEND="api.notifications.LocmemBackend",
+)
+class SessionReminderTests(TestCase):
+	def setUp(self):
+		self.coach = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		self.members = [User.objects.create_user(username=f"m{n}", password="pw") for n in range(3)]
+		now = timezone.localtime().replace(second=0, microsecond=0)
+
+		def make(minutes_ahead, members):
+			start = now + timedelta(minutes=minutes_ahead)
+			session = Session.objects.create(
+				trainer=self.coach, activity_type="yoga", date=start.date(), time=start.time(), duration_minutes=30,
+			)
+			session.attendees.add(*members)
+			return session
+
+		self.soon = make(30, self.members[:2])
+		self.later = make(100, self.members[2:])
+		self.tomorrow = make(24 * 60, self.members)
+		self.empty = make(45, [])
+		Session.objects.recount_bookings()
+		notifications.LocmemBackend.outbox = []
+
+	def test_reminders_are_queued_once_per_booking_in_few_queries(self):
+		# Two windows: session, attendance and insert queries each (the empty session is skipped by booked_count)
+		with self.assertNumQueries(6):
+			self.assertEqual(notifications.schedule_reminders(), 3)
+		self.assertEqual(
+			sorted(Notification.objects.values_list("session_id", "user__username")),
+			sorted([(self.soon.id, "m0"), (self.soon.id, "m1"), (self.later.id, "m2")]),
+		)
+		self.assertEqual(notifications.schedule_reminders(), 0)
+		self.assertEqual(Notification.objects.count(), 3)
+		self.assertTrue(Notification.objects.get(user=self.members[2]).subject.startswith("Reminder: Yoga at "))
+
+	def test_delivery_skips_cancelled_bookings(self):
+		notifications.schedule_reminders()
+		SessionAttendee.objects.filter(session=self.soon, user=self.members[1]).delete()
+		self.assertEqual(notifications.deliver_pending(batch_size=1), {"sent": 2, "cancelled": 1, "failed": 0})
+		self.assertEqual(sorted(n.user.username for n in notifications.LocmemBackend.outbox), ["m0", "m2"])
+		self.assertEqual(
+			dict(Notification.objects.values_list("user__username", "status")),
+			{"m0": Notification.SENT, "m1": Notification.CANCELLED, "m2": Notification.SENT},
+		)
+		self.assertEqual(notifications.deliver_pending(), {"sent": 0, "cancelled": 0, "failed": 0})
+
+	def test_email_failures_only_fail_their_own_notification(self):
+		for member in self.members:
+			member.email = f"{member.username}@example.com"
+			member.save()
+		notifications.schedule_reminders()
+		real_send_mail = notifications.send_mail
+
+		def send_mail(subject, body, sender, recipients):
+			if recipients == ["m1@example.com"]:
+				raise smtplib.SMTPRecipientsRefused({"m1@example.com": (550, b"No such user")})
+			return real_send_mail(subject, body, sender, recipients)
+
+		with mock.patch("api.notifications.send_mail", side_effect=send_mail), self.assertLogs("api.notifications", "ERROR"):
+			counts = notifications.deliver_pending(backend=notifications.EmailBackend())
+		self.assertEqual(counts, {"sent": 2, "cancelled": 0, "failed": 1})
+		self.assertEqual(sorted(message.to[0] for message in mail.outbox), ["m0@example.com", "m2@example.com"])
+		self.assertEqual(Notification.objects.get(status=Notification.FAILED).user, self.members[1])
+
+	def test_command_queues_and_delivers(self):
+		out = StringIO()
+		call_command("send_reminders", stdout=out)
+		self.assertIn("Queued 3 reminder(s). Sent 3, cancelled 0, failed 0.", out.getvalue())
+		self.assertEqual(len(notifications.LocmemBackend.outbox), 3)
+
+	def test_claimed_notifications_are_sent_by_one_pass_only(self):
+		notifications.schedule_reminders()
+		self.assertEqual(len(notifications.claim(2)), 2)  # Another pass is still sending these
+		self.assertEqual(notifications.deliver_pending(), {"sent": 1, "cancelled": 0, "failed": 0})
+		self.assertEqual(len(notifications.LocmemBackend.outbox), 1)
+
+		# That pass died: its claims are failed, not sent a second time
+		Notification.objects.filter(status=Notification.SENDING).update(claimed_at=timezone.now() - timedelta(hours=1))
+		self.assertEqual(notifications.deliver_pending(), {"sent": 0, "cancelled": 0, "failed": 2})
+		self.assertEqual(len(notifications.LocmemBackend.outbox), 1)
+
+	@override_settings(REMINDER_INTERVAL=300)
+	def test_worker_queues_reminder_passes(self):
+		call_command("run_worker", once=True, stdout=StringIO())
+		self.assertEqual(len(notifications.LocmemBackend.outbox), 3)
+		self.assertEqual(Task.objects.get().status, Task.SUCCEEDED)
+		self.assertIsNotNone(tasks.enqueue_unless_pending("send_reminders"))
+		self.assertIsNone(tasks.enqueue_unless_pending("send_reminders"))
+
+
+@override_settings(LEDGER_BATCH_SIZE=100, LEDGER_FLUSH_INTERVAL=60)
+class BookingLedgerTests(APITestCase):
+	def setUp(self):
+		ledger.clear()
+		self.coach = User.objects.create_user(username="coach", password="pw", is_staff=True)
+		self.member = User.objects.create_user(username="member", password="pw")
+		self.other = User.objects.create_user(username="other", password="pw")
+		start = timezone.localtime() + timedelta(days=2)
+		self.session = Session.objects.create(trainer=self.coach, activity_type="yoga", date=start.date(), time="18:00")
+		yesterday = timezone.localdate() - timedelta(days=1)
+		self.past = Session.objects.create(trainer=self.coach, activity_type="hiit", date=yesterday, time="09:00")
+
+	def tearDown(self):
+		ledger.clear()
+
+	def test_booking_changes_are_buffered_then_written_in_one_batch(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.force_authenticate(self.member)
+			self.client.post(f"/api/sessions/{self.session.id}/book/")
+			self.client.post(f"/api/sessions/{self.session.id}/cancel/")
+			self.client.force_authenticate(self.other)
+			self.client.post(f"/api/sessions/{self.session.id}/book/")
+			self.client.force_authenticate(self.coach)
+			self.client.post(f"/api/sessions/{self.session.id}/remove_attendee/", {"user_id": self.other.id})
+			attendance = SessionAttendee.objects.create(session=self.past, user=self.member)
+			self.client.post(f"/api/sessions/{self.past.id}/mark_attendance/", {"attendance_id": attendance.id, "attended": False}, format="json")
+		self.assertEqual(BookingEvent.objects.count(), 0)
+		self.assertEqual(ledger.pending(), 5)
+
+		with self.assertNumQueries(1):
+			self.assertEqual(ledger.flush(), 5)
+		self.assertEqual(
+			list(BookingEvent.objects.order_by("occurred_at", "pk").values_list("kind", "session_id", "user_id", "attended", "actor_id")),
+			[
+				(BookingEvent.BOOKED, self.session.id, self.member.id, True, None),
+				(BookingEvent.CANCELLED, self.session.id, self.member.id, True, None),
+				(BookingEvent.BOOKED, self.session.id, self.other.id, True, None),
+				(BookingEvent.REMOVED, self.session.id, self.other.id, True, self.coach.id),
+				(BookingEvent.NO_SHOW, self.past.id, self.member.id, False, self.coach.id),
+			],
+		)
+		self.assertEqual(ledger.flush(), 0)
+
+	def test_rolled_back_bookings_are_not_logged(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			with self.assertRaises(RuntimeError), transaction.atomic():
+				ledger.record(BookingEvent.BOOKED, self.session.id, self.member.id)
+				raise RuntimeError
+		self.assertEqual(ledger.pending(), 0)
+
+	def test_request_end_flushes_once_the_buffer_is_due(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			ledger.record(BookingEvent.BOOKED, self.session.id, self.member.id)
+		self.client.force_authenticate(self.member)
+		self.client.get("/api/users/me/")
+		self.assertEqual(ledger.pending(), 1)  # Neither full nor old enough yet
+		with override_settings(LEDGER_BATCH_SIZE=1):
+			self.client.get("/api/users/me/")
+		self.assertEqual(ledger.pending(), 0)
+		self.assertEqual(BookingEvent.objects.get().user_id, self.member.id)
+
+	def test_events_are_append_only(self):
+		event = BookingEvent.objects.create(
+			kind=BookingEvent.BOOKED, session_id=self.session.id, user_id=self.member.id, occurred_at=timezone.now(),
+		)
+		event.attended = False
+		with self.assertRaises(TypeError):
+			event.save()
+		with self.assertRaises(TypeError):
+			BookingEvent.objects.update(attended=False)
+		with self.assertRaises(TypeError):
+			BookingEvent.objects.all().delete()
+
+	def test_replay_rebuilds_bookings_and_analytics(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.force_authenticate(self.member)
+			self.client.post(f"/api/sessions/{self.session.id}/book/")
+			self.client.force_authenticate(self.other)
+			self.client.post(f"/api/sessions/{self.session.id}/book/")
+			self.client.post(f"/api/sessions/{self.session.id}/cancel/")
+			self.client.post(f"/api/sessions/{self.session.id}/book/")
+		ledger.flush()
+		self.client.force_authenticate(self.coach)
+		analytics_before = self.client.get("/api/analytics/utilization/").json()
+		self.assertEqual(ledger.reconcile_bookings(), {"missing": 0, "extra": 0, "changed": 0})
+		self.assertEqual(ledger.replay_summary()["differ"], 0)
+
+		# Bookings lost outside the booking paths come back from the ledger
+		SessionAttendee.objects.filter(user=self.other).delete()
+		SessionAttendee.objects.create(session=self.past, user=self.member)
+		self.assertEqual(ledger.reconcile_bookings(), {"missing": 1, "extra": 1, "changed": 0})
+		out = StringIO()
+		call_command("replay_ledger", "--bookings", "--apply", stdout=out)
+		self.assertIn("Repaired 1 missing and 0 changed attendance row(s); 1 row(s) not in the ledger left in place.", out.getvalue())
+		# The row without events could be a real booking written in bulk: it is kept
+		self.assertEqual(
+			sorted(SessionAttendee.objects.values_list("session_id", "user_id")),
+			sorted([(self.past.id, self.member.id), (self.session.id, self.member.id), (self.session.id, self.other.id)]),
+		)
+		self.session.refresh_from_db()
+		self.assertEqual(self.session.booked_count, 2)
+		self.assertTrue(Task.objects.filter(name="rebuild_utilization").exists())
+
+		UtilizationSummary.objects.update(bookings=0)
+		out = StringIO()
+		call_command("replay_ledger", "--analytics", "--apply", stdout=out)
+		self.assertIn("replayed 2 booking(s), 0 no-show(s); 1 summary bucket(s) rewritten", out.getvalue())
+		self.assertEqual(self.client.get("/api/analytics/utilization/").json(), analytics_before)
+
+		# Point in time: before anyone booked
+		out = StringIO()
+		call_command("replay_ledger", "--analytics", "--until", "2000-01-01T00:00:00", stdout=out)
+		self.assertIn("replayed 0 booking(s)", out.getvalue())
+
+	def test_reconcile_keeps_bookings_generated_without_events(self):
+		call_command(
+			"generate_dataset", users=20, trainers=2, days=2, sessions_per_day=3, capacity=4,
+			start_date=datetime(2030, 1, 1).date(), stdout=StringIO(),
+		)
+		generated = sorted(SessionAttendee.objects.values_list("session_id", "user_id", "attended"))
+		self.assertTrue(generated)
+		self.assertEqual(ledger.reconcile_bookings(apply=True), {"missing": 0, "extra": len(generated), "changed": 0})
+		self.assertEqual(sorted(SessionAttendee.objects.values_list("session_id", "user_id", "attended")), generated)
+
+
+class StressBookingsCommandTests(TransactionTestCase):
+	def test_small_storm_reports_without_capacity_violations(self):
+		out = StringIO()
+		call_command(
+			"stress_bookings",
+			members=6,
+			sessions=1,
+			capacity=2,
+			concurrency=1,
+			json=True,
+			stdout=out,
+		)
+		report = json.loads(out.getvalue())
+
+		self.assertEqual(report["operations"]["token"]["requests"], 6)
+		self.assertEqual(report["operations"]["book"]["errors"], 0)
+		self.assertEqual(report["operations"]["book"]["rejected_full"], 4)
+		self.assertEqual(report["capacity_violations"], [])
+		# Generated members and sessions are cleaned up afterwards
+		self.assertFalse(User.objects.filter(username__startswith="stress").exists())
+		self.assertFalse(Session.objects.exists())
+
+
+class ThrottleRateSettingsTests(APITestCase):
+	def setUp(self):
+		cache.clear()
+		User.objects.create_user(username="rate", password="pw12345")
+
+	def login_statuses(self, rates):
+		rest_framework = {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {**settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], **rates}}
+		with override_settings(REST_FRAMEWORK=rest_framework):
+			return [
+				self.client.post("/api/token/", {"username": "rate", "password": "pw12345"}, format="json").status_code
+				for _ in range(3)
+			]
+
+	def test_rates_are_read_from_the_current_settings(self):
+		self.assertEqual(self.login_statuses({"login": "2/min"}), [200, 200, 429])
+		cache.clear()
+		self.assertEqual(self.login_statuses({"login": None, "anon": None}), [200, 200, 200])
+
+
+class GenerateDatasetCommandTests(APITestCase):
+	def generate(self):
+		call_command(
+			"generate_dataset",
+			users=30,
+			trainers=2,
+			days=3,
+			sessions_per_day=4,
+			capacity=5,
+			batch_size=7,
+			start_date=datetime(2030, 1, 1).date(),
+			stdout=StringIO(),
+		)
+		return sorted(
+			SessionAttendee.objects.values_list("session__date", "session__time", "user__username", "attended")
+		)
+
+	def test_generates_requested_volumes_deterministically(self):
+		first = self.generate()
+		self.assertEqual(User.objects.filter(username__startswith="gen_").count(), 32)
+		self.assertEqual(Session.objects.count(), 12)
+		self.assertTrue(first)
+		for session in Session.objects.all():
+			self.assertLessEqual(session.attendees.count(), session.capacity)
+
+		call_command("generate_dataset", flush=True, stdout=StringIO())
+		self.assertFalse(Session.objects.exists())
+		self.assertEqual(self.generate(), first)
+
+
+class AttendanceExportTests(APITestCase):
+	def setUp(self):
+		self.staff = User.objects.create_user(username="coach", password="pw12345", is_staff=True)
+		self.member = User.objects.create_user(username="bob", password="pw12345")
+		self.yoga = Session.objects.create(
+			trainer=self.staff, activity_type="yoga", date=datetime(2025, 3, 1).date(), time="09:00", capacity=5,
+		)
+		self.hiit = Session.objects.create(
+			trainer=self.staff, activity_type="hiit", date=datetime(2025, 6, 1).date(), time="18:00", capacity=5,
+		)
+		self.yoga.attendees.add(self.member)
+		self.hiit.attendees.add(self.member)
+
+	def export(self, **params):
+		res = self.client.get("/api/attendance/export/", params)
+		self.assertEqual(res.status_code, 200)
+		return b"".join(res.streaming_content).decode()
+
+	def test_export_requires_staff(self):
+		self.client.force_authenticate(self.member)
+		res = self.client.get("/api/attendance/export/")
+		self.assertEqual(res.status_code, 403)
+
+	def test_csv_export_streams_joined_rows(self):
+		self.client.force_authenticate(self.staff)
+		lines = self.export(format="csv").strip().splitlines()
+		self.assertEqual(lines[0].split(",")[:3], ["attendance_id", "session_id", "date"])
+		self.assertEqual(len(lines), 3)
+		self.assertIn("yoga,coach", lines[1])
+		self.assertTrue(lines[1].endswith("bob,True"))
+
+	def test_ndjson_export_filters_by_date_and_activity(self):
+		self.client.force_authenticate(self.staff)
+		rows = [json.loads(line) for line in self.export(format="ndjson", start="2025-05-01").splitlines()]
+		self.assertEqual([row["activity_type"] for row in rows], ["hiit"])
+		self.assertEqual(rows[0]["username"], "bob")
+		self.assertEqual(self.export(format="ndjson", activity="pilates"), "")
+
+	def test_invalid_filter_returns_400(self):
+		self.client.force_authenticate(self.staff)
+		res = self.client.get("/api/attendance/export/", {"start": "not-a-date"})
+		self.assertEqual(res.status_code, 400)
+
+
+class UtilizationAnalyticsTests(APITestCase):
+	def setUp(self):
+		self.staff = User.objects.create_user(username="coach", password="pw12345", is_staff=True)
+		self.members = [User.objects.create_user(username=f"m{i}", password="pw12345") for i in range(3)]
+		start = datetime.now() + timedelta(days=2)
+		self.client.force_authenticate(self.staff)
+		res = self.client.post("/api/sessions/", {
+			"activity_type": "yoga",
+			"date": start.date().isoformat(),
+			"time": "09:00",
+			"capacity": 4,
+		}, format="json")
+		self.assertEqual(res.status_code, 201)
+		self.session = Session.objects.get(pk=res.data["id"])
+
+	def report(self):
+		self.client.force_authenticate(self.staff)
+		res = self.client.get("/api/analytics/utilization/")
+		self.assertEqual(res.status_code, 200)
+		return res.data
+
+	def summary_rows(self):
+		return sorted(UtilizationSummary.objects.values_list(
+			"activity_type", "weekday", "hour", "sessions", "capacity", "bookings", "no_shows",
+		))
+
+	def test_summary_tracks_bookings_attendance_and_removals(self):
+		for member in self.members:
+			self.client.force_authenticate(member)
+			self.client.post(f"/api/sessions/{self.session.id}/book/")
+		self.client.force_authenticate(self.members[0])
+		self.client.post(f"/api/sessions/{self.session.id}/cancel/")
+
+		# Move the session into the past so attendance can be marked
+		Session.objects.filter(pk=self.session.pk).update(date=self.session.date - timedelta(days=7))
+		attendance = SessionAttendee.objects.get(session=self.session, user=self.members[1])
+		self.client.force_authenticate(self.staff)
+		res = self.client.post(
+			f"/api/sessions/{self.session.id}/mark_attendance/",
+			{"attendance_id": attendance.id, "attended": False},
+			format="json",
+		)
+		self.assertEqual(res.status_code, 200)
+
+		totals = self.report()["totals"]
+		self.assertEqual(
+			(totals["sessions"], totals["capacity"], totals["bookings"], totals["no_shows"]), (1, 4, 2, 1)
+		)
+		self.assertEqual(totals["fill_rate"], 0.5)
+		self.assertEqual(totals["no_show_rate"], 0.5)
+
+		# Form-encoded values are parsed, not stored as truthy strings
+		url = f"/api/sessions/{self.session.id}/mark_attendance/"
+		self.assertEqual(self.client.post(url, {"attendance_id": attendance.id, "attended": "maybe"}).status_code, 400)
+		self.assertEqual(self.client.post(url, {"attendance_id": attendance.id, "attended": "false"}).data["attended"], False)
+		self.assertEqual(self.report()["totals"]["no_shows"], 1)
+
+		self.client.post(f"/api/sessions/{self.session.id}/remove_attendee/", {"user_id": self.members[1].id}, format="json")
+		incremental = self.summary_rows()
+		call_command("rebuild_utilization", stdout=StringIO())
+		self.assertEqual(self.summary_rows(), incremental)
+
+	def test_session_update_and_delete_move_counters(self):
+		self.client.force_authenticate(self.members[0])
+		self.client.post(f"/api/sessions/{self.session.id}/book/")
+		self.client.force_authenticate(self.staff)
+		res = self.client.patch(f"/api/sessions/{self.session.id}/", {"time": "18:00", "activity_type": "hiit"}, format="json")
+		self.assertEqual(res.status_code, 200)
+
+		data = self.report()
+		self.assertEqual([row["activity_type"] for row in data["by_activity"] if row["sessions"]], ["hiit"])
+		self.assertEqual([row["time_slot"] for row in data["by_time_slot"] if row["bookings"]], ["18:00"])
+
+		self.client.delete(f"/api/sessions/{self.session.id}/")
+		self.assertEqual(self.report()["totals"]["bookings"], 0)
+		self.assertEqual(self.report()["totals"]["sessions"], 0)
+
+	def test_analytics_requires_staff(self):
+		self.client.force_authenticate(self.members[0])
+		self.assertEqual(self.client.get("/api/analytics/utilization/").status_code, 403)
+
+
+class TrainerConflictTests(APITestCase):
+	def setUp(self):
+		self.staff = User.objects.create_user(username="coach", password="pw12345", is_staff=True)
+		self.other_trainer = User.objects.create_user(username="coach2", password="pw12345", is_staff=True)
+		self.day = (datetime.now() + timedelta(days=3)).date()
+		self.existing = Session.objects.create(
+			trainer=self.staff, activity_type="yoga", date=self.day, time="10:00", duration_minutes=60,
+		)
+		self.client.force_authenticate(self.staff)
+
+	def create(self, time, duration=60, **extra):
+		return self.client.post("/api/sessions/", {
+			"activity_type": "hiit", "date": self.day.isoformat(), "time": time, "duration_minutes": duration, **extra,
+		}, format="json")
+
+	def test_stored_interval_is_derived_from_date_time_and_duration(self):
+		self.assertEqual(self.existing.start_at.hour, 10)
+		self.assertEqual(self.existing.end_at - self.existing.start_at, timedelta(minutes=60))
+
+	def test_overlapping_create_is_rejected(self):
+		res = self.create("10:30")
+		self.assertEqual(res.status_code, 400)
+		self.assertIn("time", res.data)
+		self.assertEqual(self.create("09:00", duration=90).status_code, 400)
+
+	def test_chosen_trainer_is_checked_instead_of_the_default(self):
+		res = self.create("10:30")
+		self.assertIn("Choose a trainer", str(res.data["time"][0]))
+		res = self.create("10:30", trainer=self.other_trainer.pk)
+		self.assertEqual(res.status_code, 201)
+		self.assertEqual(Session.objects.get(pk=res.data["id"]).trainer, self.other_trainer)
+		self.assertNotIn("trainer", res.data)
+		self.assertEqual(self.create("11:00", trainer=self.other_trainer.pk).status_code, 400)
+
+	def test_adjacent_sessions_are_allowed(self):
+		self.assertEqual(self.create("11:00").status_code, 201)
+		self.assertEqual(self.create("09:00").status_code, 201)
+
+	def test_update_checks_against_other_sessions_only(self):
+		later = self.create("12:00")
+		self.assertEqual(later.status_code, 201)
+		res = self.client.patch(f"/api/sessions/{later.data['id']}/", {"time": "10:45"}, format="json")
+		self.assertEqual(res.status_code, 400)
+		res = self.client.patch(f"/api/sessions/{self.existing.id}/", {"duration_minutes": 90}, format="json")
+		self.assertEqual(res.status_code, 200)
+
+	def test_existing_overlaps_are_listed_for_the_constraint(self):
+		self.assertEqual(overlap_constraint.find_overlaps(connection), [])
+		clash = Session.objects.create(trainer=self.staff, activity_type="hiit", date=self.day, time="10:30")
+		Session.objects.create(trainer=self.other_trainer, activity_type="hiit", date=self.day, time="10:30")
+		overlaps = overlap_constraint.find_overlaps(connection)
+		self.assertEqual([(first, second, trainer) for first, second, trainer, _ in overlaps], [(self.existing.id, clash.id, self.staff.id)])
+		self.assertIn(f"sessions {self.existing.id} and {clash.id} (trainer {self.staff.id}, {self.day}", overlap_constraint.describe_overlaps(overlaps))
+		if connection.vendor != "postgresql":
+			out = StringIO()
+			call_command("add_overlap_constraint", stdout=out)
+			self.assertIn("PostgreSQL only", out.getvalue())
+
+	def test_batch_validation_uses_a_fixed_number_of_queries(self):
+		batch = [
+			Session(trainer=self.staff, activity_type="cardio", date=self.day + timedelta(days=d), time=f"{h:02d}:00")
+			for d in range(100)
+			for h in range(6, 22, 2)
+		]
+		batch.append(Session(trainer=self.staff, activity_type="cardio", date=self.day, time="10:15"))
+		batch.append(Session(trainer=self.staff, activity_type="cardio", date=self.day, time="06:30"))
+		batch.append(Session(trainer=self.other_trainer, activity_type="cardio", date=self.day, time="10:00"))
+
+		with self.assertNumQueries(2):  # sessions and templates
+			conflicts = find_batch_conflicts(batch)
+
+		self.assertEqual(
+			sorted((s.time.strftime("%H:%M"), o.time.strftime("%H:%M")) for s, o in conflicts),
+			[("06:30", "06:00"), ("10:00", "10:00"), ("10:15", "10:00")],
+		)
+
+
+class MemberDoubleBookingTests(APITestCase):
+	def setUp(self):
+		trainers = [User.objects.create_user(username=f"coach{i}", password="pw12345", is_staff=True) for i in range(3)]
+		self.member = User.objects.create_user(username="dana", password="pw12345")
+		day = (datetime.now() + timedelta(days=2)).date()
+		self.morning = Session.objects.create(trainer=trainers[0], activity_type="yoga", date=day, time="10:00")
+		self.overlapping = Session.objects.create(trainer=trainers[1], activity_type="hiit", date=day, time="10:30")
+		self.after = Session.objects.create(trainer=trainers[2], activity_type="cardio", date=day, time="11:00")
+		self.client.force_authenticate(self.member)
+
+	def book(self, session):
+		return self.client.post(f"/api/sessions/{session.id}/book/")
+
+	def cancel(self, session):
+		return self.client.post(f"/api/sessions/{session.id}/cancel/")
+
+	def test_overlapping_booking_is_rejected(self):
+		self.assertEqual(self.book(self.morning).data["status"], "Booked")
+		res = self.book(self.overlapping)
+		self.assertEqual(res.status_code, 400)
+		self.assertEqual(res.data["status"], "conflict")
+		self.assertEqual(res.data["conflicting_session"], self.morning.id)
+		self.assertFalse(self.overlapping.attendees.exists())
+
+	def test_back_to_back_and_rebooking_after_cancel_are_allowed(self):
+		self.book(self.morning)
+		self.assertEqual(self.book(self.after).data["status"], "Booked")
+		self.assertEqual(self.cancel(self.morning).data["status"], "Unbooked")
+		self.assertEqual(self.cancel(self.after).data["status"], "Unbooked")
+		self.assertEqual(self.book(self.overlapping).data["status"], "Booked")
+
+	def test_member_is_locked_before_the_overlap_check(self):
+		with mock.patch("api.booking.User.objects.select_for_update", wraps=User.objects.select_for_update) as lock:
+			def check_locked(*args):
+				lock.assert_called_once()
+				return find_member_conflict(*args)
+
+			with mock.patch("api.booking.find_member_conflict", side_effect=check_locked) as check:
+				self.assertEqual(self.book(self.morning).data["status"], "Booked")
+		check.assert_called_once()
+
+	def test_conflict_check_is_a_single_query(self):
+		self.book(self.morning)
+		with self.assertNumQueries(1):
+			self.assertEqual(find_member_conflict(self.member, self.overlapping), self.morning)
+
+
+class SessionArchiveTests(APITestCase):
+	def setUp(self):
+		self.staff = User.objects.create_user(username="coach", password="pw12345", is_staff=True)
+		self.member = User.objects.create_user(username="erin", password="pw12345")
+		self.other = User.objects.create_user(username="finn", password="pw12345")
+		today = datetime.now().date()
+		self.old_sessions = [
+			Session.objects.create(
+				trainer=self.staff, activity_type="yoga", date=today - timedelta(days=400 + i), time="09:00",
+			)
+			for i in range(5)
+		]
+		self.recent = Session.objects.create(
+			trainer=self.staff, activity_type="hiit", date=today - timedelta(days=10), time="09:00",
+		)
+		for session in self.old_sessions[:3] + [self.recent]:
+			session.attendees.add(self.member)
+		self.old_sessions[0].attendees.add(self.other)
+		SessionAttendee.objects.filter(session=self.old_sessions[1]).update(attended=False)
+
+	def test_archive_moves_old_sessions_in_batches(self):
+		out = StringIO()
+		call_command("archive_sessions", retention_days=365, batch_size=2, stdout=out)
+		self.assertIn("Archived 5 sessions and 4 attendance rows", out.getvalue())
+
+		self.assertEqual(list(Session.objects.all()), [self.recent])
+		self.assertEqual(SessionAttendee.objects.count(), 1)
+		self.assertEqual(ArchivedSession.objects.count(), 5)
+		archived = ArchivedSession.objects.get(pk=self.old_sessions[0].pk)
+		self.assertEqual(archived.trainer_username, "coach")
+		self.assertEqual(archived.attendance.count(), 2)
+
+	def test_archive_cutoff_cannot_reach_live_sessions(self):
+		tomorrow = (archive_cutoff(0) + timedelta(days=1)).isoformat()
+		for options in ({"before": tomorrow}, {"before": "next week"}, {"retention_days": -1}):
+			with self.assertRaises(CommandError, msg=options):
+				call_command("archive_sessions", stdout=StringIO(), **options)
+		self.assertEqual(ArchivedSession.objects.count(), 0)
+		out = StringIO()
+		call_command("archive_sessions", before=archive_cutoff(0).isoformat(), stdout=out)
+		self.assertIn("Archived 6 sessions", out.getvalue())
+
+	def test_archive_id_collision_keeps_the_hot_rows(self):
+		old = self.old_sessions[-1]
+		ArchivedSession.objects.create(
+			id=old.id, activity_type="hiit", trainer=self.staff, trainer_username="coach", date=old.date, time="07:00",
+		)
+		with self.assertRaises(IntegrityError):
+			call_command("archive_sessions", retention_days=365, stdout=StringIO())
+		self.assertTrue(Session.objects.filter(pk=old.pk).exists())
+		self.assertEqual(ArchivedSession.objects.count(), 1)
+
+	def test_history_and_export_read_archived_rows(self):
+		call_command("archive_sessions", retention_days=365, stdout=StringIO())
+
+		self.client.force_authenticate(self.member)
+		res = self.client.get("/api/sessions/history/")
+		self.assertEqual(res.status_code, 200)
+		self.assertEqual(len(res.data), 3)
+		self.assertEqual(sorted(row["attended"] for row in res.data), [False, True, True])
+
+		self.client.force_authenticate(self.staff)
+		res = self.client.get("/api/sessions/history/")
+		self.assertEqual(len(res.data), 5)
+
+		res = self.client.get("/api/attendance/export/", {"format": "ndjson"})
+		rows = [json.loads(line) for line in b"".join(res.streaming_content).decode().splitlines()]
+		self.assertEqual(len(rows), 5)
+		self.assertEqual(rows[-1]["session_id"], self.recent.id)
+		res = self.client.get("/api/attendance/export/", {"format": "ndjson", "include_archived": "false"})
+		self.assertEqual(len(b"".join(res.streaming_content).decode().splitlines()), 1)
+
+	def test_rebuilt_summary_still_counts_archived_history(self):
+		call_command("rebuild_utilization", stdout=StringIO())
+		before = sorted(UtilizationSummary.objects.values_list("activity_type", "weekday", "hour", "sessions", "bookings", "no_shows"))
+		call_command("archive_sessions", retention_days=365, stdout=StringIO())
+		call_command("rebuild_utilization", stdout=StringIO())
+		after = sorted(UtilizationSummary.objects.values_list("activity_type", "weekday", "hour", "sessions", "bookings", "no_shows"))
+		self.assertEqual(after, before)
+
+
+class AdminChangelistTests(TestCase):
+	def setUp(self):
+		self.admin = User.objects.create_superuser(username="boss", password="pw12345")
+		self.members = User.objects.bulk_create([User(username=f"adm_member_{i}") for i in range(12)])
+		self.client.force_login(self.admin)
+
+	def add_sessions(self, count, start_day):
+		today = datetime.now().date()
+		for i in range(count):
+			session = Session.objects.create(
+				trainer=self.admin, activity_type="yoga", date=today + timedelta(days=start_day + i), time="09:00",
+			)
+			SessionAttendee.objects.bulk_create(
+				[SessionAttendee(session=session, user=member) for member in self.members[: i + 1]]
+			)
+		Session.objects.recount_bookings()
+
+	def changelist_queries(self, url):
+		with CaptureQueriesContext(connection) as ctx:
+			res = self.client.get(url)
+		self.assertEqual(res.status_code, 200)
+		return len(ctx.captured_queries)
+
+	def test_changelists_use_constant_queries(self):
+		for url in ("/admin/api/session/", "/admin/api/sessionattendee/"):
+			self.add_sessions(2, start_day=0 if url.endswith("session/") else 20)
+			small = self.changelist_queries(url)
+			self.add_sessions(10, start_day=40 if url.endswith("session/") else 60)
+			self.assertEqual(self.changelist_queries(url), small, url)
+
+	def test_session_changelist_shows_booked_count(self):
+		self.add_sessions(3, start_day=1)
+		res = self.client.get("/admin/api/session/")
+		self.assertEqual([s.booked_count for s in res.context["cl"].result_list], [3, 2, 1])
+
+	def test_edit_keeps_trainer_and_new_session_gets_first_staff_user(self):
+		coach = User.objects.create_user(username="coach", password="pw12345", is_staff=True)
+		session = Session.objects.create(trainer=coach, activity_type="yoga", date="2030-01-07", time="09:00")
+		data = {"activity_type": "pilates", "date": "2030-01-07", "time": "09:00", "duration_minutes": 60, "capacity": 10}
+		res = self.client.post(f"/admin/api/session/{session.pk}/change/", data)
+		self.assertEqual(res.status_code, 302)
+		session.refresh_from_db()
+		self.assertEqual((session.activity_type, session.trainer), ("pilates", coach))
+
+		res = self.client.post("/admin/api/session/add/", {**data, "date": "2030-01-08"})
+		self.assertEqual(res.status_code, 302)
+		self.assertEqual(Session.objects.get(date="2030-01-08").trainer, self.admin)
+
+		res = self.client.post("/admin/api/session/add/", {**data, "date": "2030-01-08", "time": "09:30"})
+		self.assertContains(res, "Choose a trainer for this session.")
+		res = self.client.post("/admin/api/session/add/", {**data, "date": "2030-01-08", "time": "09:30", "trainer": coach.pk})
+		self.assertEqual(res.status_code, 302)
+		self.assertEqual(Session.objects.get(date="2030-01-08", time="09:30").trainer, coach)
+
+
+class TimetableImportTests(TestCase):
+	def setUp(self):
+		self.admin = User.objects.create_superuser(username="boss", password="pw12345")
+		self.client.force_login(self.admin)
+		self.existing = Session.objects.create(
+			trainer=self.admin, activity_type="yoga", date="2030-03-04", time="09:00", capacity=10,
+		)
+
+	def upload(self, name, content):
+		return self.client.post("/admin/api/session/import/", {"file": SimpleUploadedFile(name, content.encode())})
+
+	def test_csv_preview_then_confirm_upserts(self):
+		res = self.upload("term.csv", (
+			"activity_type,date,time,duration_minutes,capacity\n"
+			"Yoga,2030-03-04,09:00,60,15\n"
+			"hiit,2030-03-04,10:00,45,12\n"
+			"pilates,2030-03-05,07:30,,\n"
+		))
+		self.assertEqual(res.status_code, 200)
+		plan = res.context["plan"]
+		self.assertEqual((len(plan["create"]), len(plan["update"]), plan["errors"]), (2, 1, []))
+		self.assertEqual(plan["update"][0]["changes"], ["capacity"])
+		self.assertEqual(Session.objects.count(), 1)
+
+		res = self.client.post("/admin/api/session/import/", {"confirm": "1"})
+		self.assertRedirects(res, "/admin/api/session/")
+		self.assertEqual(Session.objects.count(), 3)
+		self.existing.refresh_from_db()
+		self.assertEqual(self.existing.capacity, 15)
+		hiit = Session.objects.get(activity_type="hiit")
+		self.assertEqual((hiit.duration_minutes, hiit.trainer, hiit.end_at - hiit.start_at), (45, self.admin, timedelta(minutes=45)))
+		self.assertEqual(Session.objects.get(activity_type="pilates").capacity, 10)
+		self.assertEqual(sum(UtilizationSummary.objects.values_list("sessions", flat=True)), 2)
+
+	def test_invalid_rows_and_overlaps_block_the_import(self):
+		res = self.upload("term.csv", (
+			"activity_type,date,time,duration_minutes\n"
+			"boxing,2030-03-04,11:00,60\n"
+			"hiit,2030-03-04,09:30,30\n"
+			"cardio,2030-13-01,09:00,30\n"
+		))
+		errors = dict(res.context["plan"]["errors"])
+		self.assertIn("Unknown activity type", errors[2])
+		self.assertIn("overlaps", errors[3])
+		self.assertIn("Invalid date", errors[4])
+		self.assertNotContains(res, "Confirm import")
+
+	def test_capacity_below_bookings_is_rejected(self):
+		Session.objects.filter(pk=self.existing.pk).update(booked_count=6)
+		res = self.upload("term.csv", "activity_type,date,time,capacity\nyoga,2030-03-04,09:00,5\nyoga,2030-03-04,09:00,6\n")
+		self.assertEqual(res.context["plan"]["errors"], [
+			(2, "Capacity 5 is below the 6 members already booked."), (3, "Duplicate of line 2."),
+		])
+
+	def test_confirm_rechecks_the_plan_under_lock(self):
+		rows = [
+			{"line": 2, "activity_type": "yoga", "date": "2030-03-04", "time": "09:00:00", "duration_minutes": 60, "capacity": 12, "trainer": None},
+			{"line": 3, "activity_type": "hiit", "date": "2030-03-05", "time": "10:00:00", "duration_minutes": 60, "capacity": 12, "trainer": None},
+		]
+		plan = timetable_import.build_plan(rows, self.admin.pk)
+		self.assertEqual((len(plan["create"]), len(plan["update"]), plan["errors"]), (1, 1, []))
+		# Both rows went stale between the preview and the confirmation
+		Session.objects.filter(pk=self.existing.pk).update(capacity=20)
+		Session.objects.create(trainer=self.admin, activity_type="cardio", date="2030-03-05", time="10:30")
+		with self.assertRaises(timetable_import.PlanOutdated) as raised:
+			timetable_import.apply_plan(plan)
+		self.assertEqual([line for line, _ in raised.exception.errors], [2, 3])
+		self.assertIn("capacity changed to 20", raised.exception.errors[0][1])
+		self.assertIn("Trainer already has cardio", raised.exception.errors[1][1])
+		self.assertEqual(Session.objects.count(), 2)
+		self.assertEqual(Session.objects.get(pk=self.existing.pk).capacity, 20)
+
+	def test_ics_events_are_parsed(self):
+		res = self.upload("term.ics", "\r\n".join([
+			"BEGIN:VCALENDAR",
+			"BEGIN:VEVENT",
+			"SUMMARY:Weightlifting",
+			"DTSTART;TZID=Europe/London:20300306T180000",
+			"DURATION:PT1H30M",
+			"X-GYMFLEX-CAPACITY:8",
+			"END:VEVENT",
+			"BEGIN:VEVENT",
+			"SUMMARY:Cardio",
+			"DTSTART:20300307T070000",
+			"DTEND:20300307T074",
+			" 500",
+			"END:VEVENT",
+			"END:VCALENDAR",
+		]))
+		creates = res.context["plan"]["create"]
+		self.assertEqual(
+			[(row["activity_type"], row["date"], row["time"], row["duration_minutes"], row["capacity"]) for row in creates],
+			[("weights", "2030-03-06", "18:00:00", 90, 8), ("cardio", "2030-03-07", "07:00:00", 45, 10)],
+		)
+
+
+class FrontendAssetsTests(SimpleTestCase):
+	def setUp(self):
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.root = Path(tmp.name)
+		self.bundle = "index-B1x9kQ2a.js"
+		content = ("console.log('gymflex');\n" * 500).encode()
+		(self.root / self.bundle).write_bytes(content)
+		(self.root / "logo.svg").write_text("<svg></svg>")
+		(self.root / "font-awesome-semibold.woff2").write_bytes(b"wOF2")
+		# What the precompress plugin in frontend/vite.config.js writes
+		(self.root / (self.bundle + ".gz")).write_bytes(gzip.compress(content))
+		(self.root / (self.bundle + ".br")).write_bytes(brotli.compress(content))
+		with override_settings(FRONTEND_ASSETS_ROOT=self.root, WHITENOISE_AUTOREFRESH=False):
+			self.middleware = FrontendAssetsMiddleware(lambda request: HttpResponse(status=404))
+		self.factory = RequestFactory()
+
+	def get(self, path, **headers):
+		return self.middleware(self.factory.get(path, headers=headers))
+
+	def test_hashed_bundles_are_immutable_and_precompressed(self):
+		res = self.get(f"/assets/{self.bundle}", accept_encoding="gzip, br")
+		self.assertEqual(res.status_code, 200)
+		self.assertIn("immutable", res["Cache-Control"])
+		self.assertEqual(res["Content-Encoding"], "br")
+		res = self.get(f"/assets/{self.bundle}", accept_encoding="gzip")
+		self.assertEqual(res["Content-Encoding"], "gzip")
+		self.assertNotIn("immutable", self.get("/assets/logo.svg")["Cache-Control"])
+		self.assertNotIn("immutable", self.get("/assets/font-awesome-semibold.woff2")["Cache-Control"])
+
+	def test_nothing_is_written_at_startup(self):
+		with override_settings(FRONTEND_ASSETS_ROOT=self.root, WHITENOISE_AUTOREFRESH=False):
+			FrontendAssetsMiddleware(lambda request: HttpResponse(status=404))
+		self.assertFalse((self.root / "logo.svg.gz").exists())
+
+	def test_range_requests(self):
+		res = self.get(f"/assets/{self.bundle}", range="bytes=0-6")
+		self.assertEqual(res.status_code, 206)
+		self.assertEqual(b"".join(res.streaming_content), b"console")
+
+	def test_no_filesystem_stat_per_request(self):
+		self.get(f"/assets/{self.bundle}")  # warm-up
+		with mock.patch("os.stat", wraps=os.stat) as stat:
+			for _ in range(5):
+				res = self.get(f"/assets/{self.bundle}", accept_encoding="gzip")
+				b"".join(res.streaming_content)
+				res.close()
+		self.assertEqual(stat.call_count, 0)
+		self.assertEqual(self.get("/assets/missing-12345678.js").status_code, 404)
+
+
+class SPAShellTests(SimpleTestCase):
+	def setUp(self):
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.index = Path(tmp.name) / "index.html"
+		self.index.write_text("<html><head><title>GymFlex</title></head><body><div id=root></div></body></html>")
+
+	def test_shell_is_cached_and_revalidated_with_etag(self):
+		with override_settings(FRONTEND_INDEX_FILE=self.index, SPA_SHELL_CHECK_INTERVAL=60):
+			res = self.client.get("/sessions/123")
+			self.assertEqual(res.status_code, 200)
+			self.assertEqual(res["Cache-Control"], "no-cache")
+			self.assertContains(res, '<div id=root>')
+			etag = res["ETag"]
+
+			with mock.patch("builtins.open") as opened, mock.patch("os.stat") as stat:
+				res = self.client.get("/profile", headers={"if-none-match": etag})
+			self.assertEqual(res.status_code, 304)
+			self.assertEqual((opened.call_count, stat.call_count), (0, 0))
+
+	def test_rebuilt_file_is_reloaded(self):
+		with override_settings(FRONTEND_INDEX_FILE=self.index, SPA_SHELL_CHECK_INTERVAL=0):
+			etag = self.client.get("/").headers["ETag"]
+			self.index.write_text("<html><head></head><body>v2</body></html>")
+			os.utime(self.index, ns=(0, self.index.stat().st_mtime_ns + 10**9))
+			res = self.client.get("/", headers={"if-none-match": etag})
+			self.assertEqual(res.status_code, 200)
+			self.assertContains(res, "v2")
+			self.assertNotEqual(res["ETag"], etag)
+
+	def test_bootstrap_payload_is_inlined(self):
+		with override_settings(FRONTEND_INDEX_FILE=self.index, SPA_BOOTSTRAP={"apiUrl": "/api", "note": "</script>"}):
+			res = self.client.get("/")
+		html = res.content.decode()
+		self.assertIn('window.__GYMFLEX_BOOTSTRAP__ = {"apiUrl":"/api","note":"\\u003c/script>"};</script></head>', html)
+
+
+class SQLiteProfileTests(SimpleTestCase):
+	"""The SQLite OPTIONS in settings.DATABASES, exercised against a real database file."""
+
+	def setUp(self):
+		if connection.vendor != "sqlite":
+			self.skipTest("SQLite profile only")
+		tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(tmp.cleanup)
+		self.settings_dict = {**connections["default"].settings_dict, "NAME": str(Path(tmp.name) / "profile.sqlite3")}
+		self.run_in_thread(lambda cursor: cursor.execute("CREATE TABLE booking (id INTEGER PRIMARY KEY, session_id INTEGER)"))
+
+	def run_in_thread(self, work, alias="profile_worker", wait=True):
+		"""Run work(cursor) in a new thread on its own connection to the temp file."""
+		errors = []
+
+		def target():
+			wrapper = SQLiteDatabaseWrapper(self.settings_dict, alias)
+			connections[alias] = wrapper
+			try:
+				work(wrapper.cursor())
+			except Exception as exc:  # surfaced in the main thread
+				errors.append(exc)
+			finally:
+				wrapper.close()
+				del connections[alias]
+
+		thread = threading.Thread(target=target)
+		thread.start()
+		if wait:
+			thread.join(10)
+		return thread, errors
+
+	def count(self, cursor):
+		cursor.execute("SELECT COUNT(*) FROM booking")
+		return cursor.fetchone()[0]
+
+	def test_pragmas_applied_on_connect(self):
+		pragmas = {}
+
+		def read_pragmas(cursor):
+			for name in ("journal_mode", "synchronous", "busy_timeout"):
+				cursor.execute(f"PRAGMA {name}")
+				pragmas[name] = cursor.fetchone()[0]
+			pragmas["transaction_mode"] = connections["profile_worker"].transaction_mode
+
+		_, errors = self.run_in_thread(read_pragmas)
+		self.assertEqual(errors, [])
+		self.assertEqual(
+			pragmas, {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 20000, "transaction_mode": "IMMEDIATE"}
+		)
+
+	def test_readers_do_not_block_on_writers(self):
+		written, release = threading.Event(), threading.Event()
+		seen = {}
+
+		def slow_writer(cursor):
+			with transaction.atomic(using="profile_writer"):
+				cursor.execute("INSERT INTO booking (session_id) VALUES (1)")
+				written.set()
+				release.wait(5)
+
+		def reader(cursor):
+			started = time.monotonic()
+			seen["count"] = self.count(cursor)
+			seen["elapsed"] = time.monotonic() - started
+
+		writer, writer_errors = self.run_in_thread(slow_writer, alias="profile_writer", wait=False)
+		self.assertTrue(written.wait(5))
+		_, errors = self.run_in_thread(reader, alias="profile_reader")
+		release.set()
+		writer.join(10)
+		self.assertEqual(errors + writer_errors, [])
+		self.assertEqual(seen["count"], 0)  # uncommitted booking is invisible, and did not block the read
+		self.assertLess(seen["elapsed"], 1)
+
+		# A long streaming read (e.g. the attendance export) does not block a writer's commit either
+		self.run_in_thread(lambda cursor: cursor.executemany("INSERT INTO booking (session_id) VALUES (%s)", [(3,)] * 500))
+		snapshot_open, release = threading.Event(), threading.Event()
+
+		def long_reader(cursor):
+			cursor.execute("SELECT id FROM booking")
+			rows = [cursor.fetchone()]
+			snapshot_open.set()
+			release.wait(5)
+			rows += cursor.fetchall()
+			seen["streamed"] = len(rows)
+
+		def writer(cursor):
+			started = time.monotonic()
+			with transaction.atomic(using="profile_writer"):
+				cursor.execute("INSERT INTO booking (session_id) VALUES (2)")
+			seen["commit_elapsed"] = time.monotonic() - started
+
+		long_read, errors = self.run_in_thread(long_reader, alias="profile_reader", wait=False)
+		self.assertTrue(snapshot_open.wait(5))
+		_, writer_errors = self.run_in_thread(writer, alias="profile_writer")
+		release.set()
+		long_read.join(10)
+		self.assertEqual(errors + writer_errors, [])
+		self.assertLess(seen["commit_elapsed"], 1)
+		self.assertEqual(seen["streamed"], 501)  # the stream kept its snapshot
+
+	def test_concurrent_writers_wait_instead_of_failing(self):
+		def book(cursor):
+			with transaction.atomic(using="profile_booker"):
+				self.count(cursor)  # read-then-write, like the capacity check in book()
+				time.sleep(0.05)
+				cursor.execute("INSERT INTO booking (session_id) VALUES (1)")
+
+		runs = [self.run_in_thread(book, alias="profile_booker", wait=False) for _ in range(8)]
+		for thread, _ in runs:
+			thread.join(10)
+		self.assertEqual([error for _, errors in runs for error in errors], [])
+		counted = {}
+		self.run_in_thread(lambda cursor: counted.update(total=self.count(cursor)))
+		self.assertEqual(counted["total"], 8)
+
+
+REPLICA_ALIAS = "replica_test"
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA_ALIAS])
+class ReplicaRoutingTests(TestCase):
+	"""Routing against a second, separately migrated SQLite database standing in for a replica."""
+
+	databases = {"default"}  # plus REPLICA_ALIAS, added in setUpClass once it is registered
+	client_class = APIClient
+
+	@classmethod
+	def setUpClass(cls):
+		cls.replica_dir = tempfile.TemporaryDirectory()
+		connections.settings[REPLICA_ALIAS] = {
+			**connections["default"].settings_dict,
+			"NAME": str(Path(cls.replica_dir.name) / "replica.sqlite3"),
+		}
+		call_command("migrate", database=REPLICA_ALIAS, verbosity=0)
+		cls.databases = {"default", REPLICA_ALIAS}
+		super().setUpClass()
+
+	@classmethod
+	def tearDownClass(cls):
+		super().tearDownClass()
+		connections[REPLICA_ALIAS].close()
+		del connections[REPLICA_ALIAS]
+		del connections.settings[REPLICA_ALIAS]
+		cls.replica_dir.cleanup()
+
+	def setUp(self):
+		cache.clear()
+		caches["shared"].clear()
+		self.member = User.objects.create_user(username="gina", password="pw12345")
+		trainer = User.objects.create_user(username="coach", password="pw12345", is_staff=True)
+		tomorrow = datetime.now().date() + timedelta(days=1)
+		self.session = Session.objects.create(trainer=trainer, activity_type="yoga", date=tomorrow, time="09:00")
+		# The "replica" lags: it only has an older, different session
+		stale_trainer = User.objects.using(REPLICA_ALIAS).create(username="coach")
+		Session.objects.using(REPLICA_ALIAS).create(trainer=stale_trainer, activity_type="pilates", date=tomorrow, time="18:00")
+
+	def activities(self, client):
+		res = client.get("/api/sessions/")
+		self.assertEqual(res.status_code, 200)
+		return [row["activity_type"] for row in res.data]
+
+	def test_reads_use_replica_until_member_writes(self):
+		self.client.force_authenticate(self.member)
+		self.assertEqual(self.activities(self.client), ["pilates"])
+
+		res = self.client.post(f"/api/sessions/{self.session.id}/book/")
+		self.assertEqual(res.status_code, 200)
+		self.assertIn(PIN_COOKIE, res.cookies)
+		self.assertEqual(SessionAttendee.objects.using("default").count(), 1)
+
+		# Pinned to the primary: the member sees their own booking
+		self.assertEqual(self.activities(self.client), ["yoga"])
+		self.client.cookies.clear()
+		self.assertEqual(self.activities(self.client), ["pilates"])
+
+	def test_jwt_user_is_pinned_across_clients(self):
+		token = str(AccessToken.for_user(self.member))
+		writer, reader = APIClient(), APIClient()
+		for client in (writer, reader):
+			client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+		self.assertEqual(self.activities(reader), ["pilates"])
+		self.assertEqual(writer.post(f"/api/sessions/{self.session.id}/book/").status_code, 200)
+		# No pin cookie on this client, but the user id is pinned in the cache every worker reads
+		self.assertEqual(self.activities(reader), ["yoga"])
+		self.assertIsNotNone(caches["shared"].get(PIN_CACHE_KEY.format(user_id=self.member.pk)))
+		self.assertIsNone(cache.get(PIN_CACHE_KEY.format(user_id=self.member.pk)))
+
+	def test_availability_index_loads_from_primary(self):
+		self.client.force_authenticate(self.member)
+		tomorrow = self.session.date.isoformat()
+		self.client.get("/api/sessions/availability/", {"start": tomorrow})  # Publishes the epoch (a write)
+		get_index().clear()
+		self.assertEqual(self.activities(self.client), ["pilates"])  # Plain reads still use the replica
+		res = self.client.get("/api/sessions/availability/", {"start": tomorrow})
+		self.assertEqual([row["activity_type"] for row in res.data["days"][tomorrow]], ["yoga"])
+
+	def test_queries_outside_requests_use_primary(self):
+		router = PrimaryReplicaRouter()
+		self.assertIsNone(router.db_for_read(Session))
+		self.assertEqual(router.db_for_write(Session), "default")
+		self.assertEqual(Session.objects.get().activity_type, "yoga")
+
+
+@skipUnless(connection.vendor == "postgresql", "Server-side cursors are PostgreSQL-specific")
+class ConnectionPoolResetTests(TestCase):
+	def test_reset_closes_cursors_left_open(self):
+		with connection.cursor() as cursor:
+			cursor.execute("DECLARE gymflex_abandoned CURSOR WITH HOLD FOR SELECT 1")
+			close_cursors(connection.connection)
+			cursor.execute("SELECT count(*) FROM pg_cursors")
+			self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class HealthPoolStatsTests(APITestCase):
+	def test_pool_stats_are_reported_when_pooled(self):
+		self.assertEqual(self.client.get("/api/health/").data["db_pool"], pool_stats(connection))
+		stats = {"pool_min": 0, "pool_max": 4, "pool_size": 2, "pool_available": 1, "requests_waiting": 0}
+		pool = mock.Mock(**{"get_stats.return_value": stats})
+		with mock.patch.object(type(connection), "pool", pool, create=True):
+			self.assertEqual(self.client.get("/api/health/").data["db_pool"], stats)
+
+
+class BenchmarkDbConnectionsCommandTests(TestCase):
+	def test_reports_each_mode(self):
+		out = StringIO()
+		call_command("benchmark_db_connections", threads=2, requests=5, modes=["persistent", "per_request"], json=True, stdout=out)
+		report = json.loads(out.getvalue())
+		self.assertEqual(set(report["modes"]), {"persistent", "per_request"})
+		self.assertEqual(report["modes"]["persistent"]["server_connections_opened"], 2)  # one per thread
+		for result in report["modes"].values():
+			self.assertEqual(result["errors"], 0)
+			self.assertGreater(result["requests_per_second"], 0)
+
+
+class StartupWarmupTests(SimpleTestCase):
+	def test_every_warmup_step_succeeds(self):
+		timings = warm_up()
+		self.assertEqual(list(timings), [name for name, _ in WARMUP_STEPS])
+		self.assertNotIn(None, timings.values())
+
+	def test_benchmark_startup_reports_cold_and_warm_runs(self):
+		out = StringIO()
+		call_command("benchmark_startup", runs=1, paths=["/api/sessions/"], json=True, stdout=out)
+		report = json.loads(out.getvalue())
+		self.assertEqual(set(report["modes"]), {"cold", "warm"})
+		self.assertIn("warmup_ms", report["modes"]["warm"])
+		self.assertEqual(report["modes"]["cold"]["requests"]["/api/sessions/"]["status"], 401)
@@ -0,0 +1,32 @@
+"""
+DRF throttles that read their rates from the current settings.
+
+DRF's SimpleRateThrottle copies REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] into
+a class attribute when it is imported, so changing the setting later (tests,
+or the stress_bookings harness turning throttling off for its in-process
+server) has no effect. These subclasses look the rates up on every request
+instead; a rate of None disables that throttle, as in DRF.
+"""
+
+from rest_framework import throttling
+from rest_framework.settings import api_settings
+
+
+class SettingsRatesMixin:
+    """Resolve THROTTLE_RATES from api_settings on each use."""
+
+    @property
+    def THROTTLE_RATES(self):
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+
+class AnonRateThrottle(SettingsRatesMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SettingsRatesMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(SettingsRatesMixin, throttling.ScopedRateThrottle):
+    pass
@@ -0,0 +1,382 @@
+"""
+Bulk timetable import for the admin (Sessions > Import timetable).
+
+Staff upload a CSV or iCalendar (.ics) file describing a term's sessions. The
+import runs in three steps:
+
+1. parse_csv() / parse_ics(): read the upload line by line (never the whole
+   file at once) into plain row dicts, collecting per-line errors for unknown
+   activity types, bad dates/times, durations and capacities.
+2. build_plan(): match the rows against existing sessions with one query over
+   the file's date range, keyed on (date, time, activity_type), and split them
+   into creates, updates and unchanged rows. Trainer overlaps are checked for
+   the whole batch with find_batch_conflicts() (a fixed number of
+   queries).
+3. apply_plan(): write the plan in one transaction with batched bulk_create /
+   bulk_update and adjust the utilisation summary counters. The updated
+   sessions are locked and the plan re-checked inside that transaction (their
+   capacity unchanged since the preview and not below their bookings, no new
+   trainer overlaps); if anything moved, PlanOutdated carries the errors and
+   nothing is written.
+
+The rows are JSON-serialisable so the admin can keep them in the session
+between the diff preview and the confirmation.
+
+CSV columns (header row required): activity_type, date (YYYY-MM-DD),
+time (HH:MM), and optionally duration_minutes, capacity and trainer (username).
+.ics files use one VEVENT per session: SUMMARY is the activity, DTSTART the
+start, DTEND or DURATION the length, and X-GYMFLEX-CAPACITY /
+X-GYMFLEX-TRAINER the optional capacity and trainer.
+"""
+
+import csv
+import io
+import re
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+
+from . import analytics, availability
+from .models import Session
+from .scheduling import describe_conflict, find_batch_conflicts
+
+BATCH_SIZE = 1000
+DEFAULT_DURATION = 60
+DEFAULT_CAPACITY = 10
+
+# Accept both the stored value ("weights") and the label ("Weightlifting")
+ACTIVITY_LOOKUP = {
+    **{value.lower(): value for value, _ in Session.ACTIVITY_CHOICES},
+    **{label.lower(): value for value, label in Session.ACTIVITY_CHOICES},
+}
+
+
+def _text_lines(upload):
+    """Iterate decoded lines of an uploaded file without reading it all into memory."""
+    upload.seek(0)
+    return io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+
+
+def make_row(line, activity, date_value, time_value, duration=None, capacity=None, trainer=None):
+    """
+    Validate one session's raw values.
+
+    Returns:
+        tuple: (row dict, None) if valid, otherwise (None, error message)
+    """
+    activity_type = ACTIVITY_LOOKUP.get((activity or "").strip().lower())
+    if activity_type is None:
+        return None, f"Unknown activity type '{activity}'."
+    try:
+        session_date = parse_date((date_value or "").strip())
+        session_time = parse_time((time_value or "").strip())
+    except ValueError:
+        session_date = session_time = None
+    if session_date is None:
+        return None, f"Invalid date '{date_value}' (expected YYYY-MM-DD)."
+    if session_time is None:
+        return None, f"Invalid time '{time_value}' (expected HH:MM)."
+    try:
+        duration = int(duration) if str(duration if duration is not None else "").strip() else DEFAULT_DURATION
+        capacity = int(capacity) if str(capacity if capacity is not None else "").strip() else DEFAULT_CAPACITY
+    except ValueError:
+        return None, "Duration and capacity must be whole numbers."
+    if not 1 <= duration <= Session.MAX_DURATION_MINUTES:
+        return None, f"Duration must be between 1 and {Session.MAX_DURATION_MINUTES} minutes."
+    if capacity < 1:
+        return None, "Capacity must be at least 1."
+    return {
+        "line": line,
+        "activity_type": activity_type,
+        "date": session_date.isoformat(),
+        "time": session_time.replace(microsecond=0).isoformat(),
+        "duration_minutes": duration,
+        "capacity": capacity,
+        "trainer": (trainer or "").strip() or None,
+    }, None
+
+
+# -------------------
+# Parsers
+# -------------------
+def parse_csv(upload):
+    """Parse a CSV upload into (rows, errors); errors are (line number, message) pairs."""
+    rows, errors = [], []
+    reader = csv.DictReader(_text_lines(upload))
+    missing = {"activity_type", "date", "time"} - set(reader.fieldnames or [])
+    if missing:
+        return [], [(1, f"Missing column(s): {', '.join(sorted(missing))}.")]
+    for record in reader:
+        row, error = make_row(
+            reader.line_num,
+            record.get("activity_type"),
+            record.get("date"),
+            record.get("time"),
+            record.get("duration_minutes"),
+            record.get("capacity"),
+            record.get("trainer"),
+        )
+        if error:
+            errors.append((reader.line_num, error))
+        else:
+            rows.append(row)
+    return rows, errors
+
+
+ICS_DURATION = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:\d+S)?)?$")
+
+
+def _ics_datetime(value):
+    """Parse an iCalendar DATE-TIME; UTC values (trailing Z) are converted to local time."""
+    value = value.strip()
+    try:
+        parsed = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    except ValueError:
+        return None
+    if value.endswith("Z"):
+        parsed = timezone.localtime(parsed.replace(tzinfo=dt_timezone.utc)).replace(tzinfo=None)
+    return parsed
+
+
+def _unfolded(lines):
+    """Yield (line number, logical line), joining RFC 5545 folded continuation lines."""
+    pending, pending_line = None, 0
+    for number, raw in enumerate(lines, start=1):
+        raw = raw.rstrip("\r\n")
+        if raw[:1] in (" ", "\t") and pending is not None:
+            pending += raw[1:]
+            continue
+        if pending is not None:
+            yield pending_line, pending
+        pending, pending_line = raw, number
+    if pending is not None:
+        yield pending_line, pending
+
+
+def parse_ics(upload):
+    """Parse an iCalendar upload into (rows, errors), one row per VEVENT."""
+    rows, errors = [], []
+    event = None
+    for number, line in _unfolded(_text_lines(upload)):
+        name, _, value = line.partition(":")
+        name = name.split(";", 1)[0].upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            event = {"line": number}
+        elif event is None:
+            continue
+        elif name == "END" and value.upper() == "VEVENT":
+            row, error = _ics_event_row(event)
+            if error:
+                errors.append((event["line"], error))
+            else:
+                rows.append(row)
+            event = None
+        else:
+            event[name] = value
+    return rows, errors
+
+
+def _ics_event_row(event):
+    if "RRULE" in event:
+        return None, "Recurring events are not supported; export the expanded occurrences."
+    start = _ics_datetime(event.get("DTSTART", ""))
+    if start is None:
+        return None, f"Invalid DTSTART '{event.get('DTSTART', '')}' (expected a date-time)."
+    duration = None
+    if "DTEND" in event:
+        end = _ics_datetime(event["DTEND"])
+        if end is None:
+            return None, f"Invalid DTEND '{event['DTEND']}'."
+        duration = int((end - start).total_seconds() // 60)
+    elif "DURATION" in event:
+        match = ICS_DURATION.match(event["DURATION"].strip())
+        if not match:
+            return None, f"Invalid DURATION '{event['DURATION']}'."
+        days, hours, minutes = (int(part or 0) for part in match.groups())
+        duration = days * 1440 + hours * 60 + minutes
+    return make_row(
+        event["line"],
+        event.get("SUMMARY", "").replace("\\,", ",").strip(),
+        start.date().isoformat(),
+        start.time().isoformat(),
+        duration,
+        event.get("X-GYMFLEX-CAPACITY"),
+        event.get("X-GYMFLEX-TRAINER"),
+    )
+
+
+def parse_upload(upload):
+    """Dispatch on file extension: .ics is iCalendar, anything else is treated as CSV."""
+    if upload.name.lower().endswith((".ics", ".ical", ".ifb")):
+        return parse_ics(upload)
+    return parse_csv(upload)
+
+
+# -------------------
+# Plan and apply
+# -------------------
+class PlanOutdated(Exception):
+    """The database changed since the plan was built; `errors` are (line number, message) pairs."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} rows no longer apply")
+        self.errors = errors
+
+
+def _capacity_error(capacity, booked_count):
+    """Error message if `capacity` cannot hold the members already booked, else None."""
+    if capacity < booked_count:
+        return f"Capacity {capacity} is below the {booked_count} members already booked."
+    return None
+
+
+def _session_from_row(row, trainer_id, pk=None):
+    session = Session(
+        pk=pk,
+        activity_type=row["activity_type"],
+        trainer_id=trainer_id,
+        date=row["date"],
+        time=row["time"],
+        duration_minutes=row["duration_minutes"],
+        capacity=row["capacity"],
+    )
+    session.set_bounds()
+    return session
+
+
+def build_plan(rows, default_trainer_id):
+    """
+    Diff parsed rows against the database.
+
+    Args:
+        rows: row dicts from parse_upload()
+        default_trainer_id: trainer for rows without a trainer column (new sessions only)
+
+    Returns:
+        dict with "create" and "update" row lists, an "unchanged" count and
+        "errors" as (line number, message) pairs. Update rows carry the
+        existing session "id" and a "changes" list of field names.
+    """
+    plan = {"create": [], "update": [], "unchanged": 0, "errors": []}
+    if not rows:
+        return plan
+
+    usernames = {row["trainer"] for row in rows if row["trainer"]}
+    trainers = dict(User.objects.filter(username__in=usernames, is_staff=True).values_list("username", "pk"))
+    dates = [row["date"] for row in rows]
+    existing = {}
+    for session in (
+        Session.objects.filter(date__range=(min(dates), max(dates)))
+        .order_by("pk")
+        .only("id", "activity_type", "trainer_id", "date", "time", "duration_minutes", "capacity", "booked_count")
+    ):
+        existing.setdefault((session.date.isoformat(), session.time.isoformat(), session.activity_type), session)
+
+    seen = {}
+    candidates = {}
+    for row in rows:
+        key = (row["date"], row["time"], row["activity_type"])
+        if key in seen:
+            plan["errors"].append((row["line"], f"Duplicate of line {seen[key]}."))
+            continue
+        seen[key] = row["line"]
+        if row["trainer"] and row["trainer"] not in trainers:
+            plan["errors"].append((row["line"], f"Unknown trainer '{row['trainer']}' (must be a staff username)."))
+            continue
+
+        current = existing.get(key)
+        if current is None:
+            trainer_id = trainers.get(row["trainer"], default_trainer_id)
+            if trainer_id is None:
+                plan["errors"].append((row["line"], "No trainer given and no staff user to assign."))
+                continue
+            plan["create"].append({**row, "trainer_id": trainer_id})
+            candidates[row["line"]] = _session_from_row(row, trainer_id)
+            continue
+
+        trainer_id = trainers.get(row["trainer"], current.trainer_id)
+        changes = [
+            field
+            for field, new, old in (
+                ("duration_minutes", row["duration_minutes"], current.duration_minutes),
+                ("capacity", row["capacity"], current.capacity),
+                ("trainer", trainer_id, current.trainer_id),
+            )
+            if new != old
+        ]
+        if not changes:
+            plan["unchanged"] += 1
+            continue
+        error = _capacity_error(row["capacity"], current.booked_count)
+        if error:
+            plan["errors"].append((row["line"], error))
+            continue
+        plan["update"].append({
+            **row, "id": current.pk, "trainer_id": trainer_id, "changes": changes,
+            "old_capacity": current.capacity,
+        })
+        candidates[row["line"]] = _session_from_row(row, trainer_id, pk=current.pk)
+
+    lines = {id(session): line for line, session in candidates.items()}
+    for session, conflict in find_batch_conflicts(candidates.values()):
+        plan["errors"].append((lines[id(session)], describe_conflict(conflict)))
+    plan["errors"].sort()
+    return plan
+
+
+def apply_plan(plan):
+    """
+    Write a conflict-free plan in one transaction.
+
+    Returns:
+        tuple: (sessions created, sessions updated)
+
+    Raises:
+        PlanOutdated: an updated session was deleted or its capacity changed
+            since the preview, a new capacity is below its bookings, or a row
+            now overlaps another session of its trainer
+    """
+    creates = [_session_from_row(row, row["trainer_id"]) for row in plan["create"]]
+    updates = [_session_from_row(row, row["trainer_id"], pk=row["id"]) for row in plan["update"]]
+    deltas = {}
+    for session in creates:
+        deltas.setdefault(analytics.session_key(session), Counter()).update(sessions=1, capacity=session.capacity)
+    for session, row in zip(updates, plan["update"]):
+        # (date, time, activity) is the match key, so an update never changes bucket
+        deltas.setdefault(analytics.session_key(session), Counter()).update(capacity=session.capacity - row["old_capacity"])
+
+    with transaction.atomic():
+        # Lock the updated sessions so bookings cannot move booked_count until commit
+        current = {
+            session.pk: session
+            for session in Session.objects.select_for_update()
+            .filter(pk__in=[row["id"] for row in plan["update"]])
+            .only("id", "capacity", "booked_count")
+        }
+        errors = []
+        for row in plan["update"]:
+            session = current.get(row["id"])
+            if session is None:
+                errors.append((row["line"], "The session was deleted after the preview."))
+            elif session.capacity != row["old_capacity"]:
+                errors.append((row["line"], f"The session's capacity changed to {session.capacity} after the preview."))
+            elif _capacity_error(row["capacity"], session.booked_count):
+                errors.append((row["line"], _capacity_error(row["capacity"], session.booked_count)))
+        lines = {id(session): row["line"] for session, row in zip(creates + updates, plan["create"] + plan["update"])}
+        for session, conflict in find_batch_conflicts(creates + updates):
+            errors.append((lines[id(session)], describe_conflict(conflict)))
+        if errors:
+            raise PlanOutdated(sorted(errors))
+
+        Session.objects.bulk_create(creates, batch_size=BATCH_SIZE)
+        Session.objects.bulk_update(
+            updates, ["duration_minutes", "capacity", "trainer", "start_at", "end_at"], batch_size=BATCH_SIZE
+        )
+        analytics.apply_deltas(deltas)
+        # bulk_create/bulk_update send no signals
+        availability.invalidate_all()
+    return len(creates), len(updates)
@@ -13,6 +13,8 @@ URL Structure:
 - /api/sessions/{id}/ → Session detail/update/delete
 - /api/sessions/{id}/book/ → Custom booking action
 - /api/sessions/{id}/remove_attendee/ → Custom admin action
+- /api/attendance/export/ → Streaming attendance export (staff only)
+- /api/analytics/utilization/ → Utilisation analytics (staff only)
 
 Router Usage:
 Django REST Framework's DefaultRouter automatically generates URL patterns for
@@ -59,6 +61,14 @@ urlpatterns = [
     # DELETE /api/notes/{id}/ → Delete specific note (if owned by user)
     path('notes/<int:pk>/', views.NoteDelete.as_view(), name='delete-note'),
 
+    # Streaming attendance export (staff only)
+    # GET /api/attendance/export/?format=csv|ndjson&start=YYYY-MM-DD&end=YYYY-MM-DD&activity=yoga
+    path('attendance/export/', views.AttendanceExportView.as_view(), name='attendance-export'),
+
+    # Utilisation analytics from the pre-aggregated summary table (staff only)
+    # GET /api/analytics/utilization/?activity=yoga
+    path('analytics/utilization/', views.UtilizationAnalyticsView.as_view(), name='utilization-analytics'),
+
     # Health check (public) - basic diagnostics: DB engine, counts
     path('health/', views.health, name='health'),
 
@@ -13,16 +13,32 @@ Endpoints defined in this module:
 - User registration
 - Session CRUD with custom booking actions
 - Current user info endpoint
+- Streaming attendance export (CSV / NDJSON)
+- Utilisation analytics
 """
 
+import csv
+import heapq
+import json
+from datetime import date, timedelta
+
 from django.contrib.auth.models import User
-from rest_framework import generics, viewsets, permissions
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+from rest_framework import generics, viewsets, permissions, serializers
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.throttling import ScopedRateThrottle
-from .models import Note, Session, SessionAttendee
-from .serializers import UserSerializer, NoteSerializer, SessionSerializer
+from .models import Note, Session, SessionAttendee, ArchivedSessionAttendee, BookingEvent
+from .serializers import UserSerializer, NoteSerializer, SessionSerializer, ArchivedSessionSerializer
+from .renderers import CSVRenderer, NDJSONRenderer
+from .throttling import ScopedRateThrottle
+from . import analytics, archive, availability, booking, ledger, recurrence
+from .idempotency import idempotent
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 # -----------------------------
@@ -175,8 +191,14 @@ class SessionViewSet(viewsets.ModelViewSet):
     - DELETE /api/sessions/{id}/ → Delete session (staff only)
     
     Custom actions (defined with @action decorator):
-    - POST /api/sessions/{id}/book/ → Book or cancel booking
+    - POST /api/sessions/{id}/book/ → Book (idempotent, never cancels)
+    - POST /api/sessions/{id}/cancel/ → Cancel booking (idempotent)
+    - POST /api/sessions/batch/ → Book/cancel several sessions in one transaction
     - POST /api/sessions/{id}/remove_attendee/ → Remove user from session (staff only)
+    - GET /api/sessions/calendar/?month=YYYY-MM → Per-day aggregates for the month view
+    - GET /api/sessions/next_available/ → Next sessions with a free spot (activity/time/trainer filters)
+    - GET /api/sessions/availability/ → Free spots per session for a date range (in-memory index)
+    - GET /api/sessions/history/ → Archived sessions (see api.archive)
     
     Permissions:
     - List/retrieve: Any authenticated user
@@ -188,11 +210,90 @@ class SessionViewSet(viewsets.ModelViewSet):
     - Staff see all attendee details
     - Booked users see full session info
     - Unbooked users see limited details (encourages booking)
+    
+    Recurring sessions:
+    The list, calendar and next_available also contain virtual occurrences of
+    SessionTemplates (id "t{template}-{YYYYMMDD}", see api.recurrence). They
+    can be retrieved, booked, cancelled, edited and deleted like other
+    sessions; booking or editing one creates its Session row.
     """
     queryset = Session.objects.all().order_by("date", "time")
     serializer_class = SessionSerializer
     permission_classes = [IsAuthenticated, IsTrainerOrReadOnly]
 
+    def get_queryset(self):
+        """
+        Sessions with the annotations and joins the requested fields need.
+        
+        For reads, only what the response will contain is fetched (see
+        SessionSerializer sparse fieldsets), all in a fixed number of queries
+        however many sessions are listed:
+        - attendees_count / available_slots: the booked_count column (no extra work)
+        - booked (and the trainer/attendee masking for members): is_booked subquery
+        - trainer_username: joined trainer
+        - attendees (staff): prefetched attendance rows with users
+        
+        Writes and booking actions use the plain queryset.
+        """
+        queryset = super().get_queryset()
+        if self.request.method not in permissions.SAFE_METHODS or self.action not in ("list", "retrieve", "next_available"):
+            return queryset
+
+        fields = SessionSerializer.output_fields(self.request)
+        user = self.request.user
+        if "booked" in fields or (not user.is_staff and fields & {"trainer_username", "attendees"}):
+            queryset = queryset.with_booked_by(user)
+        if "trainer_username" in fields:
+            queryset = queryset.select_related("trainer")
+        if "attendees" in fields and user.is_staff:
+            queryset = queryset.prefetch_related(
+                Prefetch("sessionattendee_set", queryset=SessionAttendee.objects.select_related("user").order_by("pk"))
+            )
+        return queryset
+
+    # Detail actions on a virtual occurrence: these create its row first,
+    # these work on the unsaved occurrence, and every other one is a 404
+    MATERIALIZING_ACTIONS = ("book", "update", "partial_update")
+    VIRTUAL_ACTIONS = ("retrieve", "cancel", "destroy")
+
+    def get_object(self):
+        """
+        The session for a detail route; also accepts virtual occurrence ids.
+        
+        For "t{template}-{YYYYMMDD}" the materialised session is returned if
+        it exists; otherwise book/update create it and retrieve/cancel/destroy
+        get the unsaved occurrence. An occurrence that overlaps another class
+        of its trainer cannot be created (400), nor one that has already
+        started or lies beyond the listing window (404; see
+        recurrence.materialize).
+        """
+        occurrence = recurrence.parse_virtual_id(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, ""))
+        if occurrence is None:
+            return super().get_object()
+        if self.action in self.MATERIALIZING_ACTIONS:
+            try:
+                session = recurrence.materialize(*occurrence)
+            except recurrence.OccurrenceConflict as exc:
+                raise ValidationError({"status": "conflict", "message": str(exc)})
+        elif self.action in self.VIRTUAL_ACTIONS:
+            session = recurrence.get_occurrence(*occurrence)
+        else:
+            session = None
+        if session is None:
+            raise Http404("No such session.")
+        self.check_object_permissions(self.request, session)
+        return session
+
+    def list(self, request, *args, **kwargs):
+        """
+        All sessions in date/time order, merged with the virtual occurrences
+        of recurring templates from today to recurrence.HORIZON_DAYS ahead.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        virtual = recurrence.occurrences(*recurrence.window())
+        sessions = heapq.merge(queryset, virtual, key=lambda session: (session.date, session.time))
+        return Response(self.get_serializer(list(sessions), many=True).data)
+
     def get_serializer_context(self):
         """
         Pass request context to serializer for role-based masking.
@@ -209,25 +310,54 @@ class SessionViewSet(viewsets.ModelViewSet):
         context.update({"request": self.request})
         return context
 
+    # Keep the utilisation summary (api.analytics) in step with timetable edits
+    def perform_create(self, serializer):
+        session = serializer.save()
+        analytics.track_session_saved(session)
+
+    def perform_update(self, serializer):
+        previous = (analytics.session_key(serializer.instance), serializer.instance.capacity)
+        session = serializer.save()
+        analytics.track_session_saved(session, previous)
+
+    def perform_destroy(self, instance):
+        recurrence.skip_deleted([instance])
+        if instance.pk is None:
+            return  # A virtual occurrence: skipping its date is all there is to delete
+        analytics.track_sessions_deleted([instance])
+        instance.delete()
+
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
+    @idempotent
     def book(self, request, pk=None):
         """
-        Toggle booking status for the requesting user (POST /api/sessions/{id}/book/).
+        Book the requesting user onto a session (POST /api/sessions/{id}/book/).
         
         Behaviour:
-        - If user is already booked: Remove them (cancel booking)
         - If user is not booked and space available: Add them (confirm booking)
+        - If user is already booked: Nothing changes, the booking is confirmed again
+          (so a retried request can never cancel it - use the cancel action for that)
         - If session is full: Return error
+        - If the user has another booking overlapping this session: Return error
         - If session date is in the past: Return error
         
+        Runs in a transaction holding a row lock on the session, so the capacity
+        and overlap checks cannot interleave with another booking of the same class.
+        
+        Idempotency:
+        Send an Idempotency-Key header (any unique string per booking attempt) to
+        make retries safe; a retry with the same key returns the stored response
+        without touching the session (see api.idempotency).
+        
         Example request:
         POST /api/sessions/5/book/
         Authorization: Bearer <access_token>
+        Idempotency-Key: 6f1c7e0e-8a43-4f7e-b0a5-3c2d9d1e4b11
         
         Responses:
-        - {"status": "booked"} - User successfully booked
-        - {"status": "unbooked"} - Booking cancelled
-        - {"status": "full"} - Session at capacity (400 error)
+        - {"status": "Booked", "session": 5, "booked": true, "available_slots": 3} - User booked
+        - {"status": "Full"} - Session at capacity (400 error)
+        - {"status": "conflict", "conflicting_session": 7} - Overlapping booking (400 error)
         - {"status": "past"} - Session date has already occurred (400 error)
         
         Security:
@@ -241,44 +371,417 @@ class SessionViewSet(viewsets.ModelViewSet):
         Returns:
             Response: JSON with status message and HTTP status code
         """
-        from datetime import datetime, timedelta
-        
         session = self.get_object()  # Retrieves Session with pk={pk}
-        user = request.user
 
-        # Prevent booking sessions that have already started (check date AND time)
-        session_datetime = datetime.combine(session.date, session.time)
-        if session_datetime < datetime.now():
-            return Response(
-                {"status": "past", "message": "Cannot book sessions that have already started"}, 
-                status=400
-            )
+        with transaction.atomic():
+            # Lock the session row so concurrent bookings are checked one at a time
+            session = Session.objects.select_for_update().get(pk=session.pk)
+            payload, status = booking.book(request.user, session)
+        return Response(payload, status=status)
 
-        # Check if user is already booked - toggle behaviour
-        if user in session.attendees.all():
-            # Prevent cancelling booking after the session has started
-            if session_datetime < datetime.now():
+    @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
+    @idempotent
+    def cancel(self, request, pk=None):
+        """
+        Cancel the requesting user's booking (POST /api/sessions/{id}/cancel/).
+        
+        Behaviour:
+        - If user is booked: Remove them (cancel booking)
+        - If user is not booked: Nothing changes, the cancellation is confirmed again
+        - If the session has started: Return error
+        - Within 30 minutes of the start (non-staff): Return error
+        
+        Accepts an Idempotency-Key header like the book action.
+        
+        Responses:
+        - {"status": "Unbooked", "session": 5, "booked": false, "available_slots": 4} - Booking cancelled
+        - {"status": "Past"} - Session has already started (400 error)
+        - {"status": "too_late"} - Within 30 minutes of the start (400 error)
+        
+        Args:
+            request: Django Request object with authenticated user
+            pk: Primary key of the session (from URL parameter)
+            
+        Returns:
+            Response: JSON with status message and HTTP status code
+        """
+        session = self.get_object()
+        if session.pk is None:
+            # Nobody has booked a virtual occurrence
+            return Response(booking.booking_payload("Unbooked", session, False))
+
+        with transaction.atomic():
+            session = Session.objects.select_for_update().get(pk=session.pk)
+            payload, status = booking.cancel(request.user, session)
+        return Response(payload, status=status)
+
+    # Operations accepted by the batch action
+    BATCH_ACTIONS = {"book": booking.book, "cancel": booking.cancel}
+    BATCH_MAX_OPERATIONS = 50
+
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    @idempotent
+    def batch(self, request):
+        """
+        Book and cancel several sessions in one request (POST /api/sessions/batch/).
+        
+        For members planning a week of classes: one request instead of one
+        book/cancel call (each paying for authentication, throttling and
+        get_object) per class.
+        
+        Behaviour:
+        - Operations run in one transaction, in the order given, with the same
+          rules and responses as the book and cancel actions
+        - Every session involved is locked up front in primary-key order, and
+          the utilisation summary is updated once at the end in bucket order
+          (analytics.deferred_deltas), so concurrent batches touching the same
+          classes cannot deadlock
+        - Each operation succeeds or fails on its own; the response lists a
+          result per operation (failed ones change nothing)
+        - At most BATCH_MAX_OPERATIONS operations per request
+        
+        Accepts an Idempotency-Key header like the book action.
+        
+        Example request:
+        POST /api/sessions/batch/
+        Authorization: Bearer <access_token>
+        {
+            "operations": [
+                {"session": 5, "action": "book"},
+                {"session": 9, "action": "book"},
+                {"session": 3, "action": "cancel"}
+            ]
+        }
+        
+        Responses:
+        - {"results": [{"session": 5, "action": "book", "http_status": 200, "status": "Booked", ...}, ...]}
+        - {"detail": "..."} - Malformed request body (400 error)
+        
+        Per-operation statuses are those of book/cancel, plus "not_found" (404)
+        for an unknown session id. Virtual occurrence ids ("t3-20250106") are
+        accepted; booking one creates its session first.
+        
+        Args:
+            request: Django Request object with authenticated user and JSON body
+            
+        Returns:
+            Response: JSON with a result per operation
+        """
+        operations = request.data.get("operations") if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response({"detail": "operations must be a non-empty list"}, status=400)
+        if len(operations) > self.BATCH_MAX_OPERATIONS:
+            return Response({"detail": f"At most {self.BATCH_MAX_OPERATIONS} operations per request"}, status=400)
+
+        parsed = []
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict) or operation.get("action") not in self.BATCH_ACTIONS:
                 return Response(
-                    {"status": "Past", "message": "Cannot cancel after session start"},
+                    {"detail": f"operations[{index}]: action must be one of {', '.join(self.BATCH_ACTIONS)}"},
                     status=400
                 )
-            # Prevent cancelling booking within 30 minutes of session start (for non-staff)
-            if not user.is_staff:
-                now = datetime.now()
-                if session_datetime - now <= timedelta(minutes=30):
-                    return Response(
-                        {"status": "too_late", "message": "Cannot cancel booking within 30 minutes of session start."},
-                        status=400
-                    )
-            session.attendees.remove(user)
-            return Response({"status": "Unbooked"})
+            session_id = operation.get("session")
+            occurrence = recurrence.parse_virtual_id(session_id) if isinstance(session_id, str) else None
+            if occurrence is None:
+                try:
+                    session_id = int(session_id)
+                except (TypeError, ValueError):
+                    return Response({"detail": f"operations[{index}]: session must be a session id"}, status=400)
+            parsed.append((session_id, occurrence, operation["action"]))
+
+        results = []
+        with transaction.atomic(), analytics.deferred_deltas():
+            # Resolve virtual occurrences first; only those being booked get a row
+            booking_ids = {session_id for session_id, occurrence, action_name in parsed if occurrence and action_name == "book"}
+            virtual, conflicts = {}, {}
+            for session_id, occurrence, _ in parsed:
+                if occurrence is None or session_id in virtual or session_id in conflicts:
+                    continue
+                try:
+                    virtual[session_id] = (
+                        recurrence.materialize if session_id in booking_ids else recurrence.get_occurrence
+                    )(*occurrence)
+                except recurrence.OccurrenceConflict as exc:
+                    conflicts[session_id] = exc
+            real_ids = set()
+            for session_id, occurrence, _ in parsed:
+                if occurrence is None:
+                    real_ids.add(session_id)
+                elif virtual.get(session_id) is not None and virtual[session_id].pk is not None:
+                    real_ids.add(virtual[session_id].pk)
+            sessions = booking.lock_sessions(real_ids)
+            for session_id, occurrence, action_name in parsed:
+                session = virtual.get(session_id) if occurrence else sessions.get(session_id)
+                if session is not None and session.pk is not None:
+                    session = sessions[session.pk]
+                if session_id in conflicts:
+                    exc = conflicts[session_id]
+                    payload, status = {
+                        "status": "conflict", "message": str(exc), "conflicting_session": exc.conflict.public_id,
+                    }, 400
+                elif session is None:
+                    payload, status = {"status": "not_found"}, 404
+                elif session.pk is None:
+                    payload, status = booking.booking_payload("Unbooked", session, False), 200
+                else:
+                    payload, status = self.BATCH_ACTIONS[action_name](request.user, session)
+                results.append({"session": session_id, "action": action_name, "http_status": status, **payload})
+        return Response({"results": results})
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def calendar(self, request):
+        """
+        Per-day aggregates for a month calendar (GET /api/sessions/calendar/?month=YYYY-MM).
+        
+        The month view only needs markers and counts, so instead of every
+        session object this returns one small entry per day that has classes,
+        computed by a single GROUP BY query:
+        - classes: number of sessions that day
+        - with_space: sessions with at least one free spot
+        - booked: sessions the requesting user has booked
+        - with_bookings: sessions with at least one booking (staff only)
+        - activities: number of sessions per activity type
+        
+        Virtual occurrences of recurring templates (see api.recurrence) count
+        as classes with space.
+        
+        Query parameters:
+        - month: YYYY-MM (defaults to the current month)
+        - activity: optional activity type to count only that activity
+        
+        Example response:
+        {
+            "month": "2025-01",
+            "days": [
+                {"date": "2025-01-06", "classes": 3, "with_space": 2, "booked": 1,
+                 "activities": {"yoga": 2, "hiit": 1}}
+            ]
+        }
+        
+        Returns:
+            Response: JSON with the month and its per-day aggregates
+        """
+        month = request.query_params.get("month")
+        if month:
+            try:
+                first = parse_date(f"{month}-01") if len(month) == 7 else None
+            except ValueError:
+                first = None
+            if first is None:
+                return Response({"detail": "month must be YYYY-MM"}, status=400)
         else:
-            # Check capacity before adding
-            if session.attendees.count() < session.capacity:
-                session.attendees.add(user)
-                return Response({"status": "Booked"})
-            else:
-                return Response({"status": "Full"}, status=400)
+            first = date.today().replace(day=1)
+        following = (first + timedelta(days=32)).replace(day=1)
+
+        sessions = Session.objects.filter(date__gte=first, date__lt=following)
+        activity = request.query_params.get("activity")
+        if activity:
+            if activity not in dict(Session.ACTIVITY_CHOICES):
+                return Response({"detail": f"Unknown activity {activity!r}"}, status=400)
+            sessions = sessions.filter(activity_type=activity)
+
+        aggregates = {
+            "classes": Count("id"),
+            "with_space": Count("id", filter=Q(booked_count__lt=F("capacity"))),
+            "booked": Count("id", filter=Q(is_booked=True)),
+        }
+        if request.user.is_staff:
+            aggregates["with_bookings"] = Count("id", filter=Q(booked_count__gt=0))
+        for key, _ in Session.ACTIVITY_CHOICES:
+            aggregates[f"activity_{key}"] = Count("id", filter=Q(activity_type=key))
+        rows = (
+            sessions.with_booked_by(request.user)
+            .order_by()
+            .values("date")
+            .annotate(**aggregates)
+            .order_by("date")
+        )
+
+        days = {}
+        for row in rows:
+            day = {name: row[name] for name in aggregates if not name.startswith("activity_")}
+            day["date"] = row["date"].isoformat()
+            day["activities"] = {
+                key: row[f"activity_{key}"] for key, _ in Session.ACTIVITY_CHOICES if row[f"activity_{key}"]
+            }
+            days[row["date"]] = day
+
+        horizon_start, horizon_end = recurrence.window()
+        for session in recurrence.occurrences(max(first, horizon_start), min(following - timedelta(days=1), horizon_end)):
+            if activity and session.activity_type != activity:
+                continue
+            day = days.setdefault(session.date, {
+                **{name: 0 for name in aggregates if not name.startswith("activity_")},
+                "date": session.date.isoformat(),
+                "activities": {},
+            })
+            day["classes"] += 1
+            day["with_space"] += session.capacity > 0
+            day["activities"][session.activity_type] = day["activities"].get(session.activity_type, 0) + 1
+        return Response({"month": first.strftime("%Y-%m"), "days": [days[key] for key in sorted(days)]})
+
+    NEXT_AVAILABLE_DEFAULT_LIMIT = 5
+    NEXT_AVAILABLE_MAX_LIMIT = 50
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def next_available(self, request):
+        """
+        Upcoming sessions with a free spot (GET /api/sessions/next_available/).
+        
+        Answers questions like "the next yoga with a free spot after 6pm"
+        without downloading the timetable: the earliest upcoming sessions with
+        booked_count < capacity that match the filters, in start order. The
+        search runs over this worker's in-memory availability index
+        (api.availability) for the next few weeks, then fetches only the
+        matching sessions; if that window has too few matches, or some of them
+        filled up since this worker's index last saw them, it falls back to
+        SQL, where the partial indexes session_open_start_idx /
+        session_open_activity_idx only contain sessions with space. Virtual
+        occurrences of recurring templates (always open) are merged in.
+        
+        Query parameters (all optional):
+        - activity: activity type (e.g. yoga)
+        - after / before: time-of-day window, HH:MM (after inclusive, before exclusive)
+        - trainer: trainer username
+        - limit: number of sessions (default 5, max 50)
+        
+        Example request:
+        GET /api/sessions/next_available/?activity=yoga&after=18:00&limit=3
+        
+        Responses:
+        - [ {session}, ... ] - Same representation as the session list (supports ?fields=)
+        - {"detail": "..."} - Invalid parameter (400 error)
+        """
+        params = request.query_params
+        sessions = self.get_queryset().with_space().filter(start_at__gte=timezone.now())
+        filters = {}
+
+        activity = params.get("activity")
+        if activity:
+            if activity not in dict(Session.ACTIVITY_CHOICES):
+                return Response({"detail": f"Unknown activity {activity!r}"}, status=400)
+            sessions = sessions.filter(activity_type=activity)
+            filters["activity"] = activity
+        for param, lookup in (("after", "time__gte"), ("before", "time__lt")):
+            if params.get(param):
+                try:
+                    value = parse_time(params[param])
+                except ValueError:
+                    value = None
+                if value is None:
+                    return Response({"detail": f"{param} must be HH:MM"}, status=400)
+                sessions = sessions.filter(**{lookup: value})
+                filters[param] = value
+        if params.get("trainer"):
+            trainer_ids = set(User.objects.filter(username__iexact=params["trainer"]).values_list("pk", flat=True))
+            if not trainer_ids:
+                return Response([])
+            sessions = sessions.filter(trainer_id__in=trainer_ids)
+            filters["trainer_ids"] = trainer_ids
+        try:
+            limit = int(params.get("limit", self.NEXT_AVAILABLE_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"detail": "limit must be a number"}, status=400)
+        limit = min(max(limit, 1), self.NEXT_AVAILABLE_MAX_LIMIT)
+
+        found = availability.get_index().next_available(limit, **filters)
+        rows = None
+        if found is not None:
+            # Recheck space: the index may trail a booking made by another worker
+            rows = list(sessions.filter(pk__in=found).order_by("start_at")[:limit])
+        if rows is None or len(rows) < limit:
+            # Stale or short index answer: the partial indexes have the rest
+            rows = sessions.order_by("start_at")[:limit]
+        sessions = rows
+
+        now = timezone.now()
+        virtual = [
+            session for session in recurrence.occurrences(*recurrence.window())
+            if session.start_at >= now and session.capacity > 0
+            and session.activity_type == filters.get("activity", session.activity_type)
+            and ("after" not in filters or session.time >= filters["after"])
+            and ("before" not in filters or session.time < filters["before"])
+            and session.trainer_id in filters.get("trainer_ids", {session.trainer_id})
+        ]
+        sessions = list(heapq.merge(sessions, virtual, key=lambda session: session.start_at))[:limit]
+        return Response(self.get_serializer(sessions, many=True).data)
+
+    AVAILABILITY_MAX_DAYS = 31
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def availability(self, request):
+        """
+        Free spots per session for a date range (GET /api/sessions/availability/).
+        
+        Served from this worker's in-memory availability index
+        (api.availability): no database query once the dates are loaded.
+        Virtual occurrences of recurring templates are included.
+        Counts may trail a booking made through another worker by up to
+        AVAILABILITY_CHECK_INTERVAL seconds; booking itself always rechecks
+        capacity under a row lock.
+        
+        Query parameters:
+        - start: first date, YYYY-MM-DD (default: today)
+        - end: last date, YYYY-MM-DD (default: start; at most 31 days after start)
+        - activity: only this activity type (optional)
+        
+        Example response:
+        {
+            "start": "2025-01-06", "end": "2025-01-07",
+            "days": {"2025-01-06": [{"id": 12, "time": "18:00", "activity_type": "yoga", "available_slots": 3}],
+                     "2025-01-07": []}
+        }
+        
+        Responses:
+        - 200 as above, sessions in start order
+        - {"detail": "..."} - Invalid parameter (400 error)
+        """
+        params = request.query_params
+        try:
+            start = parse_date(params["start"]) if params.get("start") else timezone.localdate()
+            end = parse_date(params["end"]) if params.get("end") else start
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            return Response({"detail": "start and end must be YYYY-MM-DD"}, status=400)
+        if not start <= end < start + timedelta(days=self.AVAILABILITY_MAX_DAYS):
+            return Response({"detail": f"end must be within {self.AVAILABILITY_MAX_DAYS} days after start"}, status=400)
+        activity = params.get("activity")
+        if activity and activity not in dict(Session.ACTIVITY_CHOICES):
+            return Response({"detail": f"Unknown activity {activity!r}"}, status=400)
+
+        index = availability.get_index()
+        days = {}
+        day = start
+        while day <= end:
+            days[day.isoformat()] = [
+                {"id": pk, "time": f"{minute // 60:02d}:{minute % 60:02d}", "activity_type": kind, "available_slots": max(free, 0)}
+                for pk, minute, kind, _, free in index.day_rows(day)
+                if not activity or kind == activity
+            ]
+            day += timedelta(days=1)
+        return Response({"start": start.isoformat(), "end": end.isoformat(), "days": days})
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def history(self, request):
+        """
+        Archived (cold) sessions (GET /api/sessions/history/?start=YYYY-MM-DD&end=YYYY-MM-DD).
+        
+        Sessions older than the retention window are moved out of the main
+        table by `manage.py archive_sessions`; this endpoint keeps them readable.
+        Staff see every archived session with its attendance; members only see
+        sessions they booked, with their own attended flag.
+        """
+        start = parse_date(request.query_params.get("start", ""))
+        end = parse_date(request.query_params.get("end", ""))
+        sessions = archive.history_sessions(request.user, start, end)
+        if request.user.is_staff:
+            sessions = sessions.prefetch_related("attendance__user")
+        else:
+            sessions = sessions.prefetch_related(
+                Prefetch("attendance", queryset=ArchivedSessionAttendee.objects.filter(user=request.user))
+            )
+        return Response(ArchivedSessionSerializer(sessions, many=True, context={"request": request}).data)
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated, IsTrainerOrReadOnly])
     def remove_attendee(self, request, pk=None):
@@ -335,8 +838,12 @@ class SessionViewSet(viewsets.ModelViewSet):
             return Response({"detail": "User not found"}, status=404)
 
         # Remove user if they're booked, otherwise return error
-        if user in session.attendees.all():
-            session.attendees.remove(user)
+        attendance = SessionAttendee.objects.filter(session=session, user=user).first()
+        if attendance:
+            attendance.delete()
+            session.change_booked_count(-1)
+            analytics.track_booking(session, -1, no_show=not attendance.attended)
+            ledger.record(BookingEvent.REMOVED, session.pk, user.pk, attendance.attended, actor=request.user)
             return Response({"status": "removed"})
         else:
             return Response({"status": "not_booked"}, status=400)
@@ -366,6 +873,7 @@ class SessionViewSet(viewsets.ModelViewSet):
         - {"status": "future_session"} - Cannot mark attendance for future sessions (400)
         - {"detail": "Not authorized"} - Non-staff user attempted action (403)
         - {"detail": "attendance_id and attended are required"} - Missing parameters (400)
+        - {"detail": "attended must be true or false"} - Unparseable attended value (400)
         - {"detail": "Attendance record not found"} - Invalid attendance_id (404)
         
         Security:
@@ -404,6 +912,11 @@ class SessionViewSet(viewsets.ModelViewSet):
                 {"detail": "attendance_id and attended are required"}, 
                 status=400
             )
+        # Form posts send strings ("false"), which are truthy: parse them as DRF does
+        try:
+            attended = serializers.BooleanField().to_internal_value(attended)
+        except ValidationError:
+            return Response({"detail": "attended must be true or false"}, status=400)
 
         # Validate attendance record exists and belongs to this session
         try:
@@ -412,8 +925,14 @@ class SessionViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Attendance record not found"}, status=404)
 
         # Update attendance status
+        was_attended = attendance.attended
         attendance.attended = attended
         attendance.save()
+        analytics.track_attendance(session, was_attended, attendance.attended)
+        ledger.record(
+            BookingEvent.ATTENDED if attendance.attended else BookingEvent.NO_SHOW,
+            session.pk, attendance.user_id, attendance.attended, actor=request.user,
+        )
 
         return Response({
             "status": "updated",
@@ -481,6 +1000,111 @@ class CurrentUserView(APIView):
         return Response(data)
 
 
+# -----------------------------
+# Attendance Export
+# -----------------------------
+class _Echo:
+    """Pseudo-buffer for csv.writer: returns each written line instead of storing it."""
+    def write(self, value):
+        return value
+
+
+class AttendanceExportView(APIView):
+    """
+    Stream attendance records as CSV or NDJSON (staff only).
+
+    Endpoint: GET /api/attendance/export/
+
+    Query parameters:
+    - format: "csv" (default) or "ndjson" (an Accept header works too)
+    - start / end: inclusive session date range (YYYY-MM-DD)
+    - activity: restrict to one activity type (e.g. "yoga")
+    - include_archived: "false" to skip archived history (default: included)
+
+    Each row joins a SessionAttendee (or ArchivedSessionAttendee, see
+    api.archive) with its session, trainer and user.
+    Rows are read with a server-side cursor (iterator(chunk_size=...)) and
+    written to a StreamingHttpResponse as they are produced, so memory use
+    stays flat however many years of attendance are exported.
+    """
+    permission_classes = [IsAuthenticated, permissions.IsAdminUser]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    CHUNK_SIZE = 2000
+    COLUMNS = [
+        "attendance_id", "session_id", "date", "time", "duration_minutes",
+        "activity_type", "trainer", "user_id", "username", "attended",
+    ]
+
+    def get(self, request):
+        params = request.query_params
+        filters = {}
+        for param in ("start", "end"):
+            if params.get(param):
+                filters[param] = parse_date(params[param])
+                if filters[param] is None:
+                    return Response({"detail": f"{param} must be a date in YYYY-MM-DD format"}, status=400)
+        activity = params.get("activity")
+        if activity and activity not in dict(Session.ACTIVITY_CHOICES):
+            return Response({"detail": f"Unknown activity type '{activity}'"}, status=400)
+
+        rows = archive.attendance_rows(
+            self.COLUMNS,
+            start=filters.get("start"),
+            end=filters.get("end"),
+            activity=activity,
+            include_archived=params.get("include_archived", "true").lower() not in ("0", "false", "no"),
+            chunk_size=self.CHUNK_SIZE,
+        )
+
+        fmt = request.accepted_renderer.format
+        stream = self.stream_ndjson(rows) if fmt == "ndjson" else self.stream_csv(rows)
+        response = StreamingHttpResponse(stream, content_type=request.accepted_renderer.media_type)
+        filename = "attendance-{}-{}.{}".format(params.get("start", "all"), params.get("end", "all"), fmt)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def stream_csv(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(self.COLUMNS)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def stream_ndjson(self, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(self.COLUMNS, row)), default=str) + "\n"
+
+
+# -----------------------------
+# Utilisation Analytics
+# -----------------------------
+class UtilizationAnalyticsView(APIView):
+    """
+    Fill rate, no-show rate and bookings by activity, weekday and time slot (staff only).
+
+    Endpoint: GET /api/analytics/utilization/?activity=yoga
+
+    Served from the incrementally maintained UtilizationSummary table (see
+    api.analytics), so the cost does not grow with booking history.
+
+    Example response (abridged):
+    {
+        "totals": {"sessions": 310, "capacity": 3100, "bookings": 2015, "no_shows": 87,
+                   "fill_rate": 0.65, "no_show_rate": 0.0432},
+        "by_activity": [{"activity_type": "yoga", ...}],
+        "by_weekday": [{"weekday": 1, "weekday_name": "Monday", ...}],
+        "by_time_slot": [{"hour": 9, "time_slot": "09:00", ...}]
+    }
+    """
+    permission_classes = [IsAuthenticated, permissions.IsAdminUser]
+
+    def get(self, request):
+        activity = request.query_params.get("activity")
+        if activity and activity not in dict(Session.ACTIVITY_CHOICES):
+            return Response({"detail": f"Unknown activity type '{activity}'"}, status=400)
+        return Response(analytics.utilization_report(activity))
+
+
 # -----------------------------
 # Health Check Endpoint
 # -----------------------------
@@ -496,11 +1120,14 @@ def health(request):
     - user_authenticated: boolean if request has a logged-in user
     - has_sessions: count of Session rows (may be 0 on fresh deploy)
     - has_admin: whether any superuser exists
+    - db_pool: this worker's connection pool counters (psycopg_pool
+      get_stats()), or null when the database connection is not pooled
 
     Safe for public exposure (no sensitive data). Enables external uptime checks
     and quick determination if production is using expected database backend.
     """
     from django.db import connection
+    from backend.db_pool import pool_stats
     db_engine = connection.settings_dict.get("ENGINE")
     session_count = Session.objects.count()
     has_admin = User.objects.filter(is_superuser=True).exists()
@@ -511,4 +1138,5 @@ def health(request):
         "user_authenticated": bool(request.user and request.user.is_authenticated),
         "sessions": session_count,
         "has_admin": has_admin,
+        "db_pool": pool_stats(connection),
     })
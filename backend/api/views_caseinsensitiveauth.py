@@ -1,7 +1,7 @@
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework.throttling import ScopedRateThrottle
+from .throttling import ScopedRateThrottle
 
 class CaseInsensitiveTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
@@ -46,6 +46,8 @@ while bookings_created < 30 and attempts < max_attempts:
     
     attempts += 1
 
+# attendees.add() bypasses the booking paths that maintain booked_count
+Session.objects.filter(pk__in=[s.pk for s in sessions]).recount_bookings()
 
 
 # Show distribution
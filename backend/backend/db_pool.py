@@ -0,0 +1,30 @@
+"""
+Hooks for Django's native PostgreSQL connection pool (OPTIONS["pool"], psycopg 3).
+
+settings.py enables the pool when DATABASE_POOL_MAX_SIZE is set and passes
+these as psycopg_pool.ConnectionPool arguments. pool_stats() reports the
+pool's counters at runtime (the /api/health/ endpoint includes them).
+"""
+
+
+def close_cursors(conn):
+    """
+    Pool reset callback: close every cursor left open on a returned connection.
+
+    QuerySet.iterator() outside a transaction uses WITH HOLD server-side
+    cursors, which outlive the request that opened them if the iteration
+    was abandoned. The next borrower must not inherit them.
+    """
+    conn.execute("CLOSE ALL")
+
+
+def pool_stats(connection):
+    """
+    psycopg_pool's get_stats() for this process's pool behind `connection`, or None.
+
+    None when the connection is not pooled (SQLite, or PostgreSQL without
+    DATABASE_POOL_MAX_SIZE). The counters (pool_size, pool_available,
+    requests_waiting, requests_wait_ms, ...) cover this worker process only.
+    """
+    pool = getattr(connection, "pool", None)
+    return pool.get_stats() if pool is not None else None
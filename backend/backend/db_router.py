@@ -0,0 +1,133 @@
+"""
+Primary/replica database routing for GymFlex.
+
+Read replicas are configured with the DATABASE_REPLICA_URLS environment
+variable (comma-separated database URLs, see settings.py); their aliases are
+listed in settings.DATABASE_REPLICAS. With none configured everything runs on
+"default" exactly as before.
+
+Routing is decided per request by ReplicaRoutingMiddleware:
+- Safe-method requests (GET/HEAD/OPTIONS), such as the session list and
+  retrieve endpoints, read from a randomly chosen replica.
+- Everything else, and any query outside a request (management commands,
+  workers), uses the primary.
+- Read-your-writes: after a successful write request the member is pinned to
+  the primary for READ_YOUR_WRITES_SECONDS, by user id in the cross-process
+  READ_YOUR_WRITES_CACHE (so every worker sees it, also for clients that drop
+  cookies) and by a cookie, so their next reads see their own booking despite
+  replica lag.
+- A write inside a read request (rare) pins the rest of that request to the
+  primary as well.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_COOKIE = "gymflex_primary_until"
+PIN_CACHE_KEY = "db-primary-pin:{user_id}"
+
+# True while handling a request whose reads may go to a replica
+_use_replica = ContextVar("use_replica", default=False)
+
+
+class PrimaryReplicaRouter:
+    """Send reads to a replica when the current request allows it; writes always go to the primary."""
+
+    def db_for_read(self, model, **hints):
+        # The database cache backend (api.availability tokens) must never lag behind
+        if model._meta.app_label == "django_cache":
+            return None
+        if _use_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Later reads in this request must see this write
+        _use_replica.set(False)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+def _pin_cache():
+    return caches[settings.READ_YOUR_WRITES_CACHE]
+
+
+def _jwt_user_id(request):
+    """User id from a valid Bearer access token, or None."""
+    header = request.headers.get("Authorization", "")
+    if not header.startswith("Bearer "):
+        return None
+    try:
+        return AccessToken(header[len("Bearer "):].strip()).get(jwt_settings.USER_ID_CLAIM)
+    except TokenError:
+        return None
+
+
+def _request_user_id(request):
+    user_id = _jwt_user_id(request)
+    if user_id is None and getattr(request, "user", None) is not None and request.user.is_authenticated:
+        user_id = request.user.pk
+    return user_id
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Decide per request whether reads may use a replica, and pin writers to the primary.
+
+    Must come after AuthenticationMiddleware (session-authenticated admin users).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        safe = request.method in SAFE_METHODS
+        token = _use_replica.set(safe and not self.is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+        if not safe and response.status_code < 400:
+            self.pin(request, response)
+        return response
+
+    @staticmethod
+    def is_pinned(request):
+        try:
+            if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+                return True
+        except ValueError:
+            pass
+        user_id = _request_user_id(request)
+        return user_id is not None and _pin_cache().get(PIN_CACHE_KEY.format(user_id=user_id)) is not None
+
+    @staticmethod
+    def pin(request, response):
+        window = settings.READ_YOUR_WRITES_SECONDS
+        # DRF copies the JWT-authenticated user onto the underlying request
+        user_id = _request_user_id(request)
+        if user_id is not None:
+            _pin_cache().set(PIN_CACHE_KEY.format(user_id=user_id), 1, timeout=window)
+        response.set_cookie(
+            PIN_COOKIE,
+            str(int(time.time() + window)),
+            max_age=window,
+            httponly=True,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
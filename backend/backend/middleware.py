@@ -5,7 +5,12 @@ This module defines middleware classes that process requests and responses globa
 across the Django application before they reach views or after views process them.
 """
 
+import os
+import re
+
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
+from whitenoise.middleware import WhiteNoiseMiddleware
 
 class DisableCSRFForAPI(MiddlewareMixin):
     """
@@ -36,3 +41,39 @@ class DisableCSRFForAPI(MiddlewareMixin):
         """
         if request.path.startswith('/api/'):
             setattr(request, '_dont_enforce_csrf_checks', True)
+
+
+class FrontendAssetsMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, extended to serve the React build's /assets/ directory.
+
+    Vite writes content-hashed bundles to frontend/dist/assets (e.g.
+    index-B1x9kQ2a.js). On top of STATIC_ROOT, this middleware:
+    - adds that directory under the /assets/ URL prefix, so the files are
+      indexed in memory once at startup (no per-request filesystem stat while
+      WHITENOISE_AUTOREFRESH is off)
+    - serves the .br/.gz variants `vite build` writes next to each bundle
+      (the precompress plugin in frontend/vite.config.js) according to
+      Accept-Encoding; nothing is written at runtime
+    - marks hashed bundles immutable (Cache-Control: max-age=10 years, immutable)
+
+    WhiteNoise also answers conditional and Range requests for these files.
+    """
+    # Vite's default output name: <name>-<hash>.<ext>, the hash being exactly 8
+    # base64url characters. Requiring one that is not a lowercase letter keeps
+    # names like font-awesome-semibold.woff2 from passing for hashed.
+    HASHED_ASSET = re.compile(r"-(?=[A-Za-z0-9_-]*[A-Z0-9_])[A-Za-z0-9_-]{8}\.[a-z0-9]+$")
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        assets_root = getattr(settings, "FRONTEND_ASSETS_ROOT", None)
+        if not assets_root or not os.path.isdir(assets_root):
+            return
+        self.assets_prefix = "/" + getattr(settings, "FRONTEND_ASSETS_PREFIX", "assets/").strip("/") + "/"
+        self.add_files(assets_root, prefix=self.assets_prefix)
+
+    def immutable_file_test(self, path, url):
+        """Hashed frontend bundles never change under the same URL."""
+        if url.startswith(getattr(self, "assets_prefix", "/assets/")) and self.HASHED_ASSET.search(url):
+            return True
+        return super().immutable_file_test(path, url)
@@ -9,6 +9,7 @@ The settings automatically adapt between local development (SQLite) and producti
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 import os
 import secrets
 
@@ -61,10 +62,12 @@ REST_FRAMEWORK = {
     # Rate limiting (throttling)
     # - Global throttles are intentionally generous to avoid impacting normal usage
     # - Sensitive endpoints (login/register) use ScopedRateThrottle with stricter limits
+    # - api.throttling's classes read the rates below on every request, so
+    #   overriding them (None = no limit) takes effect at runtime
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
-        "rest_framework.throttling.ScopedRateThrottle",
+        "api.throttling.AnonRateThrottle",
+        "api.throttling.UserRateThrottle",
+        "api.throttling.ScopedRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         # Global defaults
@@ -102,13 +105,14 @@ INSTALLED_APPS = [
 # These run in order from top to bottom for requests, and bottom to top for responses
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",      # Adds security enhancements
-    "whitenoise.middleware.WhiteNoiseMiddleware",         # Serves static files efficiently on Heroku
+    "backend.middleware.FrontendAssetsMiddleware",        # WhiteNoise: static files plus React's /assets/ bundles
     "corsheaders.middleware.CorsMiddleware",              # Handles CORS headers (must be near top)
     "django.contrib.sessions.middleware.SessionMiddleware",  # Manages sessions
     "django.middleware.common.CommonMiddleware",          # Adds common functionality
     "backend.middleware.DisableCSRFForAPI",               # Disables CSRF checks for /api/ endpoints
     "django.middleware.csrf.CsrfViewMiddleware",          # Protects against Cross-Site Request Forgery
     "django.contrib.auth.middleware.AuthenticationMiddleware",  # Associates users with requests
+    "backend.db_router.ReplicaRoutingMiddleware",         # Routes safe-method reads to read replicas
     "django.contrib.messages.middleware.MessageMiddleware",     # Handles temporary messages
     "django.middleware.clickjacking.XFrameOptionsMiddleware",   # Protects against clickjacking attacks
 ]
@@ -146,10 +150,29 @@ WSGI_APPLICATION = "backend.wsgi.application"
 import dj_database_url
 
 # Default database configuration - uses SQLite for local development
+# and single-node deployments. The OPTIONS below are applied to every new
+# connection so concurrent bookings don't fail with "database is locked":
+# - WAL journal: readers never block on a writer (and vice versa)
+# - synchronous=NORMAL: safe with WAL, avoids an fsync per commit
+# - busy_timeout / timeout: writers wait for the lock instead of erroring
+# - IMMEDIATE transactions: take the write lock at BEGIN, so two transactions
+#   can't deadlock upgrading read locks to write locks
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,  # seconds
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA busy_timeout=20000;"
+                "PRAGMA cache_size=-20000;"  # 20 MB page cache
+                "PRAGMA temp_store=MEMORY;"
+                "PRAGMA mmap_size=134217728;"  # 128 MB
+            ),
+        },
     }
 }
 
@@ -159,6 +182,75 @@ DATABASES = {
 if 'DATABASE_URL' in os.environ:
     DATABASES['default'] = dj_database_url.config(conn_max_age=600, ssl_require=True)
 
+    # Optional per-process connection pool (Django's native pool, psycopg 3).
+    # Set DATABASE_POOL_MAX_SIZE to enable it; each worker process then holds
+    # at most that many server connections, shared by its threads.
+    if os.environ.get('DATABASE_POOL_MAX_SIZE'):
+        from backend.db_pool import close_cursors
+
+        DATABASES['default'].update(
+            CONN_MAX_AGE=0,  # connections return to the pool after each request
+            CONN_HEALTH_CHECKS=True,  # the pool checks a connection before lending it
+        )
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 0)),
+            'max_size': int(os.environ['DATABASE_POOL_MAX_SIZE']),
+            'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', 300)),
+            'max_lifetime': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 3600)),
+            'reset': close_cursors,
+        }
+
+# Read replicas (optional): DATABASE_REPLICA_URLS is a comma-separated list of
+# database URLs, e.g. "postgres://...replica1,postgres://...replica2", or
+# "sqlite:///replica.sqlite3" to try the routing locally. Safe-method API reads
+# go to a replica; writes, and a member's reads for READ_YOUR_WRITES_SECONDS
+# after a write, stay on the primary (see backend/db_router.py).
+DATABASE_REPLICAS = []
+for index, url in enumerate(u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()):
+    alias = f"replica_{index + 1}"
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=600)
+    # Never create a test database on a replica; the routing tests register their own (api/tests.py)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["backend.db_router.PrimaryReplicaRouter"]
+READ_YOUR_WRITES_SECONDS = 10
+READ_YOUR_WRITES_CACHE = "shared"  # Cache alias holding the per-user pins; must be shared by all workers
+
+# Caches: "default" is per process; "shared" is a table in the main database
+# (create it with `manage.py createcachetable`, run on every release) so all
+# workers see the same values, e.g. the availability index tokens.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "gymflex_cache"},
+}
+
+# In-memory availability index (see api/availability.py)
+AVAILABILITY_CACHE = "shared"       # Cache alias holding the per-date tokens
+AVAILABILITY_CHECK_INTERVAL = 2     # Seconds between token checks, i.e. how stale another worker's booking can look
+
+# Background tasks run by `manage.py run_worker` (see api/tasks.py)
+TASK_POLL_INTERVAL = 1        # Seconds an idle worker waits before looking for due tasks again
+TASK_RETRY_DELAY = 30         # Seconds before the first retry of a failed task (doubles per attempt)
+TASK_LOCK_TIMEOUT = 10 * 60   # Seconds after which a running task is assumed abandoned and requeued
+TASK_HEARTBEAT_INTERVAL = 60  # Seconds between lock refreshes of a running task (well below TASK_LOCK_TIMEOUT)
+
+# Session reminders (see api/notifications.py and `manage.py send_reminders`)
+REMINDER_LEAD_MINUTES = 2 * 60    # Remind members this long before their class starts
+REMINDER_WINDOW_MINUTES = 60      # Sessions scanned per query
+REMINDER_INTERVAL = 5 * 60        # Seconds between the send_reminders tasks `run_worker` queues (None: never)
+NOTIFICATION_BACKEND = "api.notifications.ConsoleBackend"
+NOTIFICATION_CLAIM_TIMEOUT = 10 * 60  # Seconds after which a claimed, unsent notification is marked failed
+
+# Booking event ledger (see api/ledger.py and `manage.py replay_ledger`)
+LEDGER_BATCH_SIZE = 100      # Buffered events written in one insert
+LEDGER_FLUSH_INTERVAL = 5    # Seconds an event may wait in a worker's buffer before the next request end writes it
+
+# How long a stored Idempotency-Key response is replayed for (see api/idempotency.py)
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_CLAIM_LEASE_SECONDS = 60  # In-flight claims older than this were abandoned (longer than the gunicorn timeout)
+
 # Password validation - enforces strong password requirements
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -198,6 +290,16 @@ STATICFILES_DIRS = [
 # WhiteNoise can still serve them locally if it is allowed to use Django's finders.
 WHITENOISE_USE_FINDERS = not IS_HEROKU
 
+# React's hashed build output, served at /assets/ by backend.middleware.FrontendAssetsMiddleware
+# (indexed in memory at startup, precompressed by `vite build`, Cache-Control: immutable)
+FRONTEND_ASSETS_ROOT = BASE_DIR.parent / "frontend" / "dist" / "assets"
+
+# React's index.html, served for client-side routes by backend.views.SPAShellView
+FRONTEND_INDEX_FILE = BASE_DIR.parent / "frontend" / "dist" / "index.html"
+SPA_SHELL_CHECK_INTERVAL = 2  # Seconds between checks for a rebuilt index.html
+# Optional JSON-serialisable payload inlined as window.__GYMFLEX_BOOTSTRAP__
+SPA_BOOTSTRAP = None
+
 # Use WhiteNoise's storage backend for efficient static file serving with compression
 # In production (e.g., Heroku), use manifest storage for cache-busting.
 # For local development, avoid requiring collectstatic/manifest to prevent admin styling issues.
@@ -225,6 +327,7 @@ else:
     CORS_ALLOW_ALL_ORIGINS = True
 
 CORS_ALLOW_CREDENTIALS = True  # Allow cookies/auth headers in cross-origin requests
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")  # Sent by the booking buttons
 
 # Cross-Site Request Forgery (CSRF) protection settings
 # Note: Our custom DisableCSRFForAPI middleware exempts /api/ endpoints from CSRF checks
@@ -6,7 +6,6 @@ This module defines the top-level routing for the entire application, including:
 - User authentication and registration endpoints
 - JWT token generation and refresh endpoints
 - API endpoint delegation to the api app
-- Static file serving for React frontend assets
 - Catch-all route to serve the React single-page application
 
 URL Resolution Order:
@@ -17,11 +16,9 @@ routes serve the React app (enabling client-side routing).
 
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.views.generic import TemplateView
-from django.views.static import serve
-from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from api.views import CreateUserView
+from backend.views import SPAShellView
 from rest_framework_simplejwt.views import TokenRefreshView
 from api.views_caseinsensitiveauth import CaseInsensitiveTokenObtainPairView
 
@@ -50,12 +47,11 @@ urlpatterns = [
     # This includes Session viewsets, user endpoints, and custom actions
     path("api/", include("api.urls")),
     
-    # Serve React's static assets (JavaScript, CSS, images) from frontend/dist/assets/
-    # This regex pattern matches any path starting with /assets/ and serves files directly
-    # WhiteNoise middleware handles compression and caching for production efficiency
-    re_path(r'^assets/(?P<path>.*)$', serve, {'document_root': settings.BASE_DIR.parent / 'frontend' / 'dist' / 'assets'}),
-    
+    # React's static assets (/assets/...) never reach the URLconf: they are served
+    # from memory by backend.middleware.FrontendAssetsMiddleware (WhiteNoise)
+
     # Catch-all route: serve React's index.html for all unmatched frontend routes (root and /assets handled above)
     # Only match root and paths not starting with api/, admin/, or static/
-    re_path(r'^(?!api/|admin/|static/|assets/).*$' , TemplateView.as_view(template_name="index.html")),
+    # The shell is cached in memory and revalidated with an ETag (see backend/views.py)
+    re_path(r'^(?!api/|admin/|static/|assets/).*$' , SPAShellView.as_view()),
 ]
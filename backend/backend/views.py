@@ -0,0 +1,119 @@
+"""
+Project-level views for GymFlex.
+
+SPAShellView serves the React build's index.html for every client-side route
+(see the catch-all pattern in backend/urls.py). The file is plain HTML with no
+template tags, so instead of rendering it through the template engine on each
+navigation it is:
+- read once per process and kept in memory (SPAShell below)
+- optionally given an inlined bootstrap payload (settings.SPA_BOOTSTRAP),
+  exposed to the frontend as window.__GYMFLEX_BOOTSTRAP__
+- sent with a strong ETag and Cache-Control: no-cache, so browsers revalidate
+  and get an empty 304 while the shell is unchanged
+- reloaded only when the built file's mtime changes, checked at most once
+  every SPA_SHELL_CHECK_INTERVAL seconds
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.views import View
+
+
+class SPAShell:
+    """In-memory copy of index.html, refreshed when the file on disk changes."""
+
+    def __init__(self, path, bootstrap=None, check_interval=2.0):
+        self.path = str(path)
+        self.bootstrap = bootstrap
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.body = None
+        self.etag = None
+        self.checked_at = 0.0
+
+    def render(self, html):
+        """Inline the bootstrap payload just before </head>."""
+        if not self.bootstrap:
+            return html
+        # Escape "<" so the payload can never close the <script> element
+        payload = json.dumps(self.bootstrap, separators=(",", ":")).replace("<", "\\u003c")
+        script = f"<script>window.__GYMFLEX_BOOTSTRAP__ = {payload};</script>"
+        head_end = html.find("</head>")
+        if head_end == -1:
+            return script + html
+        return html[:head_end] + script + html[head_end:]
+
+    def get(self):
+        """
+        Return (body bytes, etag), or (None, None) if the file does not exist.
+
+        Stats the file at most once per check_interval; reads it only when
+        its mtime has changed.
+        """
+        now = time.monotonic()
+        if self.body is not None and now - self.checked_at < self.check_interval:
+            return self.body, self.etag
+        with self.lock:
+            if self.body is not None and now - self.checked_at < self.check_interval:
+                return self.body, self.etag
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self.body = self.etag = self.mtime = None
+                return None, None
+            if mtime != self.mtime:
+                with open(self.path, encoding="utf-8") as f:
+                    body = self.render(f.read()).encode("utf-8")
+                self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+                self.body = body
+                self.mtime = mtime
+            self.checked_at = now
+            return self.body, self.etag
+
+
+_shells = {}
+_shells_lock = threading.Lock()
+
+
+def get_shell():
+    """The process-wide SPAShell for the current settings."""
+    key = (
+        str(settings.FRONTEND_INDEX_FILE),
+        json.dumps(settings.SPA_BOOTSTRAP, sort_keys=True, default=str),
+        settings.SPA_SHELL_CHECK_INTERVAL,
+    )
+    shell = _shells.get(key)
+    if shell is None:
+        with _shells_lock:
+            shell = _shells.setdefault(
+                key, SPAShell(settings.FRONTEND_INDEX_FILE, settings.SPA_BOOTSTRAP, settings.SPA_SHELL_CHECK_INTERVAL)
+            )
+    return shell
+
+
+class SPAShellView(View):
+    """Serve the cached React shell for any frontend route."""
+
+    http_method_names = ["get", "head"]
+
+    def get(self, request, *args, **kwargs):
+        body, etag = get_shell().get()
+        if body is None:
+            raise Http404("Frontend build not found (run the frontend build to create frontend/dist/index.html).")
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type="text/html; charset=utf-8")
+        response["ETag"] = etag
+        # Always revalidate: the shell changes on every deploy, the ETag makes that cheap
+        response["Cache-Control"] = "no-cache"
+        return response
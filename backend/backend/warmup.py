@@ -0,0 +1,125 @@
+"""
+Process warmup for GymFlex.
+
+A fresh worker pays several one-off costs on its first requests: building the
+URL resolver, DRF introspecting serializer fields against the models, loading
+the password validators (CommonPasswordValidator reads a 20k-entry list),
+initialising the JWT backend and reading the SPA shell. warm_up() pays them
+up front, without touching the database.
+
+gunicorn.conf.py calls it in the master after the app is preloaded (so every
+forked and recycled worker inherits warm caches) and again in each worker
+after fork, where everything is already cached and it returns quickly.
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Routes resolved during warmup (one per URL include, plus the SPA catch-all)
+WARMUP_PATHS = (
+    "/api/sessions/",
+    "/api/sessions/1/book/",
+    "/api/token/",
+    "/api/users/me/",
+    "/api/health/",
+    "/admin/",
+    "/",
+)
+
+
+def warm_urls():
+    from django.urls import get_resolver
+    from django.urls.exceptions import Resolver404
+
+    resolver = get_resolver()
+    for path in WARMUP_PATHS:
+        try:
+            resolver.resolve(path)
+        except Resolver404:
+            pass
+
+
+def warm_serializers():
+    from api import serializers
+    from rest_framework.serializers import Serializer
+
+    for value in vars(serializers).values():
+        if isinstance(value, type) and issubclass(value, Serializer) and value.__module__ == serializers.__name__:
+            # Builds the field mapping from model metadata and fills Django's _meta caches
+            value().fields
+
+
+def warm_views():
+    from django.urls import get_resolver
+
+    # Instantiating each API view loads its renderers, parsers, authentication and permission classes
+    for pattern in get_resolver().url_patterns:
+        for callback in _callbacks(pattern):
+            view_class = getattr(callback, "cls", None) or getattr(callback, "view_class", None)
+            if view_class is not None and hasattr(view_class, "get_authenticators"):
+                view = view_class()
+                view.get_renderers()
+                view.get_parsers()
+                view.get_authenticators()
+                view.get_permissions()
+
+
+def _callbacks(pattern):
+    if hasattr(pattern, "url_patterns"):
+        for child in pattern.url_patterns:
+            yield from _callbacks(child)
+    elif getattr(pattern, "callback", None) is not None:
+        yield pattern.callback
+
+
+def warm_password_validators():
+    from django.contrib.auth.password_validation import get_default_password_validators
+
+    get_default_password_validators()
+
+
+def warm_jwt():
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.state import token_backend
+
+    authentication = JWTAuthentication()
+    token = token_backend.encode({"token_type": "access", "user_id": 0, "exp": int(time.time()) + 60, "jti": "warmup"})
+    authentication.get_validated_token(token)
+
+
+def warm_spa_shell():
+    from backend.views import get_shell
+
+    get_shell().get()
+
+
+STEPS = (
+    ("urls", warm_urls),
+    ("views", warm_views),
+    ("serializers", warm_serializers),
+    ("password_validators", warm_password_validators),
+    ("jwt", warm_jwt),
+    ("spa_shell", warm_spa_shell),
+)
+
+
+def warm_up():
+    """
+    Run every warmup step; a failing step is logged and skipped.
+
+    Returns:
+        dict: step name -> milliseconds taken (None if the step failed)
+    """
+    timings = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warmup step %s failed", name)
+            timings[name] = None
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+    return timings
@@ -0,0 +1,62 @@
+"""
+Gunicorn configuration for GymFlex (used by the Procfile).
+
+- preload_app: Django is imported and set up once in the master, then forked,
+  so workers start (and are recycled) without re-importing the project.
+- when_ready / post_fork: run backend.warmup in the master, so forked workers
+  inherit warm URL resolver, serializer, validator and JWT caches, and again in
+  each worker for anything per-process.
+- Database connections are never shared across the fork: the master closes
+  any it opened, and workers open their own on first use.
+- worker_exit: writes the worker's buffered booking events (api.ledger)
+  before it is recycled or shut down.
+
+Every setting can still be overridden on the command line or with
+GUNICORN_CMD_ARGS.
+"""
+
+import os
+
+# Run from the repository root (Heroku) or from backend/
+pythonpath = os.path.dirname(os.path.abspath(__file__))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+preload_app = True
+
+# Recycle workers periodically (bounded memory growth); preload makes this cheap
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = 100
+
+accesslog = "-"
+errorlog = "-"
+
+
+def _close_db_connections():
+    from django.db import connections
+
+    connections.close_all()
+
+
+def when_ready(server):
+    from backend.warmup import warm_up
+
+    timings = warm_up()
+    _close_db_connections()
+    server.log.info("Warmed up master: %s", timings)
+
+
+def post_fork(server, worker):
+    from backend.warmup import warm_up
+
+    timings = warm_up()
+    server.log.debug("Warmed up worker %s: %s", worker.pid, timings)
+
+
+def worker_exit(server, worker):
+    from api import ledger
+
+    written = ledger.flush()
+    if written:
+        server.log.info("Worker %s wrote %s buffered booking event(s)", worker.pid, written)
@@ -1,14 +1,16 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time
 from django.contrib.auth import get_user_model
-from api.models import Session
+from api.models import SessionTemplate
 
 """
 Idempotent development seeding for sessions only.
 Industry-standard principles applied:
 - No test users or passwords created.
-- Safe to run multiple times (skips existing matching sessions).
-- Creates a small window of past and future data for UI & attendance testing.
-- Keeps logic deterministic (titles + date + hour).
+- Safe to run multiple times (skips existing matching templates).
+- Seeds recurring templates rather than one row per class: every occurrence
+  is listed as a virtual session and only gets a Session row once somebody
+  books it (see api/recurrence.py).
+- Keeps logic deterministic (titles + weekday + hour).
 
 To run locally:
     python manage.py shell < seed_sessions.py
@@ -16,7 +18,7 @@ To run locally:
 To run on Heroku:
     heroku run python backend/manage.py shell < backend/seed_sessions.py
 
-Adjust the BASE_TITLES or DAY_WINDOW as needed; keep capacity modest.
+Adjust the BASE_TITLES or the seeded date range as needed; keep capacity modest.
 """
 
 Django_ACTIVITY_CHOICES = [
@@ -29,9 +31,10 @@ BASE_TITLES = [
     ("Core Blast", 17, 'cardio'),
     ("Mobility Flow", 8, 'pilates'),
 ]
-DAYS_DECEMBER = [datetime(2025, 12, d).date() for d in range(1, 32)]
-DAYS_JANUARY = [datetime(2026, 1, d).date() for d in range(1, 32)]
-DAYS_TO_SEED = DAYS_DECEMBER + DAYS_JANUARY
+# December and January, every day of the week
+FIRST_DAY = datetime(2025, 12, 1).date()
+LAST_DAY = datetime(2026, 1, 31).date()
+WEEKDAYS = range(7)
 DURATION_MINUTES = 60
 CAPACITY = 10
 
@@ -45,25 +48,22 @@ def run():
         return
 
     created = 0
-    # Seed December and January, at least 30 sessions each
-    for day in DAYS_TO_SEED:
-        # Use a round-robin of titles and hours to ensure variety
-        for i, (title, hour, activity_type) in enumerate(BASE_TITLES):
-            # Only seed up to 5 sessions per day, for 31*2*5 = 310 sessions
-            session_date = day
-            session_time = f"{hour:02d}:00"
-            exists = Session.objects.filter(date=session_date, time=session_time, trainer=trainer).exists()
-            if exists:
-                continue
-            Session.objects.create(
+    # 5 classes x 7 weekdays = 35 templates, instead of 31*2*5 = 310 session rows
+    for weekday in WEEKDAYS:
+        for title, hour, activity_type in BASE_TITLES:
+            _, was_created = SessionTemplate.objects.get_or_create(
                 trainer=trainer,
-                activity_type=activity_type,
-                date=session_date,
-                time=session_time,
-                duration_minutes=DURATION_MINUTES,
-                capacity=CAPACITY,
+                weekday=weekday,
+                time=time(hour, 0),
+                defaults={
+                    "activity_type": activity_type,
+                    "duration_minutes": DURATION_MINUTES,
+                    "capacity": CAPACITY,
+                    "starts_on": FIRST_DAY,
+                    "ends_on": LAST_DAY,
+                },
             )
-            created += 1
+            created += was_created
 
 
 
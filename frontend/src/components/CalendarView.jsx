@@ -1,13 +1,15 @@
 import React, { useState, useEffect } from "react";
 import { Calendar, momentLocalizer } from "react-big-calendar";
 import moment from "moment";
+import api from "../api";
 
 // Setup calendar localiser using Moment.js
 const localiser = momentLocalizer(moment);
 
 // CalendarView: renders a month calendar with a custom date cell wrapper.
 // The cell wrapper shows a compact emoji summary and a small session-count
-// button. For staff users the whole cell is clickable to select a date for
+// button, built from per-day aggregates (GET /sessions/calendar/) rather
+// than the full session list. For staff users the whole cell is clickable to select a date for
 // admin viewing; for regular users the button opens a modal drill-down.
 const CalendarView = ({ sessions, activityFilter, setActivityFilter, handleDrillDown, currentUser, selectedAdminDate, setSelectedAdminDate, selectedClientDate, setSelectedClientDate, showBookingsPanel, setShowBookingsPanel, bookedSessions, onVisibleMonthChange }) => {
     // Detect mobile screen
@@ -24,6 +26,26 @@ const CalendarView = ({ sessions, activityFilter, setActivityFilter, handleDrill
         return selectedClientDate ? moment(selectedClientDate).toDate() : new Date();
     });
 
+    // Per-day aggregates for the visible month, keyed by YYYY-MM-DD. Re-fetched
+    // (one small request) on month navigation, filter changes and whenever the
+    // session or booking lists change after a booking or edit.
+    const visibleMonthKey = moment(calendarDate).format("YYYY-MM");
+    const [monthDays, setMonthDays] = useState({});
+    useEffect(() => {
+        let cancelled = false;
+        const params = { month: visibleMonthKey };
+        if (activityFilter) params.activity = activityFilter;
+        api.get("/sessions/calendar/", { params })
+            .then((res) => {
+                if (cancelled) return;
+                const byDate = {};
+                (res.data?.days || []).forEach((day) => { byDate[day.date] = day; });
+                setMonthDays(byDate);
+            })
+            .catch((err) => console.error("Error fetching calendar:", err));
+        return () => { cancelled = true; };
+    }, [visibleMonthKey, activityFilter, sessions, bookedSessions]);
+
     // Keep calendarDate in sync when the selected admin date changes
     useEffect(() => {
         if (currentUser?.is_staff && selectedAdminDate) {
@@ -150,26 +172,15 @@ const CalendarView = ({ sessions, activityFilter, setActivityFilter, handleDrill
         const isSelected = (currentUser?.is_staff && selectedAdminDate && moment(selectedAdminDate).format("YYYY-MM-DD") === dateStr) ||
             (!currentUser?.is_staff && selectedClientDate && moment(selectedClientDate).format("YYYY-MM-DD") === dateStr);
 
-        // Apply current activity filter to decide which emojis to show
-        const displayedSessions = activityFilter
-            ? sessions.filter((s) => s.activity_type === activityFilter)
-            : sessions;
-        const dayEvents = displayedSessions.filter(
-            (s) => moment(s.date).format("YYYY-MM-DD") === dateStr
-        );
+        // Aggregates for this day (already restricted to the activity filter)
+        const day = monthDays[dateStr];
+        const classCount = day ? day.classes : 0;
 
         // For tick: check if user has a booking on this day
-        // When filtering, only show tick if booking matches the filtered activity
-        const hasBooking = bookedSessions && bookedSessions.some(
-            (s) => moment(s.date).format("YYYY-MM-DD") === dateStr &&
-                (!activityFilter || s.activity_type === activityFilter)
-        );
+        const hasBooking = Boolean(day && day.booked > 0);
 
         // For admin: check if any session on this day has bookings
-        // When filtering, only check sessions that match the filtered activity
-        const hasAnyBooking = currentUser?.is_staff && dayEvents.some(
-            (s) => s.attendees && s.attendees.length > 0
-        );
+        const hasAnyBooking = Boolean(currentUser?.is_staff && day && day.with_bookings > 0);
 
         // containerStyle ensures the emoji bar and button are positioned
         // relative to the calendar cell. If there are no events for the
@@ -187,7 +198,7 @@ const CalendarView = ({ sessions, activityFilter, setActivityFilter, handleDrill
             transition: "all 0.2s ease",
             color: "#2c3e50"
         };
-        if (dayEvents.length === 0) {
+        if (classCount === 0) {
             return (
                 <div
                     style={containerStyle}
@@ -225,7 +236,7 @@ const CalendarView = ({ sessions, activityFilter, setActivityFilter, handleDrill
             );
         }
 
-        const uniqueActivities = [...new Set(dayEvents.map((e) => e.activity_type))];
+        const uniqueActivities = Object.keys(day.activities);
         // Always render 5 emoji slots for consistent width
         const map = {
             cardio: "🏃",
@@ -269,7 +280,7 @@ const CalendarView = ({ sessions, activityFilter, setActivityFilter, handleDrill
             });
         }
 
-        const countText = `${dayEvents.length}`;
+        const countText = `${classCount}`;
 
         const buttonStyleWithFlex = {
             position: "absolute",
@@ -3,6 +3,11 @@ import moment from "moment";
 import api from "../api";
 import { ACCESS_TOKEN, REFRESH_TOKEN } from "../constants";
 
+// newIdempotencyKey: a unique key per booking attempt (crypto.randomUUID is
+// only available in secure contexts, so fall back to a random string).
+const newIdempotencyKey = () =>
+    window.crypto?.randomUUID?.() ?? `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 // useSessions: centralises session fetching and mutation logic. This hook
 // returns the session lists and helper functions used by the Home page.
 export default function useSessions() {
@@ -83,15 +88,25 @@ export default function useSessions() {
         }
     };
 
-    // handleBook: toggles a booking for the given session on behalf of the
-    // current user. After the API mutation we refresh the session lists so
-    // the UI can update to reflect the new state.
+    // handleBook: books the given session for the current user, or cancels
+    // the booking if they already hold one. Each click gets its own
+    // Idempotency-Key, reused when a request that never got a response is
+    // retried, so a retry cannot book or cancel twice. Instead of re-fetching
+    // every session we fetch just this one and patch it into the lists.
     const handleBook = async (session) => {
+        const action = session.booked ? "cancel" : "book";
+        const config = { headers: { "Idempotency-Key": newIdempotencyKey() } };
+        const post = () => api.post(`/sessions/${session.id}/${action}/`, null, config);
         try {
-            const res = await api.post(`/sessions/${session.id}/book/`);
-            // Refresh lists
-            const refreshed = await fetchSessions();
-            await fetchBookedSessions();
+            let res;
+            try {
+                res = await post();
+            } catch (err) {
+                // No response (timeout / dropped connection): retry once with the same key
+                if (err.response) throw err;
+                res = await post();
+            }
+            const refreshed = await refreshSession(session, res.data);
             if (currentUser?.is_staff) await fetchAllSessions();
             return { status: res.data.status, refreshed };
         } catch (err) {
@@ -100,6 +115,33 @@ export default function useSessions() {
         }
     };
 
+    // refreshSession: replaces one session in the local lists after a booking
+    // change and returns the updated session list. Falls back to the booked /
+    // available_slots values from the booking response if the fetch fails.
+    const refreshSession = async (session, result) => {
+        let updated;
+        try {
+            updated = (await api.get(`/sessions/${session.id}/`)).data;
+        } catch (err) {
+            updated = {
+                ...session,
+                booked: result.booked,
+                available_slots: result.available_slots,
+                attendees_count: session.capacity - result.available_slots,
+            };
+        }
+        // Booking a recurring class's virtual occurrence ("t3-20250106") gives
+        // it a numeric id, so match on the id the list had as well
+        const sameSession = (s) => s.id === updated.id || s.id === session.id;
+        const refreshed = sessions.map((s) => (sameSession(s) ? updated : s));
+        setSessions(refreshed);
+        setBookedSessions((previous) => {
+            const others = previous.filter((s) => !sameSession(s));
+            return updated.booked ? [...others, updated] : others;
+        });
+        return refreshed;
+    };
+
     // removeAttendee: admin action to remove a user from a session. After
     // removal we refresh the relevant lists so the UI reflects the change.
     const removeAttendee = async (sessionId, attendeeId) => {
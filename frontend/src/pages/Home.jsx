@@ -148,15 +148,9 @@ const Home = () => {
                 );
                 setModalEvents(eventsForDate);
             }
-            // Refresh booked sessions so UI (button state / lists) updates
-            // when a booking is created or cancelled. This will update
-            // `bookedSessions` in the sessions hook and recompute
-            // `sortedUpcomingBookings`/`visibleMonthHasBookings` via effects.
-            try {
-                await fetchBookedSessions();
-            } catch (__) {
-                // Fetch errors are ignored; UI will show the latest known state
-            }
+            // The hook has already patched `sessions` and `bookedSessions`,
+            // so `sortedUpcomingBookings`/`visibleMonthHasBookings` recompute
+            // via effects without re-downloading the session list.
         } catch (err) {
             const errorMsg = err.response?.data?.status || err.response?.data?.error || "Booking failed. Please try again.";
             toast.error(errorMsg);
@@ -1,7 +1,39 @@
 import { defineConfig } from 'vite'
 import react from '@vitejs/plugin-react'
+import { readFile, writeFile } from 'node:fs/promises'
+import { join } from 'node:path'
+import { brotliCompressSync, constants, gzipSync } from 'node:zlib'
+
+// Text bundles under assets/ get .br and .gz variants at build time; Django's
+// FrontendAssetsMiddleware (WhiteNoise) serves them according to Accept-Encoding
+const COMPRESSIBLE = /^assets\/.+\.(js|mjs|css|svg|json|map|txt|xml|ttf|otf|eot)$/
+const VARIANTS = [
+  ['.br', (data) => brotliCompressSync(data, { params: { [constants.BROTLI_PARAM_QUALITY]: 11 } })],
+  ['.gz', (data) => gzipSync(data, { level: 9 })],
+]
+
+function precompress() {
+  return {
+    name: 'gymflex-precompress',
+    apply: 'build',
+    async writeBundle(options, bundle) {
+      const files = Object.keys(bundle).filter((fileName) => COMPRESSIBLE.test(fileName))
+      await Promise.all(files.map(async (fileName) => {
+        const path = join(options.dir, fileName)
+        const data = await readFile(path)
+        for (const [suffix, compress] of VARIANTS) {
+          const compressed = compress(data)
+          // As WhiteNoise does: only keep a variant that saves at least 5%
+          if (compressed.length < data.length * 0.95) {
+            await writeFile(path + suffix, compressed)
+          }
+        }
+      }))
+    },
+  }
+}
 
 // https://vite.dev/config/
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), precompress()],
 })